@@ -1,10 +1,43 @@
 import sys
 import time
+import tracemalloc
+
+
+# Benchmarks print their results, and record them for --json, which
+# writes them into a file along with a description of the machine, so
+# that runs can be compared between versions and storage backends:
+#
+#     python benchmark.py --json before.json creation update
+#     python benchmark.py --max-entities 10000 --json quick.json
+
+
+def measure_memory(func):
+    # The result of func(), and the bytes that it allocated and that are
+    # still alive afterwards.
+    tracemalloc.start()
+    try:
+        result = func()
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, size
 
 
 class BaseBenchmark:
+    max_entities = None  # Caps the size of worlds, see --max-entities
+
     def __init__(self, name):
         self.name = name
+        self.results = []  # [{measurement: value}], see record()
+
+    def record(self, **values):
+        self.results.append(dict(benchmark=self.name, **values))
+
+    def get_sizes(self, sizes):
+        if self.max_entities is None:
+            return sizes
+        capped = [size for size in sizes if size <= self.max_entities]
+        return capped or [self.max_entities]
 
     def get_mem_usage(self):
         return "", ""
@@ -33,15 +66,15 @@ class BaseBenchmark:
                 print('Entities: {}, Components: {}'.format(num_ent, num_comp))
                 time_start = time.perf_counter_ns()
                 self.setup(num_ent, num_comp)
-                time_setup = (time.perf_counter_ns() - time_start) / 100_000
+                time_setup = (time.perf_counter_ns() - time_start) / 1_000_000
 
                 time_start = time.perf_counter_ns()
                 self.update_cold()
-                time_update_cold = (time.perf_counter_ns() - time_start) / 100_000
+                time_update_cold = (time.perf_counter_ns() - time_start) / 1_000_000
 
                 time_start = time.perf_counter_ns()
                 self.update_warm()
-                time_update_warm = (time.perf_counter_ns() - time_start) / 100_000
+                time_update_warm = (time.perf_counter_ns() - time_start) / 1_000_000
 
                 time_total = time_setup + time_update_cold + time_update_warm
                 print('\t{:0.2f}ms (setup: {:0.2f}ms, cold update: {:0.2f}ms, warm update: {:0.2f}ms)'.format(
@@ -50,6 +83,13 @@ class BaseBenchmark:
                     time_update_cold,
                     time_update_warm,
                 ))
+                self.record(
+                    entities=num_ent,
+                    components=num_comp,
+                    setup_ms=time_setup,
+                    update_cold_ms=time_update_cold,
+                    update_warm_ms=time_update_warm,
+                )
 
 
 class SimpleEcsBench(BaseBenchmark):
@@ -98,9 +138,813 @@ class SimpleEcsBench(BaseBenchmark):
         self.world.update(0)
 
 
-if __name__ == '__main__':
-    BENCHMARKS = [
-        SimpleEcsBench()
+# Cost of matching one entity against filters of growing nesting depth,
+# compiled to component masks versus evaluated recursively through
+# has_component().
+class FilterMatchingBench(BaseBenchmark):
+    def __init__(self, repetitions=100_000):
+        from wecs.core import Component
+        self.component_classes = [
+            Component()(type('Component{}'.format(i), (), {}))
+            for i in range(16)
+        ]
+        self.repetitions = repetitions
+        super().__init__('wecs filter matching')
+
+    def make_filter(self, depth):
+        # A and (B or (C and (D or ...)))
+        from wecs.core import and_filter, or_filter, not_filter
+        clauses = [not_filter([self.component_classes[-1]])]
+        for level in reversed(range(depth)):
+            combine = and_filter if level % 2 == 0 else or_filter
+            clauses = [combine([self.component_classes[level]] + clauses)]
+        return clauses[0]
+
+    def recursive_match(self, clause, entity):
+        from wecs.core import AndFilter, OrFilter, NotFilter
+        if not isinstance(clause, (AndFilter, OrFilter, NotFilter)):
+            return entity.has_component(clause)
+        results = (self.recursive_match(c, entity)
+                   for c in clause.types_and_filters)
+        if isinstance(clause, AndFilter):
+            return all(results)
+        elif isinstance(clause, OrFilter):
+            return any(results)
+        return not any(results)
+
+    def time_per_match(self, func):
+        time_start = time.perf_counter_ns()
+        for _ in range(self.repetitions):
+            func()
+        return (time.perf_counter_ns() - time_start) / self.repetitions
+
+    def run(self):
+        from wecs.core import World
+        print('={}='.format(self.name))
+        world = World()
+        entity = world.create_entity(*[
+            component_type()
+            for component_type in self.component_classes[:8:2]
+        ])
+        world.flush_component_updates()
+        for depth in [1, 2, 4, 8, 12]:
+            filter_func = self.make_filter(depth)
+            assert filter_func(entity) == self.recursive_match(filter_func, entity)
+            time_compiled = self.time_per_match(lambda: filter_func(entity))
+            time_recursive = self.time_per_match(
+                lambda: self.recursive_match(filter_func, entity),
+            )
+            print('Depth: {:2d}, terms: {:2d}\t{:0.0f}ns compiled, {:0.0f}ns recursive'.format(
+                depth,
+                len(filter_func.get_terms()),
+                time_compiled,
+                time_recursive,
+            ))
+            self.record(
+                depth=depth,
+                terms=len(filter_func.get_terms()),
+                compiled_ns=time_compiled,
+                recursive_ns=time_recursive,
+            )
+
+
+# Bytes per entity for entities with three data and two tag components,
+# with the components using a __dict__ versus __slots__ (and interned
+# tag instances).
+class ComponentMemoryBench(BaseBenchmark):
+    def __init__(self, num_entities=10_000):
+        self.num_entities = num_entities
+        super().__init__('wecs component memory')
+
+    def make_component_types(self, slots):
+        from wecs.core import Component
+        component_types = []
+        for i in range(3):
+            component_types.append(Component(slots=slots)(type(
+                'Data{}'.format(i),
+                (),
+                {
+                    '__annotations__': {'x': float, 'y': float},
+                    'x': 0.0,
+                    'y': 0.0,
+                },
+            )))
+        for i in range(2):
+            component_types.append(Component(slots=slots)(type(
+                'Tag{}'.format(i), (), {},
+            )))
+        return component_types
+
+    def bytes_per_entity(self, slots):
+        from wecs.core import World
+        component_types = self.make_component_types(slots)
+        world = World()
+
+        def build():
+            for _ in range(self.num_entities):
+                world.create_entity(*[ct() for ct in component_types])
+            world.flush_component_updates()
+
+        _, size = measure_memory(build)
+        return size / self.num_entities
+
+    def run(self):
+        print('={}='.format(self.name))
+        with_dict = self.bytes_per_entity(slots=False)
+        with_slots = self.bytes_per_entity(slots=True)
+        print('__dict__: {:0.0f} bytes/entity, __slots__: {:0.0f} bytes/entity ({:0.0f}%)'.format(
+            with_dict,
+            with_slots,
+            with_slots / with_dict * 100,
+        ))
+        self.record(slots=False, bytes_per_entity=with_dict)
+        self.record(slots=True, bytes_per_entity=with_slots)
+
+
+# Speedup of a CPU-heavy pure-Python system when its entities are
+# processed in chunks by a pool of worker processes. The component and
+# system types have to live at module level, so the workers can unpickle
+# them.
+try:
+    from wecs.core import Component, and_filter
+    from wecs.parallel import ParallelSystem
+except ImportError:  # NumPy is not installed
+    ParallelSystem = None
+else:
+    @Component()
+    class Seed:
+        value: int = 0
+
+    @Component()
+    class Fitness:
+        value: float = 0.0
+
+    class EvaluateFitness(ParallelSystem):
+        entity_filters = {'evaluated': and_filter([Seed, Fitness])}
+        parallel_filter = 'evaluated'
+        parallel_reads = {Seed: ['value']}
+        parallel_writes = {Fitness: ['value']}
+        iterations = 2_000
+
+        @classmethod
+        def process_chunk(cls, chunk):
+            fitness = []
+            for seed in chunk[Seed, 'value'].tolist():
+                state = seed
+                total = 0.0
+                for _ in range(cls.iterations):
+                    state = (state * 1103515245 + 12345) % 2**31
+                    total += state / 2**31
+                fitness.append(total / cls.iterations)
+            return {(Fitness, 'value'): fitness}
+
+
+class ParallelSystemBench(BaseBenchmark):
+    def __init__(self, num_entities=4_000):
+        self.num_entities = num_entities
+        super().__init__('wecs parallel system')
+
+    def time_update(self, processes):
+        from wecs.core import World
+        system = EvaluateFitness()
+        system.processes = processes
+        system.chunk_size = max(1, self.num_entities // (4 * max(processes, 1)))
+        world = World()
+        world.add_system(system, 0)
+        for i in range(self.num_entities):
+            world.create_entity(Seed(value=i), Fitness())
+        world.flush_component_updates()
+        if processes:
+            system.get_executor().submit(int).result()  # Warm up the pool
+        time_start = time.perf_counter_ns()
+        world.update()
+        time_update = (time.perf_counter_ns() - time_start) / 1_000_000
+        system.shutdown()
+        return time_update
+
+    def run(self):
+        import os
+        print('={}='.format(self.name))
+        if ParallelSystem is None:
+            print('NumPy is not installed.')
+            return
+        print('{} CPUs available'.format(os.cpu_count()))
+        time_serial = self.time_update(0)
+        print('In process: {:0.2f}ms'.format(time_serial))
+        self.record(processes=0, update_ms=time_serial)
+        for processes in [1, 2, 4, 8]:
+            time_parallel = self.time_update(processes)
+            print('{} processes: {:0.2f}ms, speedup {:0.2f}x'.format(
+                processes,
+                time_parallel,
+                time_serial / time_parallel,
+            ))
+            self.record(processes=processes, update_ms=time_parallel)
+
+
+# Saving and loading a world of rooms, and of items and actors in them,
+# compared to building it through create_entity().
+class SnapshotBench(BaseBenchmark):
+    def __init__(self, num_entities=200_000):
+        self.num_entities = self.get_sizes([num_entities])[0]
+        super().__init__('wecs snapshot')
+
+    def build_world(self):
+        from wecs.core import World
+        from wecs.rooms import Room, RoomPresence
+        from wecs.inventory import Inventory, Takeable
+        from wecs.mechanics.clock import Clock
+        world = World()
+        num_rooms = self.num_entities // 100
+        rooms = [world.create_entity(Room()) for _ in range(num_rooms)]
+        for i in range(self.num_entities - num_rooms):
+            room = rooms[i % num_rooms]
+            if i % 2:
+                world.create_entity(RoomPresence(room=room._uid), Takeable())
+            else:
+                world.create_entity(
+                    RoomPresence(room=room._uid),
+                    Inventory(),
+                    Clock(),
+                )
+        world.flush_component_updates()
+        return world
+
+    def run(self):
+        import os
+        import tempfile
+        from wecs.core import World
+        print('={}='.format(self.name))
+        time_start = time.perf_counter_ns()
+        world = self.build_world()
+        time_build = (time.perf_counter_ns() - time_start) / 1_000_000
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'world.wecs')
+            time_start = time.perf_counter_ns()
+            world.save(path)
+            time_save = (time.perf_counter_ns() - time_start) / 1_000_000
+            size = os.path.getsize(path)
+            time_start = time.perf_counter_ns()
+            World.load(path)
+            time_load = (time.perf_counter_ns() - time_start) / 1_000_000
+        print('{} entities, {:0.1f} MB'.format(self.num_entities, size / 2**20))
+        print('build: {:0.0f}ms, save: {:0.0f}ms, load: {:0.0f}ms'.format(
+            time_build,
+            time_save,
+            time_load,
+        ))
+        self.record(
+            entities=self.num_entities,
+            bytes=size,
+            build_ms=time_build,
+            save_ms=time_save,
+            load_ms=time_load,
+        )
+
+
+class ImageBench(SnapshotBench):
+    def __init__(self, num_entities=200_000):
+        super().__init__(num_entities)
+        self.name = 'wecs image'
+
+    def run(self):
+        import os
+        import tempfile
+        from wecs.core import World
+        from wecs.rooms import PerceiveRoom
+        from wecs.inventory import Inventory
+        print('={}='.format(self.name))
+        world = self.build_world()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'world.weci')
+            time_start = time.perf_counter_ns()
+            world.save_image(path)
+            time_save = (time.perf_counter_ns() - time_start) / 1_000_000
+            size = os.path.getsize(path)
+            time_start = time.perf_counter_ns()
+            world = World.open_image(path)
+            time_open = (time.perf_counter_ns() - time_start) / 1_000_000
+            time_start = time.perf_counter_ns()
+            world.add_system(PerceiveRoom(), 0)
+            time_add_system = (time.perf_counter_ns() - time_start) / 1_000_000
+            time_start = time.perf_counter_ns()
+            for entity in world.get_entities():
+                if Inventory in entity:
+                    entity[Inventory]
+            time_read = (time.perf_counter_ns() - time_start) / 1_000_000
+            world.image.close()
+        print('{} entities, {:0.1f} MB'.format(self.num_entities, size / 2**20))
+        print('save: {:0.0f}ms, open: {:0.0f}ms, add_system: {:0.0f}ms, '
+              'reading half of the entities: {:0.0f}ms'.format(
+                  time_save,
+                  time_open,
+                  time_add_system,
+                  time_read,
+              ))
+        self.record(
+            entities=self.num_entities,
+            bytes=size,
+            save_ms=time_save,
+            open_ms=time_open,
+            add_system_ms=time_add_system,
+            read_ms=time_read,
+        )
+
+
+class DeltaBench(SnapshotBench):
+    def __init__(self, num_entities=200_000, num_changed=2_000):
+        super().__init__(num_entities)
+        self.num_changed = min(num_changed, self.num_entities // 4)
+        self.name = 'wecs delta'
+
+    def run(self):
+        import gc
+        import os
+        import pickle
+        import tempfile
+        from wecs.core import World
+        from wecs.mechanics.clock import Clock
+        print('={}='.format(self.name))
+        world = self.build_world()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'world.wecs')
+            since = world.record_deltas()
+            world.save(path)
+            size = os.path.getsize(path)
+            replica = World.load(path)
+        clocks = [e for e in world.get_entities() if Clock in e]
+        for entity in clocks[:self.num_changed]:
+            entity[Clock].game_time += 1.0
+            world.mark_changed(entity, Clock)
+        gc.collect()  # Don't time the collection of the loaded world.
+        time_start = time.perf_counter_ns()
+        delta = world.diff(since)
+        time_diff = (time.perf_counter_ns() - time_start) / 1_000_000
+        delta_size = len(pickle.dumps(delta, protocol=pickle.HIGHEST_PROTOCOL))
+        time_start = time.perf_counter_ns()
+        replica.apply_delta(delta)
+        time_apply = (time.perf_counter_ns() - time_start) / 1_000_000
+        print('{} entities, {} changed components'.format(
+            self.num_entities,
+            self.num_changed,
+        ))
+        print('snapshot: {:0.1f} kB, delta: {:0.1f} kB'.format(
+            size / 2**10,
+            delta_size / 2**10,
+        ))
+        print('diff: {:0.0f}ms, apply: {:0.0f}ms'.format(time_diff, time_apply))
+        self.record(
+            entities=self.num_entities,
+            changed=self.num_changed,
+            snapshot_bytes=size,
+            delta_bytes=delta_size,
+            diff_ms=time_diff,
+            apply_ms=time_apply,
+        )
+
+
+class ChurnBench(BaseBenchmark):
+    # Short-lived entities, and components added to and removed from
+    # long-lived ones, with and without pooled components
+    def __init__(self, num_entities=1000, num_frames=200):
+        self.num_entities = self.get_sizes([num_entities])[0]
+        self.num_frames = num_frames
+        super().__init__('wecs churn')
+
+    def run(self):
+        import gc
+        from wecs.core import Component, World, System, and_filter
+        print('={}='.format(self.name))
+        for pooled in [False, True]:
+            @Component(pooled=pooled)
+            class Projectile:
+                speed: float = 1.0
+                target: int = None
+                damage: int = 3
+
+            @Component()
+            class Body:
+                mass: float = 1.0
+
+            class Fly(System):
+                entity_filters = {'flying': and_filter([Projectile, Body])}
+
+            for churn in ['entities', 'components']:
+                world = World()
+                world.add_system(Fly(), 0)
+                bodies = world.create_entities(self.num_entities, [Body])
+                world.flush_component_updates()
+                collections = sum(s['collections'] for s in gc.get_stats())
+                time_start = time.perf_counter_ns()
+                for _ in range(self.num_frames):
+                    if churn == 'entities':
+                        entities = world.create_entities(
+                            self.num_entities,
+                            [Projectile, Body],
+                        )
+                        world.flush_component_updates()
+                        world.destroy_entities(entities)
+                    else:
+                        for body in bodies:
+                            body.add_component(world.new_component(Projectile))
+                        world.flush_component_updates()
+                        for body in bodies:
+                            body.remove_component(Projectile)
+                    world.flush_component_updates()
+                time_total = (time.perf_counter_ns() - time_start) / 1_000_000
+                collections = sum(s['collections'] for s in gc.get_stats()) - collections
+                print('{}, {}: {:0.0f}ms, {} garbage collections'.format(
+                    churn,
+                    'pooled' if pooled else 'not pooled',
+                    time_total,
+                    collections,
+                ))
+                self.record(
+                    churn=churn,
+                    pooled=pooled,
+                    entities=self.num_entities,
+                    frames=self.num_frames,
+                    ms_per_frame=time_total / self.num_frames,
+                    collections=collections,
+                )
+
+
+def make_data_types(storage, slots=False, count=2):
+    # Component types with two float fields each
+    from wecs.core import Component
+    return [
+        Component(storage=storage, slots=slots)(type(
+            'Data{}'.format(i),
+            (),
+            {
+                '__annotations__': {'x': float, 'y': float},
+                'x': 0.0,
+                'y': 0.0,
+            },
+        ))
+        for i in range(count)
     ]
-    for bench in BENCHMARKS:
-        bench.run()
+
+
+class CreationBench(BaseBenchmark):
+    # Creating entities one by one and in bulk, and what they cost in
+    # memory, per storage backend.
+    def __init__(self, sizes=(1_000, 100_000)):
+        self.sizes = self.get_sizes(list(sizes))
+        super().__init__('wecs entity creation')
+
+    def get_backends(self):
+        backends = [('object', False), ('object', True)]
+        try:
+            import numpy
+        except ImportError:
+            print('NumPy is not installed, skipping columnar storage.')
+        else:
+            backends.append(('columnar', False))
+        return backends
+
+    def run(self):
+        import gc
+        from wecs.core import World
+        print('={}='.format(self.name))
+        for storage, slots in self.get_backends():
+            component_types = make_data_types(storage, slots)
+            for num_entities in self.sizes:
+                for method in ['create_entity', 'create_entities']:
+                    def build():
+                        world = World()
+                        if method == 'create_entity':
+                            for _ in range(num_entities):
+                                world.create_entity(*[ct() for ct in component_types])
+                        else:
+                            world.create_entities(num_entities, component_types)
+                        world.flush_component_updates()
+                        return world
+
+                    gc.collect()
+                    time_start = time.perf_counter_ns()
+                    build()
+                    time_build = (time.perf_counter_ns() - time_start) / 1_000
+                    gc.collect()
+                    _, size = measure_memory(build)
+                    backend = storage + (' with slots' if slots else '')
+                    print('{}, {}, {} entities: {:0.2f}us/entity, {:0.0f} bytes/entity'.format(
+                        backend,
+                        method,
+                        num_entities,
+                        time_build / num_entities,
+                        size / num_entities,
+                    ))
+                    self.record(
+                        storage=storage,
+                        slots=slots,
+                        method=method,
+                        entities=num_entities,
+                        us_per_entity=time_build / num_entities,
+                        bytes_per_entity=size / num_entities,
+                    )
+
+
+class FilterScalingBench(BaseBenchmark):
+    # Adding a system to a world of growing size, which matches its
+    # filters against the world's archetypes, and moving entities in and
+    # out of its filters.
+    def __init__(self, sizes=(1, 1_000, 100_000, 1_000_000), moved=0.01):
+        self.sizes = self.get_sizes(list(sizes))
+        self.moved = moved
+        super().__init__('wecs filter scaling')
+
+    def run(self):
+        import gc
+        import itertools
+        from wecs.core import World, System, and_filter, or_filter, not_filter
+        print('={}='.format(self.name))
+        a, b, c, moving = make_data_types('object', count=4)
+
+        class Match(System):
+            entity_filters = {
+                'a and b': and_filter([a, b]),
+                'a or c': or_filter([a, c]),
+                'not c': and_filter([b, not_filter([c])]),
+                'moving': and_filter([moving]),
+            }
+
+        # Entities are spread over the seven archetypes of a, b and c.
+        aspects = [
+            list(types)
+            for length in [1, 2, 3]
+            for types in itertools.combinations([a, b, c], length)
+        ]
+        for num_entities in self.sizes:
+            world = World()
+            for index, aspect in enumerate(aspects):
+                count = num_entities // len(aspects)
+                if index < num_entities % len(aspects):
+                    count += 1
+                world.create_entities(count, aspect)
+            world.flush_component_updates()
+            gc.collect()
+
+            time_start = time.perf_counter_ns()
+            world.add_system(Match(), 0)
+            time_add = (time.perf_counter_ns() - time_start) / 1_000_000
+
+            entities = world.get_entities()
+            entities = entities[:max(1, int(len(entities) * self.moved))]
+            time_start = time.perf_counter_ns()
+            for entity in entities:
+                entity.add_component(moving())
+            world.flush_component_updates()
+            for entity in entities:
+                entity.remove_component(moving)
+            world.flush_component_updates()
+            time_move = (time.perf_counter_ns() - time_start) / 1_000_000
+            print('{} entities: add_system: {:0.2f}ms, moving {} entities in and out: {:0.2f}ms'.format(
+                num_entities,
+                time_add,
+                len(entities),
+                time_move,
+            ))
+            self.record(
+                entities=num_entities,
+                add_system_ms=time_add,
+                moved=len(entities),
+                move_ms=time_move,
+            )
+            del world, entities
+
+
+class UpdateBench(BaseBenchmark):
+    # World.update() with many systems, which each touch the entities in
+    # their filter, and with systems whose filters are empty, which is
+    # the per-system overhead.
+    def __init__(self, num_entities=10_000, systems=(1, 10, 100), num_frames=20):
+        self.num_entities = self.get_sizes([num_entities])[0]
+        self.systems = systems
+        self.num_frames = num_frames
+        super().__init__('wecs update')
+
+    def run(self):
+        from wecs.core import World, System, and_filter
+        print('={}='.format(self.name))
+        component_types = make_data_types('object', count=10)
+        unused, = make_data_types('object', count=1)
+
+        class Touch(System):
+            def update(self, entities_by_filter):
+                component_type = self.component_type
+                for entity in entities_by_filter['touched']:
+                    entity[component_type].x += 1.0
+
+        for num_systems in self.systems:
+            for empty in [False, True]:
+                world = World()
+                for index, component_type in enumerate(component_types):
+                    world.create_entities(
+                        self.num_entities // len(component_types),
+                        [component_type],
+                    )
+                for sort in range(num_systems):
+                    component_type = component_types[sort % len(component_types)]
+                    system_type = type('Touch{}'.format(sort), (Touch,), {
+                        'entity_filters': {
+                            'touched': and_filter([unused if empty else component_type]),
+                        },
+                        'component_type': component_type,
+                    })
+                    world.add_system(system_type(), sort)
+                world.update()
+                time_start = time.perf_counter_ns()
+                for _ in range(self.num_frames):
+                    world.update()
+                time_frame = (time.perf_counter_ns() - time_start) / 1_000_000 / self.num_frames
+                print('{} systems{}: {:0.2f}ms/frame, {:0.1f}us/system'.format(
+                    num_systems,
+                    ', empty filters' if empty else '',
+                    time_frame,
+                    time_frame * 1000 / num_systems,
+                ))
+                self.record(
+                    entities=self.num_entities,
+                    systems=num_systems,
+                    empty_filters=empty,
+                    ms_per_frame=time_frame,
+                )
+
+
+class RoomsBench(BaseBenchmark):
+    # Actors wandering between rooms, taking, dropping, equipping and
+    # unequipping items on the way, see wecs.scenarios
+    def __init__(self, scenarios=((100, 500, 1_000), (1_000, 5_000, 10_000)),
+                 num_frames=50, seed=0):
+        # Capped by the number of actors and items
+        self.scenarios = [
+            scenario for scenario in scenarios
+            if self.max_entities is None or sum(scenario[1:]) <= self.max_entities
+        ] or [scenarios[0]]
+        self.num_frames = num_frames
+        self.seed = seed
+        super().__init__('wecs rooms')
+
+    def run(self):
+        from wecs.scenarios import RoomsScenario
+        print('={}='.format(self.name))
+        for num_rooms, num_actors, num_items in self.scenarios:
+            scenario = RoomsScenario(
+                num_rooms=num_rooms,
+                num_actors=num_actors,
+                num_items=num_items,
+                seed=self.seed,
+            )
+            time_act = 0
+            time_update = 0
+            for _ in range(self.num_frames):
+                time_start = time.perf_counter_ns()
+                scenario.act()
+                time_act += time.perf_counter_ns() - time_start
+                time_start = time.perf_counter_ns()
+                scenario.world.update()
+                time_update += time.perf_counter_ns() - time_start
+            time_act /= 1_000_000 * self.num_frames
+            time_update /= 1_000_000 * self.num_frames
+            print('{} rooms, {} actors, {} items: {:0.2f}ms/frame, '
+                  'choosing actions: {:0.2f}ms/frame'.format(
+                      num_rooms,
+                      num_actors,
+                      num_items,
+                      time_update,
+                      time_act,
+                  ))
+            self.record(
+                rooms=num_rooms,
+                actors=num_actors,
+                items=num_items,
+                seed=self.seed,
+                frames=self.num_frames,
+                ms_per_frame=time_update,
+                act_ms_per_frame=time_act,
+                actions=scenario.actions,
+            )
+
+
+class ClockTreeBench(BaseBenchmark):
+    # DetermineTimestep for clocks in trees of different shapes, each
+    # with about the same number of clocks
+    def __init__(self, num_clocks=1_000, num_frames=50):
+        self.num_clocks = self.get_sizes([num_clocks])[0]
+        self.num_frames = num_frames
+        super().__init__('wecs clock trees')
+
+    def get_shapes(self):
+        # [(shape, branching, depth, number of trees)]
+        num_clocks = self.num_clocks
+        balanced_depth = 0
+        while (3 ** (balanced_depth + 2) - 1) // 2 <= num_clocks:
+            balanced_depth += 1
+        # A forest of at least two trees with ten children per node
+        forest_depth = 2
+        while forest_depth and 2 * (10 ** (forest_depth + 1) - 1) // 9 > num_clocks:
+            forest_depth -= 1
+        tree_size = (10 ** (forest_depth + 1) - 1) // 9
+        return [
+            ('flat', num_clocks - 1, 1, 1),
+            ('chain', 1, num_clocks - 1, 1),
+            ('balanced', 3, balanced_depth, 1),
+            ('forest', 10, forest_depth, max(1, num_clocks // tree_size)),
+        ]
+
+    def build_tree(self, world, branching, depth):
+        from wecs.mechanics.clock import Clock, SettableClock
+        root = world.create_entity(Clock(clock=SettableClock(1 / 60)))
+        level = [root]
+        for _ in range(depth):
+            level = [
+                world.create_entity(Clock(parent=parent._uid, scaling_factor=0.5))
+                for parent in level
+                for _ in range(branching)
+            ]
+
+    def run(self):
+        from wecs.core import World
+        from wecs.mechanics.clock import DetermineTimestep
+        print('={}='.format(self.name))
+        for shape, branching, depth, num_trees in self.get_shapes():
+            world = World()
+            world.add_system(DetermineTimestep(), 0)
+            for _ in range(num_trees):
+                self.build_tree(world, branching, depth)
+            num_clocks = len(world.get_entities())
+            world.update()
+            time_start = time.perf_counter_ns()
+            for _ in range(self.num_frames):
+                world.update()
+            time_frame = (time.perf_counter_ns() - time_start) / 1_000_000 / self.num_frames
+            print('{}, {} clocks: {:0.2f}ms/frame, {:0.2f}us/clock'.format(
+                shape,
+                num_clocks,
+                time_frame,
+                time_frame * 1000 / num_clocks,
+            ))
+            self.record(
+                shape=shape,
+                branching=branching,
+                depth=depth,
+                trees=num_trees,
+                clocks=num_clocks,
+                ms_per_frame=time_frame,
+            )
+
+
+if __name__ == '__main__':
+    import json
+    import argparse
+    import platform
+    import datetime
+
+    BENCHMARKS = {
+        'simpleecs': SimpleEcsBench,
+        'creation': CreationBench,
+        'filters': FilterMatchingBench,
+        'filter-scaling': FilterScalingBench,
+        'update': UpdateBench,
+        'memory': ComponentMemoryBench,
+        'churn': ChurnBench,
+        'rooms': RoomsBench,
+        'clocks': ClockTreeBench,
+        'parallel': ParallelSystemBench,
+        'snapshot': SnapshotBench,
+        'image': ImageBench,
+        'delta': DeltaBench,
+    }
+    parser = argparse.ArgumentParser()
+    parser.add_argument('names', nargs='*', choices=[[]] + list(BENCHMARKS))
+    parser.add_argument('--json', help="File to write the results into")
+    parser.add_argument('--max-entities', type=int, help="Cap the size of worlds")
+    args = parser.parse_args()
+    BaseBenchmark.max_entities = args.max_entities
+
+    results = []
+    for name in args.names or list(BENCHMARKS):
+        try:
+            benchmark = BENCHMARKS[name]()
+        except ImportError as exc:
+            print('={}= skipped: {}'.format(name, exc))
+            continue
+        benchmark.run()
+        print()
+        results.extend(benchmark.results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(
+                {
+                    'date': datetime.datetime.now().isoformat(),
+                    'python': platform.python_version(),
+                    'implementation': platform.python_implementation(),
+                    'platform': platform.platform(),
+                    'machine': platform.machine(),
+                    'max_entities': args.max_entities,
+                    'results': results,
+                },
+                f,
+                indent=2,
+            )
@@ -17,15 +17,16 @@ setup(
     classifiers=[
         'Development Status :: 3 - Alpha',
         'Intended Audience :: Developers',
-        'Programming Language :: Python :: 3.7',
+        'Programming Language :: Python :: 3.8',
     ],
     keywords='ecs',
     packages=find_packages(exclude=['tests', 'examples']),
-    python_requires='>=3.7, <4',
+    python_requires='>=3.8, <4',
     install_requires=[],
     extras_require={
         'panda3d': ['panda3d', 'cefpanda', 'jinja2'],
         'graphviz': ['graphviz'],
+        'columnar': ['numpy'],
         'bobthewizard': ['crayons'],
     },
 )
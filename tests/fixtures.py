@@ -1,7 +1,11 @@
+import dataclasses
+
 import pytest
 
 from wecs.core import Entity, System, Component, World
 from wecs.core import and_filter
+from wecs.rooms import Room, RoomPresence
+from wecs.inventory import Inventory, Takeable
 
 
 @Component()
@@ -72,3 +76,30 @@ def enabler():
 @pytest.fixture
 def system():
     return IncreaseCount()
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'world.wecs')
+
+
+def populate(world):
+    # A room with an item, and an actor in the room carrying it.
+    room = world.create_entity(Room(), name='room')
+    item = world.create_entity(Takeable(), RoomPresence(room=room._uid))
+    actor = world.create_entity(
+        RoomPresence(room=room._uid),
+        Inventory(contents=[item._uid]),
+    )
+    return room, item, actor
+
+
+def dump(world, archetypes=False):
+    # The entities of a world as plain data, to compare worlds with.
+    return {
+        entity._uid: (
+            entity._archetype if archetypes else entity.name,
+            {ct: dataclasses.asdict(c) for ct, c in entity.components.items()},
+        )
+        for entity in world.entities if entity is not None
+    }
@@ -0,0 +1,121 @@
+from wecs.core import Component, System, AndFilter, and_filter, not_filter
+
+from fixtures import world, entity
+
+
+@Component()
+class ComponentA:
+    pass
+
+
+@Component()
+class ComponentB:
+    pass
+
+
+class UsesA(System):
+    entity_filters = {
+        'a': and_filter([ComponentA]),
+    }
+
+
+def test_new_entity_is_in_root_archetype(world, entity):
+    assert entity._archetype is world.root_archetype
+    assert entity in world.root_archetype.entities
+
+
+def test_new_entity_enters_root_archetype_filters(world):
+    class WithoutA(System):
+        entity_filters = {
+            'not_a': not_filter([ComponentA]),
+        }
+
+    system = WithoutA()
+    world.add_system(system, 0)
+    entity = world.create_entity()
+    assert entity in world.entity_filters[system.entity_filters['not_a']]
+
+    entity.add_component(ComponentA())
+    world.flush_component_updates()
+    assert entity not in world.entity_filters[system.entity_filters['not_a']]
+
+
+def test_entities_share_archetype(world):
+    entity_1 = world.create_entity(ComponentA(), ComponentB())
+    entity_2 = world.create_entity(ComponentB(), ComponentA())
+    world.flush_component_updates()
+    assert entity_1._archetype is entity_2._archetype
+    assert entity_1._archetype.component_types == {ComponentA, ComponentB}
+    assert entity_1._archetype.entities == {entity_1, entity_2}
+
+
+def test_archetype_transitions_are_cached(world, entity):
+    entity.add_component(ComponentA())
+    world.flush_component_updates()
+    archetype_a = entity._archetype
+    assert world.root_archetype.add_edges[ComponentA] is archetype_a
+    assert archetype_a.remove_edges[ComponentA] is world.root_archetype
+
+    entity.remove_component(ComponentA)
+    world.flush_component_updates()
+    assert entity._archetype is world.root_archetype
+    assert entity not in archetype_a.entities
+
+
+def test_filter_resolves_to_archetypes(world):
+    world.add_system(UsesA(), 0)
+    filter_func = UsesA.entity_filters['a']
+    entity_1 = world.create_entity(ComponentA())
+    entity_2 = world.create_entity(ComponentA(), ComponentB())
+    entity_3 = world.create_entity(ComponentB())
+    world.flush_component_updates()
+    archetypes = world.filter_archetypes[filter_func]
+    assert set(archetypes) == {entity_1._archetype, entity_2._archetype}
+    assert world.entity_filters[filter_func] == {entity_1, entity_2}
+
+
+def test_system_added_after_archetypes(world):
+    entity = world.create_entity(ComponentA())
+    world.flush_component_updates()
+    world.add_system(UsesA(), 0)
+    filter_func = UsesA.entity_filters['a']
+    assert world.filter_archetypes[filter_func] == [entity._archetype]
+    assert world.entity_filters[filter_func] == {entity}
+
+    world.remove_system(UsesA)
+    assert filter_func not in entity._archetype.filters
+
+
+class CountingFilter(AndFilter):
+    def __init__(self, types_and_filters):
+        super().__init__(types_and_filters)
+        self.calls = 0
+
+    def __call__(self, entity):
+        self.calls += 1
+        return super().__call__(entity)
+
+
+def test_filters_are_indexed_by_component_type(world):
+    filter_a = CountingFilter([ComponentA])
+    filter_b = CountingFilter([ComponentB])
+
+    class UsesAAndB(System):
+        entity_filters = {
+            'a': filter_a,
+            'b': filter_b,
+        }
+
+    world.add_system(UsesAAndB(), 0)
+    assert set(world.filters_by_component_type[ComponentA]) == {filter_a}
+    assert set(world.filters_by_component_type[ComponentB]) == {filter_b}
+
+    calls_a, calls_b = filter_a.calls, filter_b.calls
+    entity = world.create_entity(ComponentA())
+    world.flush_component_updates()
+    assert filter_a.calls == calls_a + 1
+    assert filter_b.calls == calls_b
+    assert world.entity_filters[filter_a] == {entity}
+
+    world.remove_system(UsesAAndB)
+    assert world.filters_by_component_type == {}
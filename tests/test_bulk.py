@@ -0,0 +1,78 @@
+import pytest
+
+from wecs.core import Component, NoSuchUID
+from wecs.aspects import Aspect
+
+from fixtures import world, system, Counter, Enabler, IncreaseCount
+
+
+@Component()
+class Position:
+    x: float = 0.0
+
+
+def test_create_entities_from_types(world, system):
+    world.add_system(system, 0)
+    entities = world.create_entities(10, [Position, Enabler])
+    assert len(entities) == 10
+    assert len({id(e[Position]) for e in entities}) == 10
+    assert entities[0]._archetype is None
+
+    world.flush_component_updates()
+    assert entities[0]._archetype.entities == set(entities)
+    assert entities[0]._archetype.component_types == {Position, Enabler}
+
+
+def test_create_entities_updates_filters(world, system):
+    world.add_system(system, 0)
+    entities = world.create_entities(
+        10,
+        lambda: [Counter(count=0, inited=False)],
+    )
+    has_counter = IncreaseCount.entity_filters['has_counter']
+    assert world.entity_filters[has_counter] == set()
+
+    world.flush_component_updates()
+    assert system.init_called == 10
+    assert world.entity_filters[has_counter] == set(entities)
+
+
+def test_create_entities_from_aspect(world, system):
+    world.add_system(system, 0)
+    aspect = Aspect([Counter, Enabler], overrides={Counter: dict(count=0, inited=False)})
+    entities = world.create_entities(5, aspect)
+    world.update()
+    assert all(e[Counter].inited for e in entities)
+    assert all(e[Counter].count == 1 for e in entities)
+
+
+def test_create_entities_with_clashing_components(world):
+    with pytest.raises(KeyError):
+        world.create_entities(1, lambda: [Enabler(), Enabler()])
+    with pytest.raises(KeyError):
+        world.create_entities(3, [Enabler, Enabler])
+    assert world.entities == []
+    assert world.create_entities(0, [Enabler]) == []
+
+
+def test_destroy_entities(world, system):
+    world.add_system(system, 0)
+    entities = world.create_entities(
+        10,
+        lambda: [Counter(count=0, inited=False), Enabler()],
+    )
+    world.flush_component_updates()
+    uids = [e._uid for e in entities]
+
+    world.destroy_entities(entities[:5])
+    world.destroy_entities(uids[5:8])
+    assert world.get_entity(uids[0]) is entities[0]
+    world.flush_component_updates()
+    assert system.destroy_called == 2 * 8
+    assert not any(e[Counter].inited for e in entities[:8])
+    for uid in uids[:8]:
+        with pytest.raises(NoSuchUID):
+            world.get_entity(uid)
+    assert world.entity_filters[IncreaseCount.entity_filters['has_counter']] == set(entities[8:])
+    assert entities[0]._archetype is None
+    assert entities[8]._archetype.entities == set(entities[8:])
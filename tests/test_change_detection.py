@@ -0,0 +1,180 @@
+import copy
+import pickle
+
+import pytest
+
+from wecs.core import Component, System, World
+from wecs.core import and_filter, or_filter
+from wecs.core import changed_filter, added_filter, removed_filter
+
+
+@Component(tracked=True, slots=True)
+class Position:
+    x: int = 0
+
+
+@Component(tracked=True)
+class Velocity:
+    x: int = 1
+
+
+@Component()
+class Frozen:
+    pass
+
+
+class Watch(System):
+    entity_filters = {
+        'changed': and_filter([Position, changed_filter([Position])]),
+        'added': and_filter([added_filter([Velocity])]),
+        'removed': and_filter([removed_filter([Velocity])]),
+    }
+
+    def __init__(self):
+        System.__init__(self)
+        self.seen = []
+
+    def update(self, entities_by_filter):
+        self.seen.append({
+            name: set(entities)
+            for name, entities in entities_by_filter.items()
+        })
+
+
+class Move(System):
+    entity_filters = {
+        'moving': and_filter([Position, Velocity, changed_filter([Velocity])]),
+    }
+
+    def update(self, entities_by_filter):
+        for entity in entities_by_filter['moving']:
+            entity[Position].x += entity[Velocity].x
+
+
+@pytest.fixture
+def world():
+    return World()
+
+
+@pytest.fixture
+def watch(world):
+    system = Watch()
+    world.add_system(system, 0)
+    return system
+
+
+def test_tracked_component_types():
+    assert Position.__slots__ == ('x', '_entity')
+    assert not hasattr(Velocity, '__slots__')
+    with pytest.raises(ValueError):
+        changed_filter([Frozen])
+
+
+def test_temporal_clauses_must_be_top_level():
+    with pytest.raises(ValueError):
+        or_filter([Position, changed_filter([Position])]).get_temporal_clauses()
+    with pytest.raises(ValueError):
+        changed_filter([and_filter([Position])])
+    clause = changed_filter([Position])
+    assert and_filter([Position, clause]).get_temporal_clauses() == [clause]
+    assert and_filter([Position]).get_temporal_clauses() == []
+
+
+def test_first_run_sees_everything(world, watch):
+    entity = world.create_entity(Position(), Velocity())
+    world.update()
+    assert watch.seen[-1] == {
+        'changed': {entity},
+        'added': {entity},
+        'removed': set(),
+    }
+
+
+def test_only_changes_are_seen(world, watch):
+    entity = world.create_entity(Position(), Velocity())
+    other = world.create_entity(Position(), Velocity())
+    world.update()
+    world.update()
+    assert watch.seen[-1] == {'changed': set(), 'added': set(), 'removed': set()}
+
+    entity[Position].x = 5
+    world.update()
+    assert watch.seen[-1]['changed'] == {entity}
+    world.update()
+    assert watch.seen[-1]['changed'] == set()
+
+
+def test_added_and_removed(world, watch):
+    entity = world.create_entity(Position())
+    world.update()
+    entity.add_component(Velocity())
+    world.update()
+    assert watch.seen[-1]['added'] == {entity}
+    world.update()
+    assert watch.seen[-1]['added'] == set()
+
+    entity.remove_component(Velocity)
+    world.update()
+    assert watch.seen[-1]['removed'] == {entity}
+    assert watch.seen[-1]['added'] == set()
+    world.update()
+    assert watch.seen[-1]['removed'] == set()
+
+
+def test_destroyed_entities_are_removed(world, watch):
+    entity = world.create_entity(Position(), Velocity())
+    world.update()
+    world.destroy_entities([entity])
+    world.update()
+    # Destroyed entities are not in any filter anymore.
+    assert watch.seen[-1]['removed'] == set()
+    assert world.change_logs['removed'][Velocity] == {}
+
+
+def test_detached_components_are_not_tracked(world, watch):
+    entity = world.create_entity(Position(), Velocity())
+    world.update()
+    velocity = entity[Velocity]
+    entity.remove_component(Velocity)
+    world.update()
+    assert velocity._entity is None
+    velocity.x = 3
+    assert world.change_logs['changed'] == {Position: {}}
+
+
+def test_systems_see_changes_by_other_systems(world):
+    world.add_system(Move(), 0)
+    entity = world.create_entity(Position(), Velocity(x=2))
+    world.update()
+    assert entity[Position].x == 2
+    world.update()
+    assert entity[Position].x == 2
+    entity[Velocity].x = 3
+    world.update()
+    assert entity[Position].x == 5
+
+
+def test_change_logs_are_trimmed(world, watch):
+    entities = [world.create_entity(Position()) for _ in range(10)]
+    world.update()
+    for entity in entities:
+        entity[Position].x += 1
+    assert len(world.change_logs['changed'][Position]) == 10
+    world.update()
+    assert len(world.change_logs['changed'][Position]) == 0
+
+
+def test_logs_are_pruned_with_their_systems(world, watch):
+    assert set(world.change_logs['changed']) == {Position}
+    world.remove_system(Watch)
+    assert world.temporal_clauses == {}
+    assert world.change_logs == {'changed': {}, 'added': {}, 'removed': {}}
+
+
+def test_copies_leave_entity_out(world):
+    entity = world.create_entity(Position(x=3), Velocity(x=4))
+    for component_type in [Position, Velocity]:
+        component = entity[component_type]
+        for duplicate in [copy.copy(component), pickle.loads(pickle.dumps(component))]:
+            assert duplicate.x == component.x
+            assert getattr(duplicate, '_entity', None) is None
@@ -0,0 +1,85 @@
+import copy
+import pickle
+
+import pytest
+
+numpy = pytest.importorskip('numpy')
+
+from wecs.core import Component, System, and_filter
+
+from fixtures import world
+
+
+@Component(storage='columnar')
+class Vitals:
+    health: float = 10.0
+    mana: int = 5
+    alive: bool = True
+    name: str = 'Bob'
+
+
+class Regenerate(System):
+    entity_filters = {
+        'vitals': and_filter([Vitals]),
+    }
+
+    def update(self, entities_by_filter):
+        vitals = self.world.get_columns(self.entity_filters['vitals'], Vitals)
+        vitals['health'] = vitals['health'] + 1.0
+
+
+def test_fields_are_stored_in_columns():
+    vitals = Vitals(health=3.0)
+    assert vitals.health == 3.0
+    assert vitals.mana == 5
+    assert vitals.alive is True
+    assert vitals.name == 'Bob'
+    assert Vitals._store.columns['health'][vitals._row] == 3.0
+
+    vitals.health = 4.5
+    assert Vitals._store.columns['health'][vitals._row] == 4.5
+    assert 'name' not in Vitals._store.columns
+
+
+def test_rows_are_recycled():
+    vitals = Vitals()
+    row = vitals._row
+    del vitals
+    assert Vitals()._row == row
+
+
+def test_copies_get_their_own_row():
+    vitals = Vitals(health=3.0)
+    for other in [copy.copy(vitals), pickle.loads(pickle.dumps(vitals))]:
+        assert other._row != vitals._row
+        assert other.health == 3.0
+        other.health = 1.0
+        assert vitals.health == 3.0
+
+
+def test_columns_for_filter(world):
+    world.add_system(Regenerate(), 0)
+    entities = [
+        world.create_entity(Vitals(health=float(i)))
+        for i in range(100)
+    ]
+    world.update()
+    assert [e[Vitals].health for e in entities] == [i + 1.0 for i in range(100)]
+
+
+def test_columns_are_invalidated(world):
+    world.add_system(Regenerate(), 0)
+    filter_func = Regenerate.entity_filters['vitals']
+    entity = world.create_entity(Vitals(health=1.0))
+    world.flush_component_updates()
+    assert len(world.get_columns(filter_func, Vitals)) == 1
+
+    # Replacing the component keeps the entity in the filter, but
+    # changes the row.
+    entity.remove_component(Vitals)
+    world.flush_component_updates()
+    entity.add_component(Vitals(health=5.0))
+    other = world.create_entity(Vitals(health=7.0))
+    world.flush_component_updates()
+    columns = world.get_columns(filter_func, Vitals)
+    assert sorted(columns['health']) == [5.0, 7.0]
@@ -0,0 +1,116 @@
+from wecs.core import Component, System, and_filter
+
+from fixtures import world, entity, component, system
+from fixtures import Counter, Enabler, IncreaseCount
+
+
+def test_add_then_remove_cancels(world, entity, component, system):
+    world.add_system(system, 0)
+    entity.add_component(component)
+    entity.remove_component(Counter)
+    assert Counter not in entity
+    assert not world.commands.added
+    assert not world.commands.removed
+
+    world.flush_component_updates()
+    assert system.init_called == 0
+    assert system.destroy_called == 0
+    assert entity._archetype is world.root_archetype
+
+
+def test_removal_is_deferred(world, entity, component, system):
+    world.add_system(system, 0)
+    entity.add_component(component)
+    world.flush_component_updates()
+    entity.remove_component(Counter)
+    assert entity[Counter] is component
+
+    world.flush_component_updates()
+    assert Counter not in entity
+    assert system.destroy_called == 1
+
+
+def test_changes_are_coalesced_per_entity(world, entity, component, system):
+    world.add_system(system, 0)
+    entity.add_component(component)
+    entity.add_component(Enabler())
+    assert list(world.commands.added) == [entity]
+
+    world.flush_component_updates()
+    assert system.init_called == 2
+    assert system.init_done == 1
+
+
+def test_same_changes_are_applied_together(world, system):
+    world.add_system(system, 0)
+    entities = [world.create_entity() for _ in range(10)]
+    for entity in entities:
+        entity.add_component(Counter(count=0, inited=False))
+    world.flush_component_updates()
+    assert entities[0]._archetype.entities == set(entities)
+    assert system.init_called == 10
+
+
+def test_private_command_buffer(world, entity, component, system):
+    world.add_system(system, 0)
+    buffer = world.create_command_buffer()
+    buffer.add_component(entity, component)
+    assert entity[Counter] is component
+    assert not world.commands.added
+
+    world.flush_component_updates()
+    assert system.init_called == 1
+    assert world.entity_filters[IncreaseCount.entity_filters['has_counter']] == {entity}
+
+    world.remove_command_buffer(buffer)
+    assert world.command_buffers == [world.commands]
+
+
+def test_removal_cancels_addition_in_other_buffer(world, entity, component):
+    buffer = world.create_command_buffer()
+    buffer.add_component(entity, component)
+    entity.remove_component(Counter)
+    assert not buffer.added
+    assert not world.commands.removed
+
+
+def test_removal_through_two_buffers(world, entity, component, system):
+    world.add_system(system, 0)
+    entity.add_component(component)
+    entity.add_component(Enabler())
+    world.flush_component_updates()
+    buffer = world.create_command_buffer()
+    buffer.remove_component(entity, Counter)
+    entity.remove_component(Counter)
+    entity.remove_component(Enabler)
+
+    world.flush_component_updates()
+    assert Counter not in entity
+    assert Enabler not in entity
+    assert entity._archetype is world.root_archetype
+    assert system.destroy_called == 2
+
+
+@Component()
+class Marker:
+    pass
+
+
+class MarkOnInit(System):
+    entity_filters = {
+        'counter': and_filter([Counter]),
+    }
+
+    def init_entity(self, filter_name, entity):
+        entity.add_component(Marker())
+
+
+def test_changes_made_during_flush_wait_for_next_flush(world, entity, component):
+    world.add_system(MarkOnInit(), 0)
+    entity.add_component(component)
+    world.flush_component_updates()
+    assert Marker in entity
+    assert Marker not in entity._archetype.component_types
+
+    world.flush_component_updates()
+    assert Marker in entity._archetype.component_types
@@ -0,0 +1,77 @@
+import pickle
+from dataclasses import field
+
+import pytest
+
+from wecs.core import Component
+
+
+@Component(slots=True)
+class Position:
+    x: float = 0.0
+    y: float = 0.0
+    history: list = field(default_factory=list)
+
+
+@Component()
+class Unslotted:
+    x: float = 0.0
+
+
+@Component(slots=True)
+class Marker:
+    pass
+
+
+def test_slotted_component():
+    position = Position(x=1.0)
+    assert not hasattr(position, '__dict__')
+    assert position.x == 1.0
+    assert position.y == 0.0
+    assert position.history == []
+    assert Position().history is not position.history
+    with pytest.raises(AttributeError):
+        position.z = 0.0
+
+
+def test_components_are_not_slotted_by_default():
+    unslotted = Unslotted()
+    assert hasattr(unslotted, '__dict__')
+    unslotted.y = 0.0
+
+
+def test_subclass_of_slotted_component():
+    @Component(slots=True)
+    class Position3D(Position):
+        z: float = 0.0
+
+    position = Position3D(x=1.0, z=2.0)
+    assert not hasattr(position, '__dict__')
+    assert (position.x, position.y, position.z) == (1.0, 0.0, 2.0)
+
+
+def test_tag_components_are_interned():
+    assert Marker() is Marker()
+
+    @Component(slots=True)
+    class SubMarker(Marker):
+        pass
+
+    assert SubMarker() is SubMarker()
+    assert SubMarker() is not Marker()
+
+
+def test_subclass_of_interned_component():
+    @Component()
+    class Counter(Marker):
+        count: int = 0
+
+    counter = Counter(count=1)
+    assert counter.count == 1
+    assert Counter() is not counter
+
+
+def test_pickling():
+    position = pickle.loads(pickle.dumps(Position(x=1.0, history=[2])))
+    assert (position.x, position.history) == (1.0, [2])
+    assert pickle.loads(pickle.dumps(Marker())) is Marker()
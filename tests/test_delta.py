@@ -0,0 +1,133 @@
+import dataclasses
+
+import pytest
+
+from wecs.core import Component, World, UID, reference
+from wecs.rooms import Room, RoomPresence
+from wecs.inventory import Inventory, Takeable
+from wecs.scenarios import RoomsScenario
+
+from fixtures import populate, dump
+
+
+@Component(tracked=True)
+class Position:
+    x: int = 0
+    y: int = 0
+    target: UID = reference(default=None)
+    trail: list = dataclasses.field(default_factory=list, metadata={'delta': False})
+
+
+@pytest.fixture
+def worlds():
+    primary = World()
+    start = primary.record_deltas()
+    room, item, actor = populate(primary)
+    actor.add_component(Position(x=1, target=item._uid))
+    replica = World()
+    delta = primary.diff(start)
+    replica.apply_delta(delta)
+    return primary, replica, delta.tick
+
+
+def test_replica_catches_up(worlds):
+    primary, replica, _ = worlds
+    assert dump(replica) == dump(primary)
+    room = replica.get_entities()[0]
+    assert room.name == 'room'
+    assert len(replica.get_referrers(room, RoomPresence)) == 2
+    assert replica.get_tagged(Takeable) == {replica.get_entities()[1]}
+
+
+def test_changed_fields(worlds):
+    primary, replica, since = worlds
+    entities = primary.get_entities()
+    actor = entities[2]
+    actor[Position].y = 5
+    delta = primary.diff(since)
+    assert delta.created == {} and delta.destroyed == [] and delta.components == {}
+    assert delta.fields == {actor._uid: {Position: {'y': 5}}}
+    assert len(delta) == 1
+    replica.apply_delta(delta)
+    assert dump(replica) == dump(primary)
+
+    assert len(primary.diff(delta.tick)) == 0
+
+
+def test_changes_in_place(worlds):
+    primary, replica, since = worlds
+    actor = primary.get_entities()[2]
+    actor[Inventory].contents.append(primary.get_entities()[0]._uid)
+    primary.mark_changed(actor, Inventory)
+    delta = primary.diff(since)
+    replica.apply_delta(delta)
+    assert dump(replica) == dump(primary)
+    # The replica has a copy of the list.
+    assert replica.get_entity(actor._uid)[Inventory].contents is not actor[Inventory].contents
+
+
+def test_structural_changes(worlds):
+    primary, replica, since = worlds
+    room, item, actor = primary.get_entities()
+    actor.remove_component(Inventory)
+    item.add_component(Position(y=2))
+    primary.destroy_entities([room])
+    primary.flush_component_updates()
+    new = primary.create_entity(Room(), name='new room')
+    gone = primary.create_entity(Room())
+    primary.destroy_entities([gone])
+    delta = primary.diff(since)
+    assert delta.destroyed == [room._uid]
+    assert list(delta.created) == [new._uid]
+    # The slot of the room is reused.
+    assert new._uid & 0xffffffff == room._uid & 0xffffffff
+
+    replica.apply_delta(delta)
+    assert dump(replica) == dump(primary)
+    assert replica.get_entity(actor._uid)[Position].target == item._uid
+
+
+def test_excluded_fields(worlds):
+    primary, replica, since = worlds
+    actor = primary.get_entities()[2]
+    actor[Position].trail = [(1, 1)]
+    delta = primary.diff(since)
+    assert len(delta) == 0
+    item = primary.get_entities()[1]
+    item.add_component(Position(trail=[(2, 2)]))
+    delta = primary.diff(delta.tick)
+    replica.apply_delta(delta)
+    assert replica.get_entity(item._uid)[Position].trail == []
+
+
+def test_trimming(worlds):
+    primary, replica, since = worlds
+    primary.get_entities()[2][Position].x = 3
+    delta = primary.diff(since)
+    primary.trim_deltas(delta.tick)
+    assert primary.delta_log.fields == {}
+    with pytest.raises(ValueError):
+        primary.diff(since)
+    assert len(primary.diff(delta.tick)) == 0
+
+
+def test_not_recording():
+    with pytest.raises(ValueError):
+        World().diff(0)
+
+
+def test_scenario_replica_stays_in_sync():
+    # Actions change references, e.g. RoomPresence.room, and lists of
+    # them in place, e.g. Inventory.contents, without tracked=True.
+    primary = World()
+    since = primary.record_deltas()
+    scenario = RoomsScenario(
+        num_rooms=10, num_actors=20, num_items=40, seed=1, world=primary,
+    )
+    replica = World()
+    for _ in range(10):
+        scenario.run(1)
+        delta = primary.diff(since)
+        replica.apply_delta(delta)
+        since = delta.tick
+    assert dump(replica) == dump(primary)
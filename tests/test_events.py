@@ -0,0 +1,126 @@
+from wecs.core import Component, System, World, EventChannel
+from wecs.rooms import Room, RoomPresence, PerceiveRoom
+from wecs.rooms import ChangeRoom, ChangeRoomAction
+from wecs.inventory import Inventory, Takeable, TakeAction, TakeOrDrop
+
+from fixtures import world
+
+
+@Component()
+class Hit:
+    damage: int
+
+
+class Attack(System):
+    entity_filters = {}
+    event_writes = [Hit]
+
+    def update(self, entities_by_filter):
+        self.world.send_event(Hit(damage=1))
+
+
+class CountHits(System):
+    entity_filters = {}
+    event_reads = [Hit]
+
+    def __init__(self):
+        System.__init__(self)
+        self.hits = []
+
+    def update(self, entities_by_filter):
+        self.hits.append(len(self.world.get_channel(Hit).read(self)))
+
+
+def test_each_reader_sees_each_event_once():
+    channel = EventChannel(Hit)
+    channel.send(Hit(damage=1))
+    assert [e.damage for e in channel.read('a')] == [1]
+    channel.send_batch([Hit(damage=2), Hit(damage=3)])
+    assert [e.damage for e in channel.read('a')] == [2, 3]
+    assert [e.damage for e in channel.read('b')] == [1, 2, 3]
+    assert channel.read('a') == []
+
+
+def test_events_are_kept_for_two_updates():
+    channel = EventChannel(Hit)
+    channel.send(Hit(damage=1))
+    channel.swap()
+    channel.send(Hit(damage=2))
+    assert [e.damage for e in channel.read('a')] == [1, 2]
+    channel.swap()
+    assert [e.damage for e in channel.read('b')] == [2]
+    assert channel.read('a') == []
+    channel.swap()
+    assert len(channel) == 0
+    assert channel.read('b') == []
+
+
+def test_reader_before_and_after_sender(world):
+    before = CountHits()
+    after = CountHits()
+    world.add_system(before, 0)
+    world.add_system(Attack(), 1)
+    world.add_system(after, 2, add_duplicates=True)
+    for _ in range(3):
+        world.update()
+    assert before.hits == [0, 1, 1]
+    assert after.hits == [1, 1, 1]
+    assert len(world.get_channel(Hit)) == 2
+
+
+def test_event_readers_are_scheduled_after_writers():
+    world = World()
+    attack = Attack()
+    count = CountHits()
+    world.add_system(attack, 0)
+    world.add_system(count, 1)
+    assert world.get_stages() == [[attack], [count]]
+
+
+def test_removed_systems_stop_reading(world):
+    system = CountHits()
+    world.add_system(system, 0)
+    world.send_event(Hit(damage=1))
+    world.update()
+    assert system in world.get_channel(Hit).cursors
+    world.remove_system(CountHits)
+    assert system not in world.get_channel(Hit).cursors
+
+
+def test_actions_as_events(world):
+    world.add_system(PerceiveRoom(), 0)
+    world.add_system(ChangeRoom(), 1)
+    world.add_system(TakeOrDrop(), 2)
+    room = world.create_entity(Room())
+    other_room = world.create_entity(Room(adjacent=[room._uid]))
+    room[Room].adjacent.append(other_room._uid)
+    item = world.create_entity(RoomPresence(room=room._uid), Takeable())
+    actor = world.create_entity(RoomPresence(room=room._uid), Inventory())
+    world.flush_component_updates()
+
+    world.send_action(actor, TakeAction(item=item._uid))
+    world.update()
+    world.flush_component_updates()
+    assert actor[Inventory].contents == [item._uid]
+    assert not item.has_component(RoomPresence)
+
+    world.send_action(actor, ChangeRoomAction(room=other_room._uid))
+    world.update()
+    assert actor[RoomPresence].room == other_room._uid
+    world.update()
+    assert actor[RoomPresence].room == other_room._uid
+
+
+def test_action_components_still_work(world):
+    world.add_system(ChangeRoom(), 0)
+    room = world.create_entity(Room())
+    other_room = world.create_entity(Room(adjacent=[room._uid]))
+    room[Room].adjacent.append(other_room._uid)
+    actor = world.create_entity(
+        RoomPresence(room=room._uid),
+        ChangeRoomAction(room=other_room._uid),
+    )
+    world.update()
+    world.flush_component_updates()
+    assert actor[RoomPresence].room == other_room._uid
+    assert ChangeRoomAction not in actor
@@ -17,7 +17,7 @@ def test_create_entity(world):
 
 def test_basic_component_handling(world, entity):
     component = Counter(count=0, inited=False)
-    assert entity.get_components() == set()
+    assert list(entity.get_components()) == []
     assert not entity.has_component(Counter)
 
     entity.add_component(component)
@@ -29,10 +29,33 @@ def test_basic_component_handling(world, entity):
 
     entity.remove_component(Counter)
     world.flush_component_updates()
-    assert entity.get_components() == set()
+    assert list(entity.get_components()) == []
     assert not entity.has_component(Counter)
 
 
+@Component()
+class SubCounter(Counter):
+    pass
+
+
+def test_component_lookup_by_exact_type(world, entity):
+    component = SubCounter(count=0, inited=False)
+    entity.add_component(component)
+    world.flush_component_updates()
+    assert not entity.has_component(Counter)
+    assert Counter not in entity
+    with pytest.raises(KeyError):
+        entity.get_component(Counter)
+
+
+def test_component_lookup_by_subclass(world, entity):
+    component = SubCounter(count=0, inited=False)
+    entity.add_component(component)
+    world.flush_component_updates()
+    assert entity.has_component(Counter, subclasses=True)
+    assert entity.get_component(Counter, subclasses=True) is component
+
+
 def test_can_not_get_nonexistent_component(entity):
     with pytest.raises(KeyError):
         entity.get_component(Counter)
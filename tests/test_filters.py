@@ -1,7 +1,9 @@
-import dataclasses
+import itertools
+import random
 
-from wecs.core import Component
-from wecs.core import and_filter, or_filter
+from wecs.core import Component, AndFilter, OrFilter, NotFilter
+from wecs.core import and_filter, or_filter, not_filter
+from wecs.core import get_component_mask
 
 from fixtures import world, entity
 
@@ -136,3 +138,80 @@ def test_compound_filter_4(world, entity):
     world.flush_component_updates()
     # C
     assert not f(entity)
+
+
+def test_not_filter(world, entity):
+    f = and_filter([ComponentA, not_filter([ComponentB, ComponentC])])
+    assert not f(entity)
+
+    entity.add_component(ComponentA())
+    world.flush_component_updates()
+    assert f(entity)
+
+    entity.add_component(ComponentC())
+    world.flush_component_updates()
+    assert not f(entity)
+
+    entity.remove_component(ComponentC)
+    world.flush_component_updates()
+    assert f(entity)
+
+
+def test_not_filter_dependencies():
+    f = and_filter([ComponentA, not_filter([ComponentB])])
+    assert f.get_component_dependencies() == {ComponentA, ComponentB}
+
+
+def test_compiled_filters_match_truth_tables():
+    a, b, c = ComponentA, ComponentB, ComponentC
+    cases = [
+        (and_filter([a, or_filter([b, c])]),
+         lambda a, b, c: a and (b or c)),
+        (or_filter([and_filter([a, b]), not_filter([c])]),
+         lambda a, b, c: (a and b) or not c),
+        (not_filter([and_filter([a, not_filter([b])]), c]),
+         lambda a, b, c: not ((a and not b) or c)),
+        (and_filter([not_filter([or_filter([a, not_filter([b])])]), c]),
+         lambda a, b, c: not (a or not b) and c),
+        (and_filter([]), lambda a, b, c: True),
+        (or_filter([]), lambda a, b, c: False),
+    ]
+    for f, truth in cases:
+        for present in itertools.product([False, True], repeat=3):
+            types = [t for t, p in zip([a, b, c], present) if p]
+            assert f.matches(get_component_mask(types)) == truth(*present)
+
+
+def test_filters_with_too_many_terms():
+    types = [Component()(type('Type{}'.format(i), (), {})) for i in range(24)]
+    triples = [types[i:i + 3] for i in range(0, 24, 3)]
+    pairs = [types[i:i + 2] for i in range(0, 24, 2)]
+    nested = and_filter(triples[0])
+    for triple in triples[1:]:
+        nested = not_filter([
+            and_filter(triple),
+            or_filter([nested, not_filter(triple[1:])]),
+        ])
+    filters = [
+        not_filter([and_filter(triple) for triple in triples]),  # 3**8 terms
+        and_filter([or_filter(pair) for pair in pairs]),  # 2**12 terms
+        nested,
+    ]
+
+    def evaluate(f, present):
+        if not isinstance(f, (AndFilter, OrFilter, NotFilter)):
+            return f in present
+        results = [evaluate(clause, present) for clause in f.types_and_filters]
+        if isinstance(f, AndFilter):
+            return all(results)
+        elif isinstance(f, OrFilter):
+            return any(results)
+        return not any(results)
+
+    rng = random.Random(0)
+    for f in filters[:2]:
+        assert f.get_terms() is None
+    for f in filters:
+        for _ in range(200):
+            present = {t for t in types if rng.random() < 0.7}
+            assert f.matches(get_component_mask(present)) == evaluate(f, present)
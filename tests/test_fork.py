@@ -0,0 +1,200 @@
+import dataclasses
+
+from wecs.core import Component, System, World, and_filter
+from wecs.rooms import Room, RoomPresence, ChangeRoomAction
+from wecs.rooms import PerceiveRoom, ChangeRoom
+from wecs.inventory import Inventory, Takeable, TakeAction, TakeOrDrop
+from wecs.equipment import Equipment, Slot, Equippable
+from wecs.equipment import UnequipAction, EquipOrUnequip
+from wecs.mechanics import Clock, SettableClock, DetermineTimestep
+from wecs.scenarios import RoomsScenario
+
+from fixtures import world, dump
+
+
+class Hand:  # A slot type
+    pass
+
+
+@Component()
+class Score:
+    value: int = 0
+    history: list = dataclasses.field(default_factory=list)
+
+
+class Count(System):
+    entity_filters = {'scored': and_filter([Score])}
+
+    def update(self, entities_by_filter):
+        for entity in entities_by_filter['scored']:
+            score = entity[Score]
+            score.value += 1
+            score.history.append(score.value)
+
+
+def make_rooms(world):
+    world.add_system(ChangeRoom(), 0)
+    world.add_system(PerceiveRoom(), 1)
+    world.add_system(TakeOrDrop(), 2)
+    room = world.create_entity()
+    other_room = world.create_entity(Room(adjacent=[room._uid]))
+    room.add_component(Room(adjacent=[other_room._uid]))
+    item = world.create_entity(RoomPresence(room=room._uid), Takeable())
+    actor = world.create_entity(RoomPresence(room=room._uid), Inventory())
+    world.update()
+    return room, other_room, item, actor
+
+
+def test_lookahead(world):
+    room, other_room, item, actor = make_rooms(world)
+    actor.add_component(ChangeRoomAction(room=other_room._uid))
+    world.flush_component_updates()
+    before = dump(world, archetypes=True)
+
+    with world.fork():
+        world.update()
+        assert actor[RoomPresence].room == other_room._uid
+        assert ChangeRoomAction not in actor
+        assert world.get_referrers(other_room, RoomPresence) == [actor]
+
+    assert dump(world, archetypes=True) == before
+    assert set(world.get_referrers(room, RoomPresence)) == {item, actor}
+    assert world.get_referrers(other_room, RoomPresence) == []
+    assert not world.forks
+    # The original timeline goes on as if nothing happened.
+    world.update()
+    assert actor[RoomPresence].room == other_room._uid
+
+
+def test_take_and_roll_back(world):
+    room, other_room, item, actor = make_rooms(world)
+    fork = world.fork()
+    before = dump(world, archetypes=True)
+    actor.add_component(TakeAction(item=item._uid))
+    world.update()
+    world.flush_component_updates()
+    assert actor[Inventory].contents == [item._uid]
+    assert RoomPresence not in item
+    fork.rollback()
+    assert dump(world, archetypes=True) == before
+    assert item in world.get_tagged(Takeable)
+    assert set(world.get_referrers(room, RoomPresence)) == {item, actor}
+
+
+def test_actions_sent_as_events_roll_back(world):
+    # The actor isn't in TakeOrDrop's filters.
+    room, other_room, item, actor = make_rooms(world)
+    before = dump(world, archetypes=True)
+    with world.fork():
+        world.send_action(actor, TakeAction(item=item._uid))
+        world.update()
+        world.flush_component_updates()
+        assert actor[Inventory].contents == [item._uid]
+    assert dump(world, archetypes=True) == before
+    assert world.get_referrers(item, Inventory) == []
+
+
+def test_unequip_into_other_inventory_rolls_back(world):
+    world.add_system(EquipOrUnequip(), 0)
+    item = world.create_entity(Equippable(type=Hand))
+    slot = world.create_entity(Slot(type=Hand, content=item._uid))
+    actor = world.create_entity(Equipment(slots=[slot._uid]), Inventory())
+    chest = world.create_entity(Inventory())
+    world.flush_component_updates()
+    before = dump(world, archetypes=True)
+    with world.fork():
+        actor.add_component(UnequipAction(slot=slot._uid, target=chest._uid))
+        world.update()
+        assert chest[Inventory].contents == [item._uid]
+        assert slot[Slot].content is None
+    assert dump(world, archetypes=True) == before
+    assert world.get_referrers(item, Inventory) == []
+
+
+def test_scenario_rolls_back():
+    scenario = RoomsScenario(num_rooms=10, num_actors=20, num_items=40, seed=1)
+    world = scenario.world
+    before = dump(world, archetypes=True)
+    with world.fork():
+        scenario.run(5)
+    assert dump(world, archetypes=True) == before
+    locations = scenario.get_item_locations()
+    assert all(len(places) == 1 for places in locations.values())
+
+
+def test_entities_and_uids(world):
+    entities = [world.create_entity(Score()) for _ in range(5)]
+    world.destroy_entities(entities[:2])
+    world.flush_component_updates()
+    before = dump(world, archetypes=True)
+    free_indices = list(world.free_indices)
+
+    with world.fork():
+        created = world.create_entity(Score(value=3))
+        world.destroy_entities([entities[2], created])
+        world.create_entities(3, [Score])
+        entities[3].remove_component(Score)
+        entities[4].add_component(Room())
+        world.flush_component_updates()
+
+    assert dump(world, archetypes=True) == before
+    assert world.free_indices == free_indices
+    assert world.get_entity(entities[2]._uid) is entities[2]
+    assert world.create_entity()._uid == created._uid
+
+
+def test_systems_writes_are_saved(world):
+    world.add_system(Count(), 0)
+    entities = [world.create_entity(Score()) for _ in range(3)]
+    world.update()
+    fork = world.fork()
+    world.update()
+    world.update()
+    assert entities[0][Score].history == [1, 2, 3]
+    fork.rollback()
+    assert [e[Score].value for e in entities] == [1, 1, 1]
+    assert entities[0][Score].history == [1]
+
+
+def test_cost_follows_changes(world):
+    world.add_system(DetermineTimestep(), 0)
+    clock = world.create_entity(Clock(clock=SettableClock(0.01)))
+    for _ in range(100):
+        world.create_entity(Score())
+    world.update()
+    fork = world.fork()
+    world.update()
+    assert len(fork.values) == 1
+    assert clock[Clock].game_time == 0.01
+    clock[Clock].game_time = 5.0
+    fork.rollback()
+    assert clock[Clock].game_time == 0.01
+
+
+def test_preserving_by_hand(world):
+    entity = world.create_entity(Score())
+    world.flush_component_updates()
+    with world.fork():
+        world.preserve_component(entity, Score)
+        entity[Score].value = 7
+    assert entity[Score].value == 0
+
+
+def test_nested_forks():
+    world = World()
+    entity = world.create_entity(Score())
+    outer = world.fork()
+    world.preserve_component(entity, Score)
+    entity[Score].value = 1
+    inner = world.fork()
+    world.preserve_component(entity, Score)
+    entity[Score].value = 2
+    inner.rollback()
+    assert entity[Score].value == 1
+    assert world.forks == [outer]
+    world.fork()
+    world.preserve_component(entity, Score)
+    entity[Score].value = 3
+    outer.discard()
+    assert world.forks == []
+    assert entity[Score].value == 3
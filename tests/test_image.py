@@ -0,0 +1,132 @@
+import dataclasses
+
+import pytest
+
+from wecs.core import Component, Entity, System, World
+from wecs.core import and_filter, changed_filter
+from wecs.image import ImageEntity, open_image
+from wecs.snapshot import SnapshotError
+from wecs.rooms import Room, RoomPresence, PerceiveRoom
+from wecs.inventory import Inventory, Takeable
+
+from fixtures import path, populate, dump
+
+
+@Component(tracked=True)
+class Position:
+    x: float = 0.0
+    label: str = ''
+    path: list = dataclasses.field(default_factory=list)
+
+
+class Watch(System):
+    entity_filters = {'moved': and_filter([Position, changed_filter([Position])])}
+
+    def update(self, entities_by_filter):
+        self.moved = set(entities_by_filter['moved'])
+
+
+def make_world():
+    world = World()
+    room, item, actor = populate(world)
+    actor.add_component(Position(x=1.5, label='hero', path=[(0, 0)]))
+    world.create_entity(Position())
+    world.destroy_entities([world.create_entity()])
+    world.flush_component_updates()
+    return world
+
+
+def test_round_trip(path):
+    world = make_world()
+    world.save_image(path)
+    opened = World.open_image(path)
+    assert dump(opened) == dump(world)
+    assert opened.generations == world.generations
+    assert opened.free_indices == world.free_indices
+    opened.image.close()
+
+
+def test_components_are_read_on_access(path):
+    world = make_world()
+    world.save_image(path)
+    opened = World.open_image(path)
+    entities = opened.get_entities()
+    assert all(type(entity) is ImageEntity for entity in entities)
+
+    item = entities[1]
+    assert Takeable in item
+    assert item.has_tag(Takeable)
+    assert not item.has_component(Room)
+    assert type(item) is ImageEntity
+    assert item[RoomPresence].room == entities[0]._uid
+    assert type(item) is Entity
+    assert set(item.components) == {Takeable, RoomPresence}
+    assert type(entities[0]) is ImageEntity
+    opened.image.close()
+
+
+def test_references_are_indexed_without_reading(path):
+    world = make_world()
+    world.save_image(path)
+    opened = World.open_image(path)
+    room, item, actor = opened.get_entities()[:3]
+    assert set(opened.get_referrers(room, RoomPresence)) == {item, actor}
+    assert opened.get_referrers(item, Inventory) == [actor]
+    assert type(room) is ImageEntity
+
+    opened.destroy_entities([item])
+    opened.flush_component_updates()
+    assert actor[Inventory].contents == []
+    opened.image.close()
+
+
+def test_systems_see_opened_entities(path):
+    world = make_world()
+    world.save_image(path)
+    opened = World.open_image(path)
+    opened.add_system(PerceiveRoom(), 0)
+    assert len(opened.entity_filters[PerceiveRoom.entity_filters['presences']]) == 2
+    opened.update()
+    room = opened.get_entities()[0]
+    assert len(room[Room].presences) == 2
+    opened.image.close()
+
+
+def test_tracked_components_are_attached(path):
+    world = make_world()
+    world.save_image(path)
+    opened = World.open_image(path)
+    watch = Watch()
+    opened.add_system(watch, 0)
+    opened.update()
+    opened.update()
+    assert watch.moved == set()
+    entity = opened.get_entities()[3]
+    entity[Position].x = 2.0
+    opened.update()
+    assert watch.moved == {entity}
+    opened.image.close()
+
+
+def test_close_reads_everything(path):
+    world = make_world()
+    world.save_image(path)
+    opened = World.open_image(path)
+    image = opened.image
+    image.close()
+    assert opened.image is None
+    assert all(type(entity) is Entity for entity in opened.get_entities())
+    assert dump(opened) == dump(world)
+
+
+def test_not_an_image(path):
+    World().save(path)
+    with pytest.raises(SnapshotError):
+        World.open_image(path)
+
+
+def test_open_needs_empty_world(path):
+    world = make_world()
+    world.save_image(path)
+    with pytest.raises(SnapshotError):
+        open_image(path, world)
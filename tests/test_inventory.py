@@ -97,6 +97,24 @@ def test_drop_item(world, room):
     assert item.get_component(RoomPresence).room == actor.get_component(RoomPresence).room
 
 
+def test_item_can_only_be_taken_once(world, room, item):
+    world.add_system(PerceiveRoom(), 0)
+    world.add_system(TakeOrDrop(), 1)
+    world.add_system(PerceiveRoom(), 2, add_duplicates=True)
+    actors = [
+        world.create_entity(
+            RoomPresence(room=room._uid),
+            Inventory(),
+            TakeAction(item=item._uid),
+        )
+        for _ in range(2)
+    ]
+    world.update()
+
+    contents = [actor.get_component(Inventory).contents for actor in actors]
+    assert sorted(contents) == [[], [item._uid]]
+
+
 def test_can_not_take_item_from_other_room(world, room, item):
     world.add_system(PerceiveRoom(), 0)
     world.add_system(TakeOrDrop(), 1)
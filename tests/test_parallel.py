@@ -0,0 +1,85 @@
+import pytest
+
+pytest.importorskip('numpy')
+
+from wecs.core import Component, World, and_filter
+from wecs.parallel import ParallelSystem
+
+
+@Component()
+class Position:
+    x: float = 0.0
+    y: float = 0.0
+
+
+@Component()
+class Score:
+    value: int = 0
+
+
+class ScorePositions(ParallelSystem):
+    entity_filters = {'scored': and_filter([Position, Score])}
+    parallel_filter = 'scored'
+    parallel_reads = {Position: ['x', 'y']}
+    parallel_writes = {Score: ['value']}
+    chunk_size = 3
+    processes = 2
+
+    @classmethod
+    def process_chunk(cls, chunk):
+        xs = chunk[Position, 'x']
+        ys = chunk[Position, 'y']
+        return {(Score, 'value'): [int(x * 10 + y) for x, y in zip(xs, ys)]}
+
+
+class ScorePositionsInProcess(ScorePositions):
+    processes = 0
+
+
+def make_world(system):
+    world = World()
+    world.add_system(system, 0)
+    entities = [
+        world.create_entity(Position(x=float(i), y=float(i % 3)), Score())
+        for i in range(10)
+    ]
+    return world, entities
+
+
+@pytest.mark.parametrize('system_type', [ScorePositions, ScorePositionsInProcess])
+def test_parallel_system(system_type):
+    system = system_type()
+    world, entities = make_world(system)
+    try:
+        world.update()
+    finally:
+        system.shutdown()
+    assert [e[Score].value for e in entities] == [
+        i * 10 + i % 3 for i in range(10)
+    ]
+    assert [e[Position].x for e in entities] == [float(i) for i in range(10)]
+
+
+def test_declared_access():
+    system = ScorePositions()
+    assert system.get_component_reads() == {Position}
+    assert system.get_component_writes() == {Score}
+
+
+def test_no_entities():
+    system = ScorePositions()
+    world = World()
+    world.add_system(system, 0)
+    world.update()
+    assert system.executor is None
+
+
+def test_removing_the_system_shuts_down_its_pool():
+    system = ScorePositions()
+    world, entities = make_world(system)
+    world.update()
+    processes = list(system.executor._processes.values())
+    assert processes
+    world.remove_system(ScorePositions)
+    assert system.executor is None
+    assert not any(process.is_alive() for process in processes)
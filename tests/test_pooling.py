@@ -0,0 +1,135 @@
+import dataclasses
+
+import pytest
+
+from wecs.core import Component, NoSuchUID, System, and_filter
+from wecs.inventory import TakeAction
+
+from fixtures import world
+
+
+@Component(pooled=True)
+class Projectile:
+    speed: float = 1.0
+    target: int = None
+    hits: list = dataclasses.field(default_factory=list)
+
+
+@Component(pooled=True)
+class Effect:
+    kind: str
+
+
+@Component(pooled=True, slots=True)
+class Marker:
+    pass
+
+
+class Impact(System):
+    entity_filters = {'flying': and_filter([Projectile])}
+
+    def __init__(self):
+        System.__init__(self)
+        self.seen = []
+
+    def destroy_entity(self, filter_name, entity, components_by_type):
+        self.seen.append(components_by_type[Projectile].speed)
+
+
+def test_destroy_is_deferred(world):
+    entity = world.create_entity(Projectile())
+    other = world.create_entity()
+    last = world.create_entity()
+    entity.destroy()
+    world.destroy_entity(other._uid)
+    del world[last._uid]
+    assert world.get_entity(entity._uid) is entity
+    world.flush_component_updates()
+    for destroyed in [entity, other, last]:
+        with pytest.raises(NoSuchUID):
+            world.get_entity(destroyed._uid)
+    # The slot is reused, with a new UID.
+    new = world.create_entity()
+    assert new._uid & 0xffffffff == last._uid & 0xffffffff
+    assert new._uid != last._uid
+
+
+def test_removed_components_are_reused(world):
+    entity = world.create_entity(Projectile(speed=3.0, target=5, hits=[1]))
+    world.flush_component_updates()
+    projectile = entity[Projectile]
+    entity.remove_component(Projectile)
+    assert world.pools.get(Projectile, []) == []
+    world.flush_component_updates()
+    assert world.pools[Projectile] == [projectile]
+
+    reused = world.new_component(Projectile, target=7)
+    assert reused is projectile
+    assert (reused.speed, reused.target, reused.hits) == (1.0, 7, [])
+    assert world.new_component(Projectile) is not projectile
+
+
+def test_destroyed_entities_return_components(world):
+    impact = Impact()
+    world.add_system(impact, 0)
+    entities = [world.create_entity(Projectile(speed=2.0), Effect('smoke')) for _ in range(3)]
+    world.flush_component_updates()
+    world.destroy_entities(entities)
+    world.flush_component_updates()
+    assert impact.seen == [2.0, 2.0, 2.0]
+    assert len(world.pools[Projectile]) == 3
+    assert len(world.pools[Effect]) == 3
+    assert Projectile not in entities[0].components
+
+    pooled = {id(component) for component in world.pools[Projectile]}
+    created = world.create_entities(2, [Projectile])
+    assert {id(entity[Projectile]) for entity in created} <= pooled
+    assert len(world.pools[Projectile]) == 1
+
+
+def test_required_fields(world):
+    entity = world.create_entity(Effect('smoke'))
+    world.flush_component_updates()
+    entity.remove_component(Effect)
+    world.flush_component_updates()
+    with pytest.raises(TypeError):
+        world.new_component(Effect)
+    with pytest.raises(TypeError):
+        world.new_component(Effect, kind='fire', color='red')
+    assert world.new_component(Effect, kind='fire').kind == 'fire'
+
+
+def test_pool_size(world):
+    world.max_pool_size = 2
+    entities = [world.create_entity(Projectile()) for _ in range(5)]
+    world.destroy_entities(entities)
+    world.flush_component_updates()
+    assert len(world.pools[Projectile]) == 2
+
+
+def test_what_is_not_pooled(world):
+    with pytest.raises(ValueError):
+        Component(storage='columnar', pooled=True)
+    assert not hasattr(Marker, '_pooled')  # Interned
+    entity = world.create_entity(Marker())
+    world.flush_component_updates()
+    entity.remove_component(Marker)
+    world.flush_component_updates()
+    assert Marker not in world.pools
+
+    entity = world.create_entity(Projectile())
+    world.flush_component_updates()
+    with world.fork():
+        entity.remove_component(Projectile)
+        world.flush_component_updates()
+        assert Projectile not in world.pools
+    assert Projectile in entity
+
+
+def test_actions_are_pooled(world):
+    actor = world.create_entity(TakeAction(item=1))
+    world.flush_component_updates()
+    action = actor[TakeAction]
+    actor.remove_component(TakeAction)
+    world.flush_component_updates()
+    assert world.new_component(TakeAction, item=2) is action
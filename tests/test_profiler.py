@@ -0,0 +1,189 @@
+import tracemalloc
+
+from wecs.core import Component, System, World, and_filter
+from wecs.profiler import Histogram, Profiler
+
+from fixtures import world
+
+
+@Component()
+class Ticks:
+    count: int = 0
+
+
+class Tick(System):
+    entity_filters = {'ticking': and_filter([Ticks])}
+
+    def __init__(self):
+        System.__init__(self)
+        self.initialized = []
+        self.destroyed = []
+
+    def init_entity(self, filter_name, entity):
+        self.initialized.append(entity)
+
+    def destroy_entity(self, filter_name, entity, components_by_type):
+        self.destroyed.append(components_by_type[Ticks])
+
+    def update(self, entities_by_filter):
+        for entity in entities_by_filter['ticking']:
+            entity[Ticks].count += 1
+
+
+class Idle(System):
+    entity_filters = {'ticking': and_filter([Ticks])}
+    component_reads = [Ticks]
+
+
+class Hoard(System):
+    entity_filters = {'ticking': and_filter([Ticks])}
+    component_reads = [Ticks]
+
+    def __init__(self):
+        System.__init__(self)
+        self.hoard = []
+
+    def update(self, entities_by_filter):
+        self.hoard = [[0] * 1000 for entity in entities_by_filter['ticking']]
+        scratch = [0] * 100000
+
+
+def test_histogram():
+    histogram = Histogram(100)
+    assert histogram.get_stats() == {'count': 0, 'total': 0}
+    for duration in range(1, 201):
+        histogram.record(duration)
+    stats = histogram.get_stats()
+    # Only the most recent 100 samples count, except for the totals.
+    assert stats['count'] == 200
+    assert stats['total'] == sum(range(1, 201))
+    assert (stats['p50'], stats['p95'], stats['p99'], stats['max']) == (150, 195, 199, 200)
+    assert stats['mean'] == 150.5
+
+
+def test_profiling_is_optional(world):
+    tick = Tick()
+    world.add_system(tick, 0)
+    world.create_entity(Ticks())
+    world.update()
+    assert world.profiler is None
+
+
+def test_world_timings(world):
+    tick = Tick()
+    idle = Idle()
+    world.add_system(tick, 0)
+    world.add_system(idle, 1)
+    profiler = world.enable_profiling()
+    assert world.enable_profiling() is profiler
+
+    entities = list(world.create_entities(2, [Ticks]))
+    entities.append(world.create_entity(Ticks()))
+    world.update()
+    world.update()
+    entities[0].remove_component(Ticks)
+    world.destroy_entities(entities[1:])
+    world.flush_component_updates()
+    assert len(tick.initialized) == 3
+    assert len(tick.destroyed) == 3
+
+    assert profiler.get_stats('frame')['count'] == 2
+    assert profiler.get_stats('update', tick)['count'] == 2
+    assert profiler.get_stats('update', idle)['count'] == 2
+    assert profiler.get_stats('flush')['count'] == 5
+    assert profiler.get_stats('filters', 'create')['count'] == 1
+    assert profiler.get_stats('filters', 'change')['count'] == 2
+    assert profiler.get_stats('filters', 'destroy')['count'] == 1
+    assert profiler.get_stats('init_entity', tick)['count'] == 2
+    assert profiler.get_stats('destroy_entity', tick)['count'] == 2
+    # Systems that don't override the hooks don't run them.
+    assert profiler.get_stats('init_entity', idle)['count'] == 0
+
+    stats = profiler.get_stats('update', tick)
+    assert 0 < stats['p50'] <= stats['p95'] <= stats['p99'] <= stats['max']
+    kinds = [kind for kind, subject, stats in profiler.report()]
+    assert set(kinds) == {'frame', 'update', 'flush', 'filters', 'init_entity', 'destroy_entity'}
+    report = profiler.format_report()
+    assert 'update Tick' in report
+
+    world.disable_profiling()
+    world.update()
+    assert profiler.get_stats('frame')['count'] == 2
+
+
+def test_parallel_stages():
+    world = World(max_workers=2)
+    tick = Tick()
+    world.add_system(tick, 0)
+    world.add_system(Idle(), 1)
+    profiler = world.enable_profiling()
+    world.create_entity(Ticks())
+    world.update()
+    assert profiler.get_stats('update', tick)['count'] == 1
+
+
+def test_reset():
+    profiler = Profiler(window=4)
+    profiler.record('update', None, 5)
+    profiler.reset()
+    assert profiler.report() == []
+
+
+def test_allocations(world):
+    hoard = Hoard()
+    world.add_system(hoard, 0)
+    world.add_system(Idle(), 1)
+    for _ in range(5):
+        world.create_entity(Ticks())
+    was_tracing = tracemalloc.is_tracing()
+    allocations = world.enable_allocation_profiling(frames=2)
+    world.update()
+    world.update()
+    world.update()
+    assert len(allocations.frames) == 2
+
+    stats = allocations.get_frame()[hoard]
+    assert 5 * 8000 < stats['size'] < 100000
+    assert stats['count'] >= 6
+    # The scratch list is gone, but was allocated.
+    assert stats['peak'] > 800000
+    site, size, count = stats['top'][0]
+    assert site.endswith('test_profiler.py:{}'.format(
+        Hoard.update.__code__.co_firstlineno + 1,
+    ))
+    assert size >= 5 * 8000
+
+    means = allocations.get_stats(hoard)
+    assert means['frames'] == 2
+    assert means['size'] > 5 * 8000
+    assert allocations.get_stats(Tick()) is None
+    assert 'Hoard' in allocations.format_report()
+
+    world.disable_allocation_profiling()
+    assert world.allocation_profiler is None
+    assert tracemalloc.is_tracing() == was_tracing
+
+
+def test_allocations_without_world_update(world):
+    # Like with ECSShowBase, which runs systems one by one
+    hoard = Hoard()
+    world.add_system(hoard, 0)
+    world.create_entity(Ticks())
+    allocations = world.enable_allocation_profiling()
+    world.update_system(hoard)
+    world.update_system(hoard)
+    world.disable_allocation_profiling()
+    assert len(allocations.frames) == 2
+
+
+def test_allocations_in_parallel_stages():
+    world = World(max_workers=2)
+    hoard = Hoard()
+    world.add_system(hoard, 0)
+    world.add_system(Idle(), 1)
+    world.create_entity(Ticks())
+    assert len(world.get_stages()[0]) == 2
+    allocations = world.enable_allocation_profiling()
+    world.update()
+    world.disable_allocation_profiling()
+    assert set(allocations.get_frame()) == set(world.systems.values())
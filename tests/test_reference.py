@@ -4,6 +4,8 @@ from fixtures import world
 
 from wecs.core import UID
 from wecs.core import NoSuchUID
+from wecs.core import get_uid_index
+from wecs.core import get_uid_generation
 from wecs.core import Component
 
 
@@ -14,26 +16,43 @@ class Reference:
 
 def test_user_defined_names(world):
     entity = world.create_entity(name="foo")
-    assert entity._uid.name == "foo"
+    assert entity.name == "foo"
 
 
 def test_automatic_names(world):
     entity = world.create_entity()
-    assert entity._uid.name
+    assert entity.name
 
 
 def test_automatic_unique_names(world):
     entity_1 = world.create_entity()
     entity_2 = world.create_entity()
-    assert entity_1._uid.name != entity_2._uid.name
+    assert entity_1.name != entity_2.name
 
 
-# This test feels silly... More on it when serialization comes knocking.
-def test_uid():
-    uid_1 = UID()
-    uid_2 = UID()
-    assert uid_1 is not uid_2
-    assert uid_1 != uid_2
+def test_unique_uids(world):
+    entity_1 = world.create_entity()
+    entity_2 = world.create_entity()
+    assert entity_1._uid != entity_2._uid
+
+
+def test_null_uid(world):
+    world.create_entity()
+    with pytest.raises(NoSuchUID):
+        world.get_entity(UID())
+
+
+def test_recycled_uid(world):
+    entity_1 = world.create_entity()
+    uid_1 = entity_1._uid
+    world.remove_entity(entity_1)
+    entity_2 = world.create_entity()
+    uid_2 = entity_2._uid
+    assert get_uid_index(uid_1) == get_uid_index(uid_2)
+    assert get_uid_generation(uid_1) != get_uid_generation(uid_2)
+    assert world.get_entity(uid_2) is entity_2
+    with pytest.raises(NoSuchUID):
+        world.get_entity(uid_1)
 
 
 def test_reference():
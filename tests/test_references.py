@@ -0,0 +1,111 @@
+import pytest
+
+from wecs.core import Component, DanglingReference
+from wecs.core import reference
+from wecs.rooms import Room, RoomPresence
+from wecs.inventory import Inventory
+from wecs.mechanics.clock import Clock
+
+from fixtures import world
+
+
+@Component()
+class Target:
+    uid: int = reference(on_destroy='report', default=None)
+
+
+def test_reference_fields():
+    assert Clock._reference_fields == {'parent': ('clear', False)}
+    assert Inventory._reference_fields == {'contents': ('clear', True)}
+    with pytest.raises(ValueError):
+        reference(on_destroy='explode')
+
+
+def test_presences_in_room(world):
+    room = world.create_entity(Room())
+    other_room = world.create_entity(Room())
+    presences = [
+        world.create_entity(RoomPresence(room=room._uid))
+        for _ in range(3)
+    ]
+    world.create_entity(RoomPresence(room=other_room._uid))
+    assert set(world.get_referrers(room, RoomPresence)) == set(presences)
+    assert world.get_referrers(room._uid, RoomPresence, 'presences') == []
+
+
+def test_assignment_updates_index(world):
+    parent = world.create_entity(Clock())
+    other_parent = world.create_entity(Clock())
+    child = world.create_entity(Clock(parent=parent._uid))
+    assert world.get_referrers(parent) == [child]
+
+    child[Clock].parent = other_parent._uid
+    assert world.get_referrers(parent) == []
+    assert world.get_referrers(other_parent) == [child]
+
+
+def test_reference_lists(world):
+    item = world.create_entity()
+    other_item = world.create_entity()
+    actor = world.create_entity(Inventory(contents=[item._uid]))
+    assert world.get_referrers(item) == [actor]
+
+    actor[Inventory].contents.append(other_item._uid)
+    world.update_references(actor, Inventory)
+    assert world.get_referrers(other_item) == [actor]
+
+    actor[Inventory].contents = []
+    assert world.get_referrers(item) == []
+    assert world.get_referrers(other_item) == []
+
+
+def test_removed_components_leave_index(world):
+    room = world.create_entity(Room())
+    actor = world.create_entity(RoomPresence(room=room._uid))
+    world.flush_component_updates()
+    actor.remove_component(RoomPresence)
+    world.flush_component_updates()
+    assert world.get_referrers(room) == []
+    assert world.references == {}
+
+
+def test_cancelled_components_leave_index(world):
+    room = world.create_entity(Room())
+    actor = world.create_entity()
+    actor.add_component(RoomPresence(room=room._uid))
+    actor.remove_component(RoomPresence)
+    assert world.get_referrers(room) == []
+
+
+def test_destroyed_targets_are_cleared(world):
+    parent = world.create_entity(Clock())
+    child = world.create_entity(Clock(parent=parent._uid))
+    item = world.create_entity()
+    actor = world.create_entity(Inventory(contents=[item._uid, item._uid]))
+    world.flush_component_updates()
+    world.destroy_entities([parent, item])
+    world.flush_component_updates()
+    assert child[Clock].parent is None
+    assert actor[Inventory].contents == []
+    assert world.referrers == {}
+
+
+def test_destroyed_targets_are_reported(world):
+    target = world.create_entity()
+    referrer = world.create_entity(Target(uid=target._uid))
+    world.flush_component_updates()
+    world.destroy_entities([target])
+    world.flush_component_updates()
+    assert referrer[Target].uid == target._uid
+    events = world.get_channel(DanglingReference).read('test')
+    assert events == [DanglingReference(referrer._uid, Target, 'uid', target._uid)]
+
+
+def test_destroyed_referrers_leave_index(world):
+    parent = world.create_entity(Clock())
+    child = world.create_entity(Clock(parent=parent._uid))
+    world.flush_component_updates()
+    world.destroy_entities([child])
+    world.flush_component_updates()
+    assert world.get_referrers(parent) == []
+    assert world.references == {}
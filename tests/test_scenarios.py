@@ -0,0 +1,61 @@
+from wecs.rooms import Room, RoomPresence
+from wecs.scenarios import RoomsScenario
+
+
+def dump(scenario):
+    return (
+        scenario.actions,
+        scenario.get_item_locations(),
+        {actor._uid: actor[RoomPresence].room for actor in scenario.actors},
+    )
+
+
+def test_world():
+    scenario = RoomsScenario(num_rooms=20, num_actors=10, num_items=30, equippable=1.0)
+    world = scenario.world
+    assert len(world.get_systems()) == 4
+    assert len(scenario.rooms) == 20
+    # Rooms are adjacent to each other both ways.
+    for room in scenario.rooms:
+        adjacent = room[Room].adjacent
+        assert adjacent
+        for uid in adjacent:
+            assert room._uid in world.get_entity(uid)[Room].adjacent
+    # Presences perceive their rooms from the start.
+    actor = scenario.actors[0]
+    assert actor._uid in actor[RoomPresence].presences
+
+
+def test_items_stay_in_one_place():
+    scenario = RoomsScenario(num_rooms=10, num_actors=50, num_items=100, seed=1)
+    scenario.run(30)
+    assert scenario.frames == 30
+    assert all(count > 0 for count in scenario.actions.values())
+    locations = scenario.get_item_locations()
+    assert all(len(places) == 1 for places in locations.values())
+    kinds = {places[0][0] for places in locations.values()}
+    assert kinds == {'room', 'inventory', 'slot'}
+
+
+def test_runs_are_reproducible():
+    runs = [
+        dump(RoomsScenario(num_rooms=10, num_actors=20, num_items=40, seed=seed).run(20))
+        for seed in [5, 5, 6]
+    ]
+    assert runs[0] == runs[1]
+    assert runs[0] != runs[2]
+
+
+def test_mix():
+    scenario = RoomsScenario(
+        num_rooms=5,
+        num_actors=10,
+        num_items=10,
+        mix={'move': 1.0},
+    )
+    before = scenario.get_item_locations()
+    rooms = [actor[RoomPresence].room for actor in scenario.actors]
+    scenario.run(3)
+    assert scenario.actions == {'move': 30}
+    assert scenario.get_item_locations() == before
+    assert rooms != [actor[RoomPresence].room for actor in scenario.actors]
@@ -0,0 +1,232 @@
+import pytest
+
+from wecs.core import Component, System, World, and_filter
+from wecs.core import systems_conflict
+from wecs.rooms import Room, RoomPresence, PerceiveRoom
+from wecs.inventory import Inventory, Takeable, TakeAction, TakeOrDrop
+
+
+@Component()
+class Position:
+    value: int = 0
+
+
+@Component()
+class Velocity:
+    value: int = 1
+
+
+@Component()
+class Health:
+    value: int = 10
+
+
+@Component()
+class Marker:
+    pass
+
+
+class Move(System):
+    entity_filters = {'movable': and_filter([Position, Velocity])}
+    component_reads = [Velocity]
+
+    def update(self, entities_by_filter):
+        for entity in entities_by_filter['movable']:
+            entity[Position].value += entity[Velocity].value
+
+
+class Accelerate(System):
+    entity_filters = {'movable': and_filter([Velocity])}
+
+    def update(self, entities_by_filter):
+        for entity in entities_by_filter['movable']:
+            entity[Velocity].value += 1
+
+
+class Heal(System):
+    entity_filters = {'living': and_filter([Health])}
+
+    def update(self, entities_by_filter):
+        for entity in entities_by_filter['living']:
+            entity[Health].value += 1
+
+
+class MarkHealthy(System):
+    entity_filters = {'living': and_filter([Health])}
+    component_reads = [Health]
+    component_writes = [Marker]
+
+    def update(self, entities_by_filter):
+        for entity in entities_by_filter['living']:
+            if Marker not in entity:
+                entity.add_component(Marker())
+
+
+class Fail(System):
+    entity_filters = {'living': and_filter([Health])}
+    component_reads = [Health]
+
+    def update(self, entities_by_filter):
+        raise ValueError
+
+
+def test_default_access_is_writing():
+    system = Heal()
+    assert system.get_component_reads() == set()
+    assert system.get_component_writes() == {Health}
+
+
+def test_declared_reads():
+    system = Move()
+    assert system.get_component_reads() == {Velocity}
+    assert system.get_component_writes() == {Position}
+
+
+def test_conflicts():
+    assert systems_conflict(Move(), Accelerate())
+    assert systems_conflict(Heal(), MarkHealthy())
+    assert not systems_conflict(Move(), Heal())
+    assert not systems_conflict(MarkHealthy(), Fail())
+
+
+def test_stages():
+    world = World()
+    move = Move()
+    heal = Heal()
+    accelerate = Accelerate()
+    mark = MarkHealthy()
+    world.add_system(move, 0)
+    world.add_system(heal, 1)
+    world.add_system(accelerate, 2)
+    world.add_system(mark, 3)
+    assert world.get_stages() == [[move, heal], [accelerate, mark]]
+
+
+def test_stages_keep_sort_order():
+    world = World()
+    move = Move()
+    heal = Heal()
+    accelerate = Accelerate()
+    world.add_system(accelerate, 0)
+    world.add_system(heal, 1)
+    world.add_system(move, 2)
+    assert world.get_stages() == [[accelerate, heal], [move]]
+
+
+def test_stages_are_recomputed():
+    world = World()
+    move = Move()
+    world.add_system(move, 0)
+    assert world.get_stages() == [[move]]
+    heal = Heal()
+    world.add_system(heal, 1)
+    assert world.get_stages() == [[move, heal]]
+    world.remove_system(Move)
+    assert world.get_stages() == [[heal]]
+
+
+def test_parallel_update_matches_sequential():
+    results = []
+    for max_workers in [None, 4]:
+        world = World(max_workers=max_workers)
+        world.add_system(Move(), 0)
+        world.add_system(Heal(), 1)
+        world.add_system(Accelerate(), 2)
+        world.add_system(MarkHealthy(), 3)
+        entities = [
+            world.create_entity(Position(), Velocity(), Health())
+            for _ in range(20)
+        ]
+        world.update()
+        world.update()
+        world.flush_component_updates()
+        results.append([
+            (e[Position].value, e[Velocity].value, e[Health].value, Marker in e)
+            for e in entities
+        ])
+    assert results[0] == results[1]
+    assert results[1][0] == (3, 3, 12, True)
+
+
+def test_parallel_changes_are_flushed_at_barrier():
+    world = World(max_workers=2)
+    move = Move()
+    mark = MarkHealthy()
+    world.add_system(move, 0)
+    world.add_system(mark, 1)
+    entity = world.create_entity(Position(), Velocity(), Health())
+    world.update()
+    # Systems in a parallel stage don't touch entities until the flush.
+    assert Marker not in entity
+    assert world.system_buffers[mark].added
+    world.flush_component_updates()
+    assert Marker in entity
+    assert Marker in entity._archetype.component_types
+
+    world.remove_system(MarkHealthy)
+    assert mark not in world.system_buffers
+    assert world.command_buffers == [
+        world.commands,
+        world.system_buffers[move],
+    ]
+
+
+def test_parallel_exceptions_propagate():
+    world = World(max_workers=2)
+    world.add_system(Fail(), 0)
+    world.add_system(MarkHealthy(), 1)
+    world.create_entity(Health())
+    with pytest.raises(ValueError):
+        world.update()
+
+
+def test_parallel_take_item():
+    world = World(max_workers=2)
+    world.add_system(PerceiveRoom(), 0)
+    world.add_system(TakeOrDrop(), 1)
+    world.add_system(PerceiveRoom(), 2, add_duplicates=True)
+    room = world.create_entity(Room())
+    item = world.create_entity(RoomPresence(room=room._uid), Takeable())
+    actor = world.create_entity(
+        RoomPresence(room=room._uid),
+        Inventory(),
+        TakeAction(item=item._uid),
+    )
+    assert len(world.get_stages()) == 3
+    world.update()
+
+    assert actor.get_component(Inventory).contents == [item._uid]
+    assert not actor.has_component(TakeAction)
+    assert not item.has_component(RoomPresence)
+
+
+class RemoveMarker(System):
+    entity_filters = {'marked': and_filter([Marker])}
+
+    def update(self, entities_by_filter):
+        for entity in entities_by_filter['marked']:
+            entity.remove_component(Marker)
+
+
+def test_parallel_stage_leaves_entities_alone_until_flush():
+    world = World(max_workers=2)
+    mark = MarkHealthy()
+    unmark = RemoveMarker()
+    world.add_system(Move(), 0)
+    world.add_system(mark, 1)
+    entity = world.create_entity(Position(), Velocity(), Health())
+    world.flush_component_updates()
+    components = dict(entity.components)
+    mask = entity._mask
+    world.update()
+    assert entity.components == components
+    assert entity._mask == mask
+
+    world.flush_component_updates()
+    assert Marker in entity
+    world.remove_system(MarkHealthy)
+    world.add_system(unmark, 1)
+    world.update()
+    assert Marker in entity
+    world.flush_component_updates()
+    assert Marker not in entity
@@ -0,0 +1,126 @@
+import dataclasses
+
+import pytest
+
+from wecs.core import Component, World, UID
+from wecs.core import reference
+from wecs.snapshot import save_world, load_world, SnapshotError
+from wecs.rooms import RoomPresence
+from wecs.inventory import Takeable
+from wecs.mechanics.clock import Clock
+
+from fixtures import IncreaseCount, Counter, path, populate, dump
+
+
+@Component()
+class Stats:
+    strength: int = 10
+    speed: float = 1.5
+    alive: bool = True
+    title: str = ''
+    bonus: int = None
+
+
+@Component()
+class Renamed:
+    value: int = reference(metadata={'renamed_from': 'old_value'}, default=None)
+    extra: list = dataclasses.field(default_factory=list)
+
+
+@Component()
+class Original:
+    old_value: UID = reference(default=None)
+    dropped: int = 0
+
+
+def make_world():
+    world = World()
+    room, item, actor = populate(world)
+    actor.add_component(Stats(title='hero', bonus=3))
+    world.create_entity(Stats(strength=2**40, speed=0.25, alive=False))
+    parent = world.create_entity(Clock())
+    world.create_entity(Clock(parent=parent._uid))
+    world.destroy_entities([world.create_entity()])
+    world.flush_component_updates()
+    return world
+
+
+def test_round_trip(path):
+    world = make_world()
+    world.save(path)
+    loaded = World.load(path)
+    assert dump(loaded) == dump(world)
+    assert loaded.generations == world.generations
+    assert loaded.free_indices == world.free_indices
+    assert loaded.create_entity()._uid == world.create_entity()._uid
+
+
+def test_loaded_world_is_indexed(path):
+    world = make_world()
+    room = world.entities[0]
+    save_world(world, path)
+    loaded = load_world(path)
+    loaded_room = loaded.get_entity(room._uid)
+    assert len(loaded.get_referrers(loaded_room, RoomPresence)) == 2
+    assert loaded.get_tagged(Takeable) == {
+        loaded.get_entity(e._uid) for e in world.get_tagged(Takeable)
+    }
+    for entity in loaded.entities:
+        if entity is not None:
+            assert entity._archetype.component_types == set(entity.components)
+
+
+def test_load_into_world_with_systems(path):
+    world = World()
+    world.create_entity(Counter(count=3, inited=False))
+    world.save(path)
+
+    loaded = World()
+    system = IncreaseCount()
+    loaded.add_system(system, 0)
+    load_world(path, loaded)
+    assert system.init_called == 1
+    loaded.update()
+    entity, = [e for e in loaded.entities if e is not None]
+    assert entity[Counter].count == 4
+
+
+def test_schema_migration(path):
+    world = World()
+    target = world.create_entity()
+    world.create_entity(Original(old_value=target._uid, dropped=5))
+    world.save(path)
+    type_name = 'test_snapshot:Original'
+
+    loaded = load_world(path, type_aliases={type_name: Renamed})
+    referrer = loaded.get_referrers(target._uid)[0]
+    assert referrer[Renamed].value == target._uid
+    assert referrer[Renamed].extra == []
+    assert not hasattr(referrer[Renamed], 'dropped')
+
+
+def test_unknown_component_type(path):
+    world = World()
+    world.create_entity(Original())
+    Original.__qualname__ = 'Gone'
+    try:
+        world.save(path)
+    finally:
+        Original.__qualname__ = 'Original'
+    with pytest.raises(SnapshotError):
+        load_world(path)
+
+
+def test_not_a_snapshot(path):
+    World().save(path)
+    with open(path, 'r+b') as f:
+        f.write(b'XXXX')
+    with pytest.raises(SnapshotError):
+        load_world(path)
+
+
+def test_load_needs_empty_world(path):
+    world = make_world()
+    world.save(path)
+    with pytest.raises(SnapshotError):
+        load_world(path, world)
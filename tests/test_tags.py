@@ -0,0 +1,82 @@
+import pytest
+
+from wecs.core import Component, System, Tag, and_filter, not_filter
+
+from fixtures import world, entity
+
+
+@Tag()
+class Burning:
+    pass
+
+
+@Component()
+class Health:
+    value: int = 10
+
+
+class Burn(System):
+    entity_filters = {
+        'burning': and_filter([Health, Burning]),
+        'not_burning': and_filter([Health, not_filter([Burning])]),
+    }
+
+
+def test_tags_share_one_instance():
+    assert Burning() is Burning()
+    assert Burning.__slots__ == ()
+
+
+def test_tags_have_no_fields():
+    with pytest.raises(TypeError):
+        @Tag()
+        class Heat:
+            temperature: float = 0.0
+
+
+def test_set_tag(world, entity):
+    entity.set_tag(Burning)
+    assert entity.has_tag(Burning)
+    assert world.get_tagged(Burning) == set()
+    world.flush_component_updates()
+    assert world.get_tagged(Burning) == {entity}
+
+    entity.set_tag(Burning, False)
+    world.flush_component_updates()
+    assert not entity.has_tag(Burning)
+    assert world.get_tagged(Burning) == set()
+
+
+def test_toggling_cancels_out(world, entity):
+    system = Burn()
+    world.add_system(system, 0)
+    entity.add_component(Health())
+    entity.set_tag(Burning)
+    world.flush_component_updates()
+    archetype = entity._archetype
+
+    entity.set_tag(Burning, False)
+    entity.set_tag(Burning)
+    assert not world.commands.removed
+    world.flush_component_updates()
+    assert entity._archetype is archetype
+
+    entity.set_tag(Burning, False)
+    entity.set_tag(Burning, False)
+    world.flush_component_updates()
+    assert entity in world.entity_filters[system.entity_filters['not_burning']]
+    assert entity not in world.entity_filters[system.entity_filters['burning']]
+
+
+def test_tagged_sets_follow_entities(world):
+    tagged_before = world.create_entity(Burning())
+    world.flush_component_updates()
+    assert world.get_tagged(Burning) == {tagged_before}
+
+    tagged_after = world.create_entities(2, [Health, Burning])
+    world.flush_component_updates()
+    assert world.get_tagged(Burning) == {tagged_before, *tagged_after}
+
+    world.destroy_entities([tagged_before, tagged_after[0]])
+    world.flush_component_updates()
+    assert world.get_tagged(Burning) == {tagged_after[1]}
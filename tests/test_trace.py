@@ -0,0 +1,132 @@
+import io
+import json
+
+from wecs.core import Component, System, World, and_filter
+from wecs.trace import Tracer
+
+from fixtures import world
+
+
+@Component()
+class Ticks:
+    count: int = 0
+
+
+class Tick(System):
+    entity_filters = {'ticking': and_filter([Ticks])}
+
+    def __init__(self, pause=0):
+        System.__init__(self)
+        self.pause = pause
+
+    def init_entity(self, filter_name, entity):
+        pass
+
+    def update(self, entities_by_filter):
+        for entity in entities_by_filter['ticking']:
+            entity[Ticks].count += 1
+        for _ in range(self.pause):
+            pass
+
+
+def test_spans_and_counters(world, tmp_path):
+    tick = Tick()
+    world.add_system(tick, 0)
+    profiler = world.enable_profiling()
+    world.create_entities(3, [Ticks])
+    tracer = world.enable_tracing()
+    assert isinstance(tracer, Tracer)
+    assert world.enable_tracing() is tracer
+    world.update()
+    world.update()
+    # Tracing keeps up the profiler's statistics.
+    assert tracer.histograms is profiler.histograms
+    assert tracer.get_stats('update', tick)['count'] == 2
+
+    path = tmp_path / 'trace.json'
+    tracer.dump(path)
+    events = json.loads(path.read_text())
+    spans = [event for event in events if event['ph'] == 'X']
+    names = [event['name'] for event in spans]
+    assert names.count('frame') == 2
+    assert names.count('update Tick') == 2
+    assert 'filters create' in names
+    assert 'init_entity Tick' in names
+    # Spans nest within their frame.
+    frame = [event for event in spans if event['name'] == 'frame'][0]
+    update = [event for event in spans if event['name'] == 'update Tick'][0]
+    assert frame['ts'] <= update['ts']
+    assert update['ts'] + update['dur'] <= frame['ts'] + frame['dur']
+
+    counters = [event for event in events if event['ph'] == 'C']
+    assert counters[0]['args'] == {'entities': 3, 'archetypes': 2}
+    assert counters[1]['name'] == 'filters Tick'
+    assert counters[1]['args'] == {'ticking': 3}
+
+
+def test_ring_buffer(world):
+    world.add_system(Tick(), 0)
+    tracer = world.enable_tracing(seconds=0)
+    world.update()
+    world.update()
+    # Only the counters of the last frame are as recent as that.
+    assert [event[0] for event in tracer.events] == ['C', 'C']
+
+    tracer = Tracer(max_events=3)
+    for _ in range(5):
+        tracer.record('flush', None, 10)
+    assert len(tracer.events) == 3
+
+
+def test_spikes(world, tmp_path):
+    world.add_system(Tick(pause=100000), 0)
+    tracer = world.enable_tracing(
+        spike=0.0,
+        spike_path=str(tmp_path / 'spike-{}.json'),
+    )
+    world.update()
+    world.update()
+    # One dump per seconds
+    assert tracer.spikes == [str(tmp_path / 'spike-0.json')]
+    events = json.loads((tmp_path / 'spike-0.json').read_text())
+    assert [event['name'] for event in events if event['ph'] == 'X'].count('frame') == 1
+    tracer.seconds = 0
+    world.update()
+    assert len(tracer.spikes) == 2
+
+
+def test_streaming(world):
+    world.add_system(Tick(), 0)
+    stream = io.StringIO()
+    stream.close = lambda: None
+    world.enable_tracing(stream=stream)
+    world.update()
+    # Viewers load unterminated arrays as well.
+    assert stream.getvalue().startswith('[\n{')
+    assert not stream.getvalue().endswith(']\n')
+    world.update()
+    world.flush_component_updates()
+    world.disable_profiling()
+    events = json.loads(stream.getvalue())
+    names = [event['name'] for event in events]
+    assert names.count('frame') == 2
+    assert names[-1] == 'flush'
+    assert world.profiler is None
+
+
+def test_threads(tmp_path):
+    world = World(max_workers=2)
+
+    class Other(Tick):
+        component_reads = [Ticks]
+
+    class Another(Tick):
+        component_reads = [Ticks]
+
+    world.add_system(Other(), 0)
+    world.add_system(Another(), 1)
+    world.create_entity(Ticks())
+    tracer = world.enable_tracing()
+    world.update()
+    updates = [event for event in tracer.events if event[1].startswith('update')]
+    assert len(updates) == 2
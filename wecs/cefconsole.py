@@ -4,7 +4,7 @@ import cefconsole
 
 from wecs.core import System
 from wecs.core import and_filter
-from wecs.core import Component
+from wecs.core import Tag
 
 
 class WECSSubconsole(cefconsole.Subconsole):
@@ -27,12 +27,12 @@ class WECSSubconsole(cefconsole.Subconsole):
 
     def update(self):
         if self.refresh or self.live_refresh:
-            entities = base.ecs_world.entities
-            uids = {e._uid.name: e for e in entities}
+            entities = base.ecs_world.get_entities()
+            uids = {e.name: e for e in entities}
             uid_list = sorted(uids.keys())
             component_types = set()
             for entity in entities:
-                for component in entity.components:
+                for component in entity.components.values():
                     component_types.add(type(component))
             component_types = sorted(component_types, key=lambda ct: repr(ct))
             def crepr(e, ct):
@@ -112,7 +112,7 @@ class EntityWatcherSubconsole(cefconsole.Subconsole):
         self.console.exec_js_func('update_entity_watcher', content)
 
 
-@Component()
+@Tag()
 class WatchedEntity:
     pass
 
@@ -0,0 +1,149 @@
+# Columnar storage for components with numeric fields. Instead of
+# being stored on each instance, every numeric field of a component type
+# is stored in one NumPy array, with each instance owning a row in it.
+# The instances act as views onto their row, so entity[Foo].bar works as
+# usual, while systems can process whole columns at once:
+#
+#     @Component(storage='columnar')
+#     class Velocity:
+#         x: float = 0.0
+#         y: float = 0.0
+#
+#     class Damp(System):
+#         entity_filters = {'moving': and_filter([Velocity])}
+#
+#         def update(self, entities_by_filter):
+#             velocity = self.world.get_columns(
+#                 self.entity_filters['moving'],
+#                 Velocity,
+#             )
+#             velocity['x'] = velocity['x'] * 0.9
+#             velocity['y'] = velocity['y'] * 0.9
+
+import dataclasses
+
+import numpy
+
+
+DTYPES = {
+    float: numpy.float64,
+    int: numpy.int64,
+    bool: numpy.bool_,
+    'float': numpy.float64,
+    'int': numpy.int64,
+    'bool': numpy.bool_,
+}
+
+
+class ColumnStore:
+    def __init__(self, dtypes, capacity=64):
+        self.dtypes = dtypes  # {field name: dtype}
+        self.columns = {
+            name: numpy.zeros(capacity, dtype=dtype)
+            for name, dtype in dtypes.items()
+        }
+        self.capacity = capacity
+        self.size = 0
+        self.free_rows = []
+
+    def allocate(self):
+        if self.free_rows:
+            return self.free_rows.pop()
+        if self.size == self.capacity:
+            self.capacity *= 2
+            for name, column in self.columns.items():
+                grown = numpy.zeros(self.capacity, dtype=column.dtype)
+                grown[:self.size] = column
+                self.columns[name] = grown
+        row = self.size
+        self.size += 1
+        return row
+
+    def release(self, row):
+        self.free_rows.append(row)
+
+
+class ColumnField:
+    def __init__(self, store, name):
+        self.store = store
+        self.name = name
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        return self.store.columns[self.name].item(instance._row)
+
+    def __set__(self, instance, value):
+        self.store.columns[self.name][instance._row] = value
+
+
+def make_columnar(cls):
+    fields = dataclasses.fields(cls)
+    dtypes = {
+        field.name: DTYPES[field.type]
+        for field in fields
+        if field.type in DTYPES
+    }
+    if not dtypes:
+        raise TypeError("{} has no numeric fields.".format(cls.__name__))
+    store = ColumnStore(dtypes)
+    cls._store = store
+    for name in dtypes:
+        setattr(cls, name, ColumnField(store, name))
+
+    dataclass_init = cls.__init__
+
+    def __init__(self, *args, **kwargs):
+        self._row = store.allocate()
+        dataclass_init(self, *args, **kwargs)
+
+    def __del__(self):
+        row = self.__dict__.get('_row')
+        if row is not None:
+            store.release(row)
+
+    # Copies and pickles carry the values, not the row.
+    def __getstate__(self):
+        state = {
+            key: value
+            for key, value in self.__dict__.items()
+            if key != '_row'
+        }
+        for name in dtypes:
+            state[name] = getattr(self, name)
+        return state
+
+    def __setstate__(self, state):
+        self._row = store.allocate()
+        for key, value in state.items():
+            setattr(self, key, value)
+
+    cls.__init__ = __init__
+    cls.__del__ = __del__
+    cls.__getstate__ = __getstate__
+    cls.__setstate__ = __setstate__
+    return cls
+
+
+# The rows of one component type for the entities in a filter. Reading
+# a field gathers its values into a new array, assigning to it scatters
+# them back.
+class Columns:
+    def __init__(self, component_type, entities):
+        self.store = component_type._store
+        self.entities = list(entities)
+        self.rows = numpy.fromiter(
+            (entity.components[component_type]._row
+             for entity in self.entities),
+            dtype=numpy.intp,
+            count=len(self.entities),
+        )
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, name):
+        return self.store.columns[name][self.rows]
+
+    def __setitem__(self, name, values):
+        self.store.columns[name][self.rows] = values
@@ -1,97 +1,116 @@
+import time
 import types
+import threading
 import dataclasses
+import concurrent.futures
 
 
-# FIXME: We rely on the hash of these objects to be unique, which is...
-# iffy. If isn't *really* a problem that a UID gets destroyed and a new one is
-# created in its place so that a dangling reference is created, because
-# thanks to that dangling reference, the now invalid UID is still referenced.
-# Still, this smells.
-class UID:
-    pass
+# Entities are addressed by a 64 bit integer. The lower 32 bits are the
+# index of the entity's slot in the world's entity table, the upper 32
+# bits are the generation of the slot, which is increased each time that
+# the slot is freed. That way, references to destroyed entities can be
+# detected even if their slot has been reused. Generations start at 1,
+# so UID() == 0 never refers to an entity.
+UID = int
+INDEX_BITS = 32
+INDEX_MASK = (1 << INDEX_BITS) - 1
+
+
+def make_uid(index, generation):
+    return (generation << INDEX_BITS) | index
+
+
+def get_uid_index(uid):
+    return uid & INDEX_MASK
+
+
+def get_uid_generation(uid):
+    return uid >> INDEX_BITS
 
 
 class NoSuchUID(Exception):
     pass
 
 
+# Each component type gets a bit, and each entity and archetype a mask
+# of the bits of its component types.
+component_bits = {}  # {type: int}
+
+
+def get_component_bit(component_type):
+    try:
+        return component_bits[component_type]
+    except KeyError:
+        bit = 1 << len(component_bits)
+        component_bits[component_type] = bit
+        return bit
+
+
+def get_component_mask(component_types):
+    mask = 0
+    for component_type in component_types:
+        mask |= get_component_bit(component_type)
+    return mask
+
+
 class Entity:
-    def __init__(self, world, name=None):
+    def __init__(self, world, uid, name=None):
         self.world = world
-        self.components = set()
-        self._uid = UID()
-        self._new_components = {} # type: instance
-        self._dropped_components = {} # types
-
-        if name is None:
-            name = str(id(self))
-        self._uid.name = name
+        # All current components, including those being added or
+        # removed in the current system run.
+        self.components = {} # type: instance
+        self._mask = 0
+        self._archetype = None
+        self._uid = uid
+        self._name = name
+
+    @property
+    def name(self):
+        if self._name is None:
+            return str(self._uid)
+        return self._name
 
     def add_component(self, component):
-        exists = any([isinstance(c, type(component))
-                      for c in self.components])
-        is_being_deleted = type(component) in self._dropped_components
-        is_being_added = type(component) in self._new_components
-        if exists and (not is_being_added or is_being_added):
-            raise KeyError("Component type already on entity.")
-        if is_being_added:
-            raise KeyError("Component type is already being added to entity.")
-
-        if not self._new_components and not self._dropped_components:
-            # First component update in current system run
-            self.world.register_entity_for_components_update(self)
-        self._new_components[type(component)] = component
+        self.world.get_command_buffer().add_component(self, component)
 
     def get_components(self):
-        all_components = set()
-        all_components.update(self.components)
-        all_components.update(set(self._new_components.values()))
-        return  all_components
-
-    def get_component(self, component_type):
-        all_components = set()
-        all_components.update(self.components)
-        all_components.update(set(self._new_components.values()))
-        component = list(
-            filter(
-                lambda c: isinstance(c, component_type),
-                all_components,
-            )
-        )
+        return self.components.values()
+
+    def get_component(self, component_type, subclasses=False):
+        if not subclasses:
+            return self.components[component_type]
+        component = [c for c in self.components.values()
+                     if isinstance(c, component_type)]
         if not component:
-            raise KeyError
+            raise KeyError(component_type)
         assert len(component) == 1
         return component[0]
 
-    def has_component(self, component_type):
-        return any([type(c) is component_type for c in self.get_components()])
-
+    def has_component(self, component_type, subclasses=False):
+        if not subclasses:
+            return component_type in self.components
+        return any(isinstance(c, component_type)
+                   for c in self.components.values())
 
     def remove_component(self, component_type):
-        if not self._new_components and not self._dropped_components:
-            # First component update in current system run
-            self.world.register_entity_for_components_update(self)
-        self._dropped_components[component_type] = self.get_component(component_type)
-
-    def update_components(self):
-        for component_type, component in self._dropped_components.items():
-            self.components.remove(component)
-        for component_type, component in self._new_components.items():
-            self.components.add(component)
+        self.world.get_command_buffer().remove_component(self, component_type)
 
-    def get_dropped_components_by_type(self):
-        return self._dropped_components
+    def set_tag(self, tag_type, present=True):
+        # Setting a tag and clearing it again before the next flush, or
+        # the other way around, cancels out.
+        if present:
+            if not self.world.get_command_buffer().cancel_removal(self, tag_type):
+                if tag_type not in self.components:
+                    self.add_component(tag_type())
+        elif tag_type in self.components:
+            self.remove_component(tag_type)
 
-    def drop_component_updates(self):
-        self._dropped_components = {}
-        self._new_components = {}
+    def has_tag(self, tag_type):
+        return tag_type in self.components
 
     def destroy(self):
-        self.world.remove_entity(self)
-        # FIXME: Needs to be refactored when components are created
-        # indirectly, outside update()
-        for component in set(self.get_components()):
-            self.remove_component()
+        # Takes effect during the next flush, see World.destroy_entities().
+        self.world.destroy_entities([self])
 
 
     def __setitem__(self, component_type, component):
@@ -100,7 +119,7 @@ class Entity:
 
 
     def __getitem__(self, component_type):
-        return self.get_component(component_type)
+        return self.components[component_type]
 
 
     def __delitem__(self, component_type):
@@ -108,24 +127,325 @@ class Entity:
 
 
     def __contains__(self, component_type):
-        return self.has_component(component_type)
+        return component_type in self.components
 
 
     def __repr__(self):
-        names = [repr(c) for c in self.components]
+        names = [repr(c) for c in self.components.values()]
         return "<Entity ({})>".format(', '.join(names))
 
 
+# All entities sharing the same set of component types live in one
+# archetype. Adding or removing a component moves an entity along the
+# cached edges to its new archetype.
+class Archetype:
+    def __init__(self, component_types, mask):
+        self.component_types = frozenset(component_types)
+        self._mask = mask
+        self.entities = set()
+        self.filters = {}  # {Filter: None}, ordered by registration
+        self.add_edges = {}  # {component type: Archetype}
+        self.remove_edges = {}  # {component type: Archetype}
+
+    def has_component(self, component_type):
+        return component_type in self.component_types
+
+    def __repr__(self):
+        names = sorted(t.__name__ for t in self.component_types)
+        return "<Archetype ({})>".format(', '.join(names))
+
+
+def _add_slots(cls, extra_slots=()):
+    # Like dataclass(slots=True) in Python 3.10+
+    inherited_slots = set()
+    for base in cls.__mro__[1:-1]:
+        inherited_slots.update(base.__dict__.get('__slots__', ()))
+    cls_dict = dict(cls.__dict__)
+    field_names = tuple(
+        field.name for field in dataclasses.fields(cls)
+        if field.name not in inherited_slots
+    )
+    cls_dict['__slots__'] = field_names + tuple(extra_slots)
+    for name in field_names:
+        cls_dict.pop(name, None)
+    cls_dict.pop('__dict__', None)
+    cls_dict.pop('__weakref__', None)
+    slotted_cls = type(cls)(cls.__name__, cls.__bases__, cls_dict)
+    slotted_cls.__qualname__ = cls.__qualname__
+    return slotted_cls
+
+
+def _intern(cls):
+    # Components without fields are all alike, so one instance will do.
+    instance = object.__new__(cls)
+
+    def __new__(component_type, *args, **kwargs):
+        if component_type is cls:
+            return instance
+        return object.__new__(component_type)
+
+    cls.__new__ = staticmethod(__new__)
+    return cls
+
+
+# Fields holding the UIDs of other entities, which the world indexes in
+# both directions, see World.get_referrers(). When the referenced entity
+# is destroyed, the reference is either cleared, or reported with a
+# DanglingReference event.
+def reference(on_destroy='clear', **kwargs):
+    if on_destroy not in ('clear', 'report'):
+        raise ValueError("Unknown on_destroy policy {}".format(on_destroy))
+    metadata = dict(kwargs.pop('metadata', {}))
+    metadata['reference'] = (on_destroy, False)
+    return dataclasses.field(metadata=metadata, **kwargs)
+
+
+# Like reference(), for a list of UIDs. Changing the list in place
+# needs to be followed by a call to World.update_references().
+def references(on_destroy='clear', **kwargs):
+    if on_destroy not in ('clear', 'report'):
+        raise ValueError("Unknown on_destroy policy {}".format(on_destroy))
+    if 'default' not in kwargs:
+        kwargs.setdefault('default_factory', list)
+    metadata = dict(kwargs.pop('metadata', {}))
+    metadata['reference'] = (on_destroy, True)
+    return dataclasses.field(metadata=metadata, **kwargs)
+
+
+@dataclasses.dataclass
+class DanglingReference:
+    entity: UID
+    component_type: type
+    field_name: str
+    target: UID
+
+
+def _add_entity_hooks(cls, tracked, reference_fields):
+    # Assigning to a field of a component that is on an entity marks it
+    # as changed, see changed_filter(), and updates the reference index.
+    # The component refers back to its entity for that, which copies and
+    # pickles leave out.
+    field_names = frozenset(field.name for field in dataclasses.fields(cls))
+    base_setattr = cls.__setattr__
+    base_getstate = cls.__dict__.get('__getstate__')
+    base_setstate = cls.__dict__.get('__setstate__')
+
+    def __setattr__(self, name, value):
+        if name not in field_names:
+            base_setattr(self, name, value)
+            return
+        entity = getattr(self, '_entity', None)
+        if entity is None:
+            base_setattr(self, name, value)
+            return
+        world = entity.world
+        if world.forks:
+            for fork in world.forks:
+                fork.preserve_component(self)
+        base_setattr(self, name, value)
+        if name in reference_fields:
+            world.index_reference(entity, type(self), name, value)
+        if tracked:
+            world.mark_changed(entity, type(self), name)
+        elif world.delta_log is not None:
+            world.delta_log.log_change(entity._uid, type(self), name, world.tick)
+
+    def __getstate__(self):
+        if base_getstate is not None:
+            state = base_getstate(self)
+        elif hasattr(self, '__dict__'):
+            state = dict(self.__dict__)
+        else:
+            state = {name: getattr(self, name) for name in field_names}
+        state.pop('_entity', None)
+        return state
+
+    def __setstate__(self, state):
+        if base_setstate is not None:
+            base_setstate(self, state)
+        else:
+            for name, value in state.items():
+                object.__setattr__(self, name, value)
+
+    cls.__setattr__ = __setattr__
+    cls.__getstate__ = __getstate__
+    cls.__setstate__ = __setstate__
+    cls._entity_hooks = True
+    cls._tracked = tracked
+    cls._reference_fields = reference_fields  # {name: (on_destroy, many)}
+    return cls
+
+
 class Component():
-    def __init__(self, unique=True):
+    # storage='columnar' keeps numeric fields in NumPy arrays, see
+    # wecs.columnar.
+    # slots=True uses __slots__ instead of a __dict__, so instances can't
+    # get attributes that aren't fields. Components without fields and
+    # with __slots__ share a single instance.
+    # tracked=True records assignments to fields, see changed_filter().
+    # pooled=True reuses instances that were removed from entities, see
+    # World.new_component(); Such instances must not be kept around.
+    def __init__(self, unique=True, storage='object', slots=False,
+                 tracked=False, pooled=False):
+        if storage not in ('object', 'columnar'):
+            raise ValueError("Unknown storage {}".format(storage))
+        if storage == 'columnar' and slots:
+            raise ValueError("Columnar components can't use __slots__")
+        if storage == 'columnar' and pooled:
+            raise ValueError("Columnar components can't be pooled")
         self.unique = unique
+        self.storage = storage
+        self.slots = slots
+        self.tracked = tracked
+        self.pooled = pooled
 
     def __call__(self, cls):
         cls = dataclasses.dataclass(cls, eq=False)
+        reference_fields = {
+            field.name: field.metadata['reference']
+            for field in dataclasses.fields(cls)
+            if 'reference' in field.metadata
+        }
+        entity_hooks = self.tracked or bool(reference_fields)
+        if self.storage == 'columnar':
+            from wecs.columnar import make_columnar
+            cls = make_columnar(cls)
+        elif self.slots:
+            extra_slots = ('_entity',) if entity_hooks else ()
+            cls = _add_slots(cls, extra_slots)
+            if not dataclasses.fields(cls) and not entity_hooks:
+                cls = _intern(cls)
+        if entity_hooks:
+            cls = _add_entity_hooks(cls, self.tracked, reference_fields)
+        # A shared instance needs no pool.
+        if self.pooled and '__new__' not in cls.__dict__:
+            cls._pooled = True
+        return cls
+
+
+# Tags are components without data; An entity either has them or not.
+# All entities share the single instance of a tag type, so tagging an
+# entity allocates nothing, and the world keeps the set of entities that
+# have a tag, see World.get_tagged().
+class Tag():
+    def __call__(self, cls):
+        if getattr(cls, '__annotations__', None):
+            raise TypeError("Tags can't have fields.")
+        cls = Component(slots=True)(cls)
+        cls._tag = True
         return cls
 
 
+# Filters are compiled into a disjunction of terms, each of which is a
+# pair of masks of the component types that are required and excluded.
+# For a filter without any OrFilter or NotFilter in it, a match is
+# thus just one or two integer operations. As nesting them can multiply
+# the number of terms, a filter that would need more than MAX_TERMS has
+# no terms (None), and is matched clause by clause instead.
+MAX_TERMS = 64
+
+
+def _and_terms(terms_1, terms_2):
+    if terms_1 is None or terms_2 is None:
+        return None
+    if len(terms_1) * len(terms_2) > MAX_TERMS:
+        return None
+    return _simplify_terms([
+        (required_1 | required_2, excluded_1 | excluded_2)
+        for required_1, excluded_1 in terms_1
+        for required_2, excluded_2 in terms_2
+    ])
+
+
+def _or_terms(clause_terms):
+    terms = []
+    for terms_1 in clause_terms:
+        if terms_1 is None:
+            return None
+        terms.extend(terms_1)
+        if len(terms) > MAX_TERMS:
+            return None
+    return _simplify_terms(terms)
+
+
+def _not_terms(terms):
+    if terms is None:
+        return None
+    negated = [(0, 0)]
+    for required, excluded in terms:
+        negated_term = []
+        bit = 1
+        while bit <= required or bit <= excluded:
+            if required & bit:
+                negated_term.append((0, bit))
+            elif excluded & bit:
+                negated_term.append((bit, 0))
+            bit <<= 1
+        negated = _and_terms(negated, negated_term)
+        if negated is None:
+            return None
+    return negated
+
+
+def _simplify_terms(terms):
+    # Drop contradictions and terms that are implied by others. A term
+    # is implied by one with a subset of its bits; Going from the terms
+    # with the fewest bits up, each one is checked against the ones kept
+    # so far, either by looking up each of its subsets, or, if it has
+    # more subsets than there are terms kept, by going over those.
+    terms = sorted(
+        set(
+            (required, excluded)
+            for required, excluded in terms
+            if not required & excluded
+        ),
+        key=lambda term: bin(term[0] | term[1]).count('1'),
+    )
+    kept = set()
+    for required, excluded in terms:
+        bits = required | excluded
+        if 1 << bin(bits).count('1') <= len(kept):
+            subset = bits
+            while subset:
+                subset = (subset - 1) & bits
+                if (subset & required, subset & excluded) in kept:
+                    break
+            else:
+                kept.add((required, excluded))
+        elif not any(
+            other_required & required == other_required
+            and other_excluded & excluded == other_excluded
+            for other_required, other_excluded in kept
+        ):
+            kept.add((required, excluded))
+    return [term for term in terms if term in kept]
+
+
+def _compile_terms(terms):
+    if len(terms) == 1:
+        required, excluded = terms[0]
+        if not excluded:
+            return lambda mask: mask & required == required
+        return lambda mask: mask & required == required and not mask & excluded
+    def match(mask):
+        for required, excluded in terms:
+            if mask & required == required and not mask & excluded:
+                return True
+        return False
+    return match
+
+
 class Filter:
+    _match = None
+
+    def get_temporal_clauses(self):
+        for clause in self.types_and_filters:
+            if isinstance(clause, Filter) and clause.get_temporal_clauses():
+                raise ValueError(
+                    "Temporal clauses must be clauses of the outermost and_filter.",
+                )
+        return []
+
     def get_component_dependencies(self):
         dependencies = set()
         for clause in self.types_and_filters:
@@ -135,19 +455,65 @@ class Filter:
                 dependencies.add(clause)
         return dependencies
 
+    def get_clause_terms(self):
+        return [
+            clause.get_terms() if isinstance(clause, Filter)
+            else [(get_component_bit(clause), 0)]
+            for clause in self.types_and_filters
+        ]
+
+    def get_clause_matches(self):
+        return [
+            clause.compile() if isinstance(clause, Filter)
+            else _compile_terms([(get_component_bit(clause), 0)])
+            for clause in self.types_and_filters
+        ]
+
+    def compile(self):
+        terms = self.get_terms()
+        if terms is None:
+            self._match = self.compile_clauses()
+        else:
+            self._match = _compile_terms(terms)
+        return self._match
+
+    def matches(self, mask):
+        match = self._match
+        if match is None:
+            match = self.compile()
+        return match(mask)
+
+    def __call__(self, entity):
+        match = self._match
+        if match is None:
+            match = self.compile()
+        return match(entity._mask)
+
 
 class AndFilter(Filter):
     def __init__(self, types_and_filters):
         self.types_and_filters = types_and_filters
 
-    def __call__(self, entity):
+    def get_terms(self):
+        terms = [(0, 0)]
+        for clause_terms in self.get_clause_terms():
+            terms = _and_terms(terms, clause_terms)
+        return terms
+
+    def compile_clauses(self):
+        matches = self.get_clause_matches()
+        return lambda mask: all(match(mask) for match in matches)
+
+    def get_temporal_clauses(self):
+        temporal_clauses = []
         for clause in self.types_and_filters:
-            if isinstance(clause, Filter):
-                if not clause(entity):
-                    return False
-            elif not entity.has_component(clause):
-                return False
-        return True
+            if isinstance(clause, TemporalFilter):
+                temporal_clauses.append(clause)
+            elif isinstance(clause, Filter) and clause.get_temporal_clauses():
+                raise ValueError(
+                    "Temporal clauses must be clauses of the outermost and_filter.",
+                )
+        return temporal_clauses
 
 
 def and_filter(types_and_filters):
@@ -158,21 +524,292 @@ class OrFilter(Filter):
     def __init__(self, types_and_filters):
         self.types_and_filters = types_and_filters
 
-    def __call__(self, entity):
-        for clause in self.types_and_filters:
-            if isinstance(clause, Filter):
-                if clause(entity):
-                    return True
-            elif entity.has_component(clause):
-                return True
-        return False
+    def get_terms(self):
+        return _or_terms(self.get_clause_terms())
+
+    def compile_clauses(self):
+        matches = self.get_clause_matches()
+        return lambda mask: any(match(mask) for match in matches)
 
 
 def or_filter(types_and_filters):
     return OrFilter(types_and_filters)
 
 
+# Matches entities that match none of the clauses.
+class NotFilter(Filter):
+    def __init__(self, types_and_filters):
+        self.types_and_filters = types_and_filters
+
+    def get_terms(self):
+        return _not_terms(_or_terms(self.get_clause_terms()))
+
+    def compile_clauses(self):
+        matches = self.get_clause_matches()
+        return lambda mask: not any(match(mask) for match in matches)
+
+
+def not_filter(types_and_filters):
+    return NotFilter(types_and_filters)
+
+
+# Temporal clauses narrow a filter down to the entities on which any of
+# the given component types has changed, been added, or been removed
+# since the system last ran, e.g.
+#     and_filter([Model, changed_filter([Model])])
+# The world logs these events per component type, so a system only
+# visits the entities that had them. They match every archetype, and
+# can only be used on their own or as clauses of the outermost
+# and_filter.
+class TemporalFilter(Filter):
+    kind = None
+
+    def __init__(self, types_and_filters):
+        for clause in types_and_filters:
+            if isinstance(clause, Filter):
+                raise ValueError("Temporal clauses take component types only.")
+        self.types_and_filters = types_and_filters
+
+    def get_terms(self):
+        return [(0, 0)]
+
+    def get_temporal_clauses(self):
+        return [self]
+
+
+class ChangedFilter(TemporalFilter):
+    kind = 'changed'
+
+    def __init__(self, types_and_filters):
+        TemporalFilter.__init__(self, types_and_filters)
+        for component_type in types_and_filters:
+            if not getattr(component_type, '_tracked', False):
+                raise ValueError(
+                    "{} is not tracked.".format(component_type.__name__),
+                )
+
+
+def changed_filter(types_and_filters):
+    return ChangedFilter(types_and_filters)
+
+
+class AddedFilter(TemporalFilter):
+    kind = 'added'
+
+
+def added_filter(types_and_filters):
+    return AddedFilter(types_and_filters)
+
+
+class RemovedFilter(TemporalFilter):
+    kind = 'removed'
+
+
+def removed_filter(types_and_filters):
+    return RemovedFilter(types_and_filters)
+
+
+# Structural changes to entities are recorded in a command buffer, and
+# applied to the world's archetypes and filters only when the world
+# flushes its buffers, which it does before running each system.
+# Components that are being added can already be accessed on the entity,
+# and components that are being removed still can be. Removing a
+# component that is still being added cancels both operations.
+class CommandBuffer:
+    # A deferred buffer leaves entities untouched until the flush, as
+    # the systems of a parallel stage may be reading them meanwhile;
+    # Added components show up only then.
+    def __init__(self, world, deferred=False):
+        self.world = world
+        self.deferred = deferred
+        self.added = {}  # {Entity: {type: component}}
+        self.removed = {}  # {Entity: {type: component}}
+        self.created = []  # [(Archetype, [Entities])]
+        self.destroyed = {}  # {Entity: None}
+
+    def add_component(self, entity, component):
+        component_type = type(component)
+        added = self.added.get(entity)
+        if added is not None and component_type in added:
+            raise KeyError("Component type is already being added to entity.")
+        if component_type in entity.components:
+            raise KeyError("Component type already on entity.")
+        if added is None:
+            added = self.added[entity] = {}
+        added[component_type] = component
+        if not self.deferred:
+            self.apply_addition(entity, component)
+
+    def apply_addition(self, entity, component):
+        component_type = type(component)
+        if self.world.forks:
+            self.world.preserve_structure(entity)
+        entity.components[component_type] = component
+        entity._mask |= get_component_bit(component_type)
+        if getattr(component_type, '_entity_hooks', False):
+            self.world.attach_component(entity, component)
+
+    def remove_component(self, entity, component_type):
+        if self.deferred:
+            added = self.added.get(entity)
+            if added is not None and component_type in added:
+                del added[component_type]
+                if not added:
+                    del self.added[entity]
+                return
+            component = entity.components[component_type]
+            for buffer in self.world.command_buffers:
+                removed = buffer.removed.get(entity)
+                if removed is not None and component_type in removed:
+                    return  # Already being removed
+            self.removed.setdefault(entity, {})[component_type] = component
+            return
+        component = entity.components[component_type]
+        if self.world.forks:
+            self.world.preserve_structure(entity)
+        for buffer in self.world.command_buffers:
+            added = buffer.added.get(entity)
+            if added is not None and component_type in added:
+                del added[component_type]
+                if not added:
+                    del buffer.added[entity]
+                del entity.components[component_type]
+                entity._mask &= ~get_component_bit(component_type)
+                if getattr(component_type, '_entity_hooks', False):
+                    self.world.detach_component(entity, component)
+                if getattr(component_type, '_pooled', False):
+                    self.world.recycle_components(component_type, [component])
+                return
+            removed = buffer.removed.get(entity)
+            if removed is not None and component_type in removed:
+                return  # Already being removed
+        removed = self.removed.get(entity)
+        if removed is None:
+            removed = self.removed[entity] = {}
+        removed[component_type] = component
+
+    def cancel_removal(self, entity, component_type):
+        buffers = [self] if self.deferred else self.world.command_buffers
+        for buffer in buffers:
+            removed = buffer.removed.get(entity)
+            if removed is not None and component_type in removed:
+                del removed[component_type]
+                if not removed:
+                    del buffer.removed[entity]
+                return True
+        return False
+
+    def create_entities(self, count, components_or_aspect):
+        # components_or_aspect is either a list of component types,
+        # which will be created with their default values, or something
+        # that returns a new list of components when called, like an
+        # Aspect. In the latter case, each call has to return components
+        # of the same types.
+        if callable(components_or_aspect):
+            factory = components_or_aspect
+        else:
+            component_types = list(components_or_aspect)
+            if any(getattr(ct, '_pooled', False) for ct in component_types):
+                rows = zip(*[
+                    self.world.new_components(ct, count)
+                    for ct in component_types
+                ])
+                factory = lambda: list(next(rows))
+            else:
+                factory = lambda: [ct() for ct in component_types]
+        if not count:
+            return []
+        # Check the components before any slots are taken.
+        new_components = factory()
+        if len({type(c) for c in new_components}) != len(new_components):
+            raise KeyError("Component type already on entity.")
+        entities = self.world.allocate_entities(count)
+        mask = None
+        for entity in entities:
+            if new_components is None:
+                new_components = factory()
+            components = entity.components
+            for component in new_components:
+                components[type(component)] = component
+                if getattr(type(component), '_entity_hooks', False):
+                    self.world.attach_component(entity, component)
+            if mask is None:
+                mask = get_component_mask(components)
+            entity._mask = mask
+            new_components = None
+        with self.world.lock:
+            archetype = self.world.get_archetype(entities[0].components)
+        self.created.append((archetype, entities))
+        return entities
+
+    def destroy_entity(self, entity):
+        self.destroyed[entity] = None
+
+    def take(self):
+        if self.deferred:
+            for entity, added in self.added.items():
+                for component_type, component in added.items():
+                    if component_type in entity.components:
+                        raise KeyError("Component type already on entity.")
+                    self.apply_addition(entity, component)
+            if self.world.forks:
+                for entity in self.removed:
+                    self.world.preserve_structure(entity)
+        commands = (self.created, self.added, self.removed, self.destroyed)
+        self.created = []
+        self.added = {}
+        self.removed = {}
+        self.destroyed = {}
+        return commands
+
+
+# Events are sent through typed channels on the world, without any
+# structural change to entities. A channel keeps the events of the
+# current and the previous update, and remembers for each reader how far
+# it has read, so every system that runs once per update sees each event
+# exactly once, no matter whether it runs before or after the sender.
+class EventChannel:
+    def __init__(self, event_type):
+        self.event_type = event_type
+        self.previous = []
+        self.current = []
+        self.previous_start = 0  # Sequence number of previous[0]
+        self.cursors = {}  # {reader: sequence number of its next event}
+
+    def send(self, event):
+        self.current.append(event)
+
+    def send_batch(self, events):
+        self.current.extend(events)
+
+    def read(self, reader):
+        current_start = self.previous_start + len(self.previous)
+        cursor = max(self.cursors.get(reader, 0), self.previous_start)
+        self.cursors[reader] = current_start + len(self.current)
+        if cursor < current_start:
+            return self.previous[cursor - self.previous_start:] + self.current
+        return self.current[cursor - current_start:]
+
+    def swap(self):
+        self.previous_start += len(self.previous)
+        self.previous = self.current
+        self.current = []
+
+    def __len__(self):
+        return len(self.previous) + len(self.current)
+
+
 class System:
+    # Component types that the system only reads. All other types that
+    # its filters depend on are assumed to be written. A system that
+    # touches component types outside of its filters, e.g. on entities
+    # it looks up by UID, must declare them for the parallel scheduler.
+    component_reads = ()
+    component_writes = None  # None: The dependencies not in reads
+    # Types of the event channels that the system reads and sends to.
+    event_reads = ()
+    event_writes = ()
+
     def __init__(self, throw_exc=False):
         self.throw_exc = throw_exc
         self.filter_names = {
@@ -189,64 +826,229 @@ class System:
     def update(self, entities_by_filter):
         pass
 
+    def teardown(self):
+        # Called once the system has been removed from the world, after
+        # destroy_entity() for its entities, to release its resources.
+        pass
+
     def get_component_dependencies(self):
         dependencies = set()
         for filter_func in self.entity_filters.values():
             dependencies.update(filter_func.get_component_dependencies())
         return dependencies
 
+    def get_component_reads(self):
+        return set(self.component_reads)
+
+    def get_component_writes(self):
+        if self.component_writes is None:
+            return self.get_component_dependencies() - self.get_component_reads()
+        return set(self.component_writes)
+
+    def consume_actions(self, action_type, entities):
+        # Adapter for action components; Actions can either be added to
+        # the acting entity as a component, or be sent as events with
+        # world.send_action(). Either way, they are consumed, and
+        # returned as [(entity, action)].
+        actions = []
+        for entity in entities:
+            actions.append((entity, entity.get_component(action_type)))
+            entity.remove_component(action_type)
+        actors = []
+        for uid, action in self.world.get_channel(action_type).read(self):
+            try:
+                entity = self.world.get_entity(uid)
+            except NoSuchUID:
+                continue  # The actor is gone.
+            actions.append((entity, action))
+            actors.append(entity)
+        if self.world.forks and actors:
+            # Actors that sent events may be outside of the system's
+            # filters, so their components have not been saved yet.
+            self.world.preserve_writes(self, {'actors': actors})
+        return actions
+
     def __repr__(self):
         return self.__class__.__name__
 
 
+def systems_conflict(system_a, system_b):
+    # Systems may run concurrently unless one of them writes a component
+    # type that the other one reads or writes.
+    # Event channels count like component types.
+    reads_a = system_a.get_component_reads() | set(system_a.event_reads)
+    writes_a = system_a.get_component_writes() | set(system_a.event_writes)
+    reads_b = system_b.get_component_reads() | set(system_b.event_reads)
+    writes_b = system_b.get_component_writes() | set(system_b.event_writes)
+    return bool(writes_a & (reads_b | writes_b) or writes_b & reads_a)
+
+
 class World:
-    def __init__(self):
-        # TODO: One of these (probably self.entities) is redundant,
-        # and should be phased out.
-        self.entities = set()
-        self.entities_by_uid = {}
+    max_pool_size = 1024  # Per component type
+
+    def __init__(self, max_workers=None):
+        self.entities = []  # Entity table; [Entity or None]
+        self.generations = []  # Current generation of each slot
+        self.free_indices = []
         self.systems = {} # {sort: System}
         self.entity_filters = {}  # {Filter: set([Entities]}
         self.system_of_filter = {}
-        self.entities_that_update_components= [] # deferred operation
+        self.commands = CommandBuffer(self)
+        self.command_buffers = [self.commands]
+        self.archetypes = {}  # {mask: Archetype}
+        self.filter_archetypes = {}  # {Filter: [Archetypes]}
+        self.filters_by_component_type = {}  # {type: {Filter: None}}
+        self.columns = {}  # {(Filter, type): Columns}, see get_columns()
+        self.root_archetype = self.get_archetype(frozenset())
+        # Parallel scheduling; With max_workers=None, systems run one
+        # after another, see update().
+        self.max_workers = max_workers
+        self.executor = None
+        self.stages = None  # [[Systems]], see get_stages()
+        self.system_buffers = {}  # {System: CommandBuffer}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        # Change detection; The tick advances before and after each
+        # system runs. Events on the component types that temporal
+        # clauses refer to are logged, ordered by tick.
+        self.tick = 1
+        self.temporal_clauses = {}  # {Filter: [TemporalFilters]}
+        self.change_logs = {  # {kind: {type: {Entity: tick}}}
+            'changed': {},
+            'added': {},
+            'removed': {},
+        }
+        self.channels = {}  # {event type: EventChannel}
+        self.tagged = {}  # {tag type: set([Entities])}, see get_tagged()
+        self.references = {}  # {Entity: {(type, field name): (UIDs)}}
+        self.referrers = {}  # {UID: {(Entity, type, field name): count}}
+        self.image = None  # WorldImage that entities are read from
+        self.delta_log = None  # See record_deltas()
+        self.forks = []  # See fork()
+        self.pools = {}  # {type: [components]}, see new_component()
+        self.profiler = None  # See enable_profiling()
+        self.allocation_profiler = None  # See enable_allocation_profiling()
+
+    def allocate_entities(self, count):
+        # Take slots from the free list first, then grow the table.
+        with self.lock:
+            num_reused = min(count, len(self.free_indices))
+            indices = self.free_indices[len(self.free_indices) - num_reused:]
+            del self.free_indices[len(self.free_indices) - num_reused:]
+            num_new = count - num_reused
+            start = len(self.entities)
+            indices.extend(range(start, start + num_new))
+            self.entities.extend([None] * num_new)
+            self.generations.extend([1] * num_new)
+
+        generations = self.generations
+        table = self.entities
+        entities = []
+        for index in indices:
+            entity = Entity(self, (generations[index] << INDEX_BITS) | index)
+            table[index] = entity
+            entities.append(entity)
+        if self.delta_log is not None:
+            self.delta_log.log_created(entities, self.tick)
+        for fork in self.forks:
+            fork.log_created(entities, generations)
+        return entities
 
     def create_entity(self, *args, name=None):
-        entity = Entity(self, name=name)
-        self.entities.add(entity)
-        self.entities_by_uid[entity._uid] = entity
+        entity, = self.allocate_entities(1)
+        entity._name = name
+        entity._archetype = self.root_archetype
+        self.root_archetype.entities.add(entity)
+        # Filters that match entities without components, like ones
+        # with only a not_filter() or temporal clauses.
+        for filter_func in self.root_archetype.filters:
+            self.entity_filters[filter_func].add(entity)
+            system = self.system_of_filter[filter_func]
+            self.call_init_entity(system, system.filter_names[filter_func], [entity])
         for arg in args:
             # assert isinstance(arg, Component)
             entity.add_component(arg)
         return entity
 
+    def create_entities(self, count, components_or_aspect):
+        # The entities go into their archetype and filters together
+        # during the next flush. See CommandBuffer.create_entities().
+        return self.get_command_buffer().create_entities(
+            count,
+            components_or_aspect,
+        )
+
+    def destroy_entities(self, uids_or_entities):
+        # The entities are removed from their archetypes and filters,
+        # and their UIDs become invalid, during the next flush.
+        for uid_or_entity in uids_or_entities:
+            if isinstance(uid_or_entity, Entity):
+                entity = uid_or_entity
+            elif isinstance(uid_or_entity, UID):
+                entity = self.get_entity(uid_or_entity)
+            else:
+                raise ValueError("Entity or UID must be given")
+            self.get_command_buffer().destroy_entity(entity)
+
+    def create_command_buffer(self, deferred=False):
+        # A buffer that is flushed after the world's own one.
+        buffer = CommandBuffer(self, deferred)
+        self.command_buffers.append(buffer)
+        return buffer
+
+    def remove_command_buffer(self, buffer):
+        self.command_buffers.remove(buffer)
+
+    def get_command_buffer(self):
+        # Systems running in a parallel stage record into their own
+        # buffer, see update_stage().
+        return getattr(self.local, 'commands', self.commands)
+
     def get_entity(self, uid):
         try:
-            entity = self.entities_by_uid[uid]
-        except KeyError:
+            entity = self.entities[uid & INDEX_MASK]
+        except (IndexError, TypeError):
+            raise NoSuchUID
+        # The slot may be free, or reused by a newer entity.
+        if entity is None or entity._uid != uid:
             raise NoSuchUID
         return entity
 
+    def get_entities(self):
+        return [entity for entity in self.entities if entity is not None]
+
     def destroy_entity(self, uid_or_entity):
-        if isinstance(uid_or_entity, Entity):
-            entity = uid_or_entity
-        elif isinstance(uid_or_entity, UID):
-            entity = entity_by_uid[uid_or_entity]
-        else:
-            raise ValueError("Entity or UID must be given")
-        entity.destroy()
+        self.destroy_entities([uid_or_entity])
 
     def remove_entity(self, uid_or_entity):
         if isinstance(uid_or_entity, Entity):
             entity = uid_or_entity
-            uid = uid_or_entity._uid
         elif isinstance(uid_or_entity, UID):
-            entity = entity_by_uid[uid_or_entity]
-            uid = uid_or_entity
+            entity = self.get_entity(uid_or_entity)
         else:
             raise ValueError("Entity or UID must be given")
 
-        del self.entities_by_uid[uid]
-        self.entities.remove(entity)
+        index = entity._uid & INDEX_MASK
+        if self.entities[index] is not entity:
+            raise NoSuchUID
+        for fork in self.forks:
+            fork.log_destroyed(entity, index, self.generations[index])
+        self.entities[index] = None
+        self.generations[index] = (self.generations[index] + 1) & INDEX_MASK or 1
+        self.free_indices.append(index)
+        if self.delta_log is not None:
+            self.delta_log.log_destroyed(entity._uid, self.tick)
+        if entity._archetype is not None:
+            entity._archetype.entities.discard(entity)
+            if self.tagged:
+                self.update_tagged(entity._archetype.component_types, [entity], False)
+            entity._archetype = None
+        for component in entity.components.values():
+            if getattr(type(component), '_entity_hooks', False):
+                self.detach_component(entity, component)
+        if entity._uid in self.referrers:
+            self.clear_references_to(entity._uid)
+        self.columns = {}
 
     def add_system(self, system, sort, add_duplicates=False):
         if self.has_system(type(system)) and not add_duplicates:
@@ -256,15 +1058,33 @@ class World:
         self.systems[sort] = system
         system.world = self
         system._sort = sort
+        system._last_run = 0
+        self.columns = {}
+        self.stages = None
         # Prefilter for system
         for filter_name, filter_func in system.entity_filters.items():
+            temporal_clauses = filter_func.get_temporal_clauses()
+            if temporal_clauses:
+                self.temporal_clauses[filter_func] = temporal_clauses
+                for clause in temporal_clauses:
+                    logs = self.change_logs[clause.kind]
+                    for component_type in clause.types_and_filters:
+                        logs.setdefault(component_type, {})
             self.system_of_filter[filter_func] = system
             self.entity_filters[filter_func] = set()
-            # It needs to scan the entities
-            for entity in self.entities:
-                if filter_func(entity):
-                    self.entity_filters[filter_func].add(entity)
-                    system.init_entity(filter_name, entity)
+            self.filter_archetypes[filter_func] = []
+            for component_type in filter_func.get_component_dependencies():
+                filters = self.filters_by_component_type.setdefault(
+                    component_type, {},
+                )
+                filters[filter_func] = None
+            # It needs to scan the archetypes, not the entities
+            for archetype in self.archetypes.values():
+                if filter_func(archetype):
+                    archetype.filters[filter_func] = None
+                    self.filter_archetypes[filter_func].append(archetype)
+                    self.entity_filters[filter_func].update(archetype.entities)
+                    self.call_init_entity(system, filter_name, archetype.entities)
 
     def has_system(self, system_type):
         return any([isinstance(s, system_type) for s in self.systems.values()])
@@ -289,10 +1109,27 @@ class World:
         for filter_name, filter_func in system.entity_filters.items():
             del self.system_of_filter[filter_func]
             entities = self.entity_filters[filter_func]
-            for entity in entities:
-                system.destroy_entity(filter_name, entity)
+            self.call_destroy_entity(system, filter_name, entities, {})
+            for archetype in self.filter_archetypes[filter_func]:
+                del archetype.filters[filter_func]
+            for component_type in filter_func.get_component_dependencies():
+                filters = self.filters_by_component_type[component_type]
+                filters.pop(filter_func, None)
+                if not filters:
+                    del self.filters_by_component_type[component_type]
+            del self.filter_archetypes[filter_func]
             del self.entity_filters[filter_func]
+            if self.temporal_clauses.pop(filter_func, None):
+                self.prune_change_logs()
         del self.systems[system._sort]
+        for channel in self.channels.values():
+            channel.cursors.pop(system, None)
+        self.columns = {}
+        self.stages = None
+        buffer = self.system_buffers.pop(system, None)
+        if buffer is not None:
+            self.remove_command_buffer(buffer)
+        system.teardown()
 
     def get_system_component_dependencies(self):
         dependencies = {
@@ -301,53 +1138,777 @@ class World:
         }
         return dependencies
 
-    def register_entity_for_components_update(self, entity):
-        self.entities_that_update_components.append(entity)
-
     def flush_component_updates(self):
-        for entity in self.entities_that_update_components:
-            entity.update_components()
-        self.update_entity_filters(self.entities_that_update_components)
-        for entity in self.entities_that_update_components:
-            entity.drop_component_updates()
+        # The buffers are emptied first, so that changes made by
+        # init_entity() and destroy_entity() go into the next flush.
+        if self.profiler is not None:
+            start = time.perf_counter_ns()
+        commands = [buffer.take() for buffer in self.command_buffers]
+        for created, added, removed, destroyed in commands:
+            if created:
+                self.create_entity_batches(created)
+        for created, added, removed, destroyed in commands:
+            if added or removed:
+                self.update_entity_components(added, removed)
+        for created, added, removed, destroyed in commands:
+            if destroyed:
+                self.destroy_entity_batches(destroyed)
+        if self.profiler is not None:
+            self.profiler.record('flush', None, time.perf_counter_ns() - start)
+
+    def create_entity_batches(self, batches):
+        if self.profiler is not None:
+            start = time.perf_counter_ns()
+        for archetype, entities in batches:
+            # Entities may have been removed since.
+            entities = [
+                entity for entity in entities
+                if self.entities[entity._uid & INDEX_MASK] is entity
+            ]
+            for entity in entities:
+                entity._archetype = archetype
+            archetype.entities.update(entities)
+            if self.temporal_clauses:
+                self.log_changes(('added', 'changed'), archetype.component_types, entities)
+            if self.delta_log is not None:
+                self.delta_log.log_components(archetype.component_types, entities, self.tick)
+            if self.tagged:
+                self.update_tagged(archetype.component_types, entities, True)
+            for filter_func in archetype.filters:
+                self.entity_filters[filter_func].update(entities)
+                system = self.system_of_filter[filter_func]
+                filter_name = system.filter_names[filter_func]
+                self.call_init_entity(system, filter_name, entities)
+        self.columns = {}
+        if self.profiler is not None:
+            self.profiler.record('filters', 'create', time.perf_counter_ns() - start)
+
+    def destroy_entity_batches(self, destroyed):
+        if self.profiler is not None:
+            start = time.perf_counter_ns()
+        entities_by_archetype = {}
+        for entity in destroyed:
+            if entity._archetype is not None:
+                entities_by_archetype.setdefault(entity._archetype, []).append(entity)
+        for archetype, entities in entities_by_archetype.items():
+            archetype.entities.difference_update(entities)
+            for filter_func in archetype.filters:
+                self.entity_filters[filter_func].difference_update(entities)
+                system = self.system_of_filter[filter_func]
+                filter_name = system.filter_names[filter_func]
+                self.call_destroy_entity(system, filter_name, entities)
+            for entity in entities:
+                entity._archetype = None
+                self.remove_entity(entity)
+            if self.temporal_clauses:
+                self.log_changes(('removed',), archetype.component_types, entities)
+            if self.tagged:
+                self.update_tagged(archetype.component_types, entities, False)
+            if not self.forks:
+                for component_type in archetype.component_types:
+                    if getattr(component_type, '_pooled', False):
+                        # The destroyed entities keep their other components.
+                        self.recycle_components(component_type, [
+                            entity.components.pop(component_type)
+                            for entity in entities
+                        ])
+        if self.profiler is not None:
+            self.profiler.record('filters', 'destroy', time.perf_counter_ns() - start)
+
+    def call_init_entity(self, system, filter_name, entities):
+        # Most systems don't initialize entities, which spares touching
+        # each entity of a large world.
+        if type(system).init_entity is System.init_entity:
+            return
+        if self.profiler is not None:
+            start = time.perf_counter_ns()
+        for entity in entities:
+            system.init_entity(filter_name, entity)
+        if self.profiler is not None:
+            self.profiler.record('init_entity', system, time.perf_counter_ns() - start)
+
+    def call_destroy_entity(self, system, filter_name, entities, removed=None):
+        # Systems see the components that the entities had; All of them
+        # if they are destroyed, otherwise the removed ones.
+        if type(system).destroy_entity is System.destroy_entity:
+            return
+        if self.profiler is not None:
+            start = time.perf_counter_ns()
+        for entity in entities:
+            if removed is None:
+                components = entity.components
+            else:
+                components = removed.get(entity, {})
+            system.destroy_entity(filter_name, entity, components)
+        if self.profiler is not None:
+            self.profiler.record('destroy_entity', system, time.perf_counter_ns() - start)
+
+    def attach_component(self, entity, component):
+        object.__setattr__(component, '_entity', entity)
+        component_type = type(component)
+        for name in component_type._reference_fields:
+            self.index_reference(entity, component_type, name, getattr(component, name))
+
+    def attach_components(self, component_type, entities, components):
+        # Like attach_component(), for components that are new to their
+        # entities, e.g. when loading a snapshot.
+        for entity, component in zip(entities, components):
+            object.__setattr__(component, '_entity', entity)
+        for name in component_type._reference_fields:
+            self.index_references(
+                component_type,
+                name,
+                entities,
+                [getattr(component, name) for component in components],
+            )
 
-        self.entities_that_update_components = []
+    def index_references(self, component_type, name, entities, values):
+        # Like index_reference(), for entities that don't refer to
+        # anything through the field yet.
+        many = component_type._reference_fields[name][1]
+        key = (component_type, name)
+        referrers = self.referrers
+        references = self.references
+        for entity, value in zip(entities, values):
+            if value is None:
+                continue
+            targets = tuple(value) if many else (value,)
+            if not targets:
+                continue
+            referrer = (entity, component_type, name)
+            for target in targets:
+                counts = referrers.get(target)
+                if counts is None:
+                    counts = referrers[target] = {}
+                counts[referrer] = counts.get(referrer, 0) + 1
+            entity_references = references.get(entity)
+            if entity_references is None:
+                entity_references = references[entity] = {}
+            entity_references[key] = targets
+
+    def detach_component(self, entity, component):
+        object.__setattr__(component, '_entity', None)
+        component_type = type(component)
+        for name in component_type._reference_fields:
+            self.index_reference(entity, component_type, name, None)
+
+    def index_reference(self, entity, component_type, name, value):
+        if value is None:
+            targets = ()
+        elif component_type._reference_fields[name][1]:
+            targets = tuple(value)
+        else:
+            targets = (value,)
+        key = (component_type, name)
+        referrer = (entity, component_type, name)
+        with self.lock:
+            references = self.references.get(entity)
+            old_targets = references.get(key, ()) if references else ()
+            for target in old_targets:
+                # The entries of destroyed targets are gone already.
+                counts = self.referrers.get(target)
+                if counts is None or referrer not in counts:
+                    continue
+                counts[referrer] -= 1
+                if not counts[referrer]:
+                    del counts[referrer]
+                    if not counts:
+                        del self.referrers[target]
+            for target in targets:
+                counts = self.referrers.setdefault(target, {})
+                counts[referrer] = counts.get(referrer, 0) + 1
+            if targets:
+                self.references.setdefault(entity, {})[key] = targets
+            elif references is not None:
+                references.pop(key, None)
+                if not references:
+                    del self.references[entity]
+
+    def update_references(self, entity, component_type):
+        # After reference lists of a component were changed in place.
+        component = entity.components[component_type]
+        for name in component_type._reference_fields:
+            self.index_reference(entity, component_type, name, getattr(component, name))
+            if self.delta_log is not None:
+                self.delta_log.log_change(entity._uid, component_type, name, self.tick)
+
+    def get_referrers(self, uid_or_entity, component_type=None, field_name=None):
+        # The entities that refer to the given one, optionally only
+        # through the given component type and field.
+        if isinstance(uid_or_entity, Entity):
+            uid = uid_or_entity._uid
+        else:
+            uid = uid_or_entity
+        referrers = {}
+        for entity, referring_type, name in self.referrers.get(uid, ()):
+            if component_type is not None and referring_type is not component_type:
+                continue
+            if field_name is not None and name != field_name:
+                continue
+            referrers[entity] = None
+        return list(referrers)
+
+    def clear_references_to(self, uid):
+        for entity, component_type, name in list(self.referrers.pop(uid)):
+            component = entity.components.get(component_type)
+            if component is None:
+                continue
+            on_destroy, many = component_type._reference_fields[name]
+            if on_destroy == 'report':
+                self.send_event(DanglingReference(entity._uid, component_type, name, uid))
+            elif many:
+                setattr(component, name, [t for t in getattr(component, name) if t != uid])
+            else:
+                setattr(component, name, None)
+
+    def save(self, path):
+        # See wecs.snapshot
+        from wecs.snapshot import save_world
+        save_world(self, path)
+
+    @classmethod
+    def load(cls, path, type_aliases=None):
+        from wecs.snapshot import load_world
+        return load_world(path, cls(), type_aliases)
+
+    def save_image(self, path):
+        # See wecs.image
+        from wecs.image import save_image
+        save_image(self, path)
+
+    @classmethod
+    def open_image(cls, path, type_aliases=None):
+        from wecs.image import open_image
+        return open_image(path, cls(), type_aliases)
+
+    def record_deltas(self):
+        # See wecs.delta; Returns the tick from which on deltas can be
+        # made.
+        from wecs.delta import DeltaLog
+        self.flush_component_updates()
+        if self.delta_log is None:
+            self.delta_log = DeltaLog(self.tick)
+            # Later changes must be logged after the start.
+            self.tick += 1
+        return self.delta_log.start
+
+    def diff(self, since_tick):
+        from wecs.delta import diff
+        return diff(self, since_tick)
+
+    def apply_delta(self, delta):
+        from wecs.delta import apply_delta
+        apply_delta(self, delta)
+
+    def trim_deltas(self, tick):
+        # Drops what is recorded up to and including the tick.
+        self.delta_log.trim(tick)
+
+    def new_component(self, component_type, **values):
+        # Takes a component from the type's pool, reset by running
+        # __init__() again, so the fields get the given values or their
+        # defaults, or creates a new one.
+        pool = self.pools.get(component_type)
+        if pool:
+            try:
+                component = pool.pop()
+            except IndexError:  # Taken by another thread
+                pass
+            else:
+                try:
+                    component.__init__(**values)
+                except TypeError:
+                    pool.append(component)
+                    raise
+                return component
+        return component_type(**values)
+
+    def new_components(self, component_type, count):
+        # Like new_component(), for many components with default values
+        pool = self.pools.get(component_type)
+        if not pool:
+            return [component_type() for _ in range(count)]
+        with self.lock:
+            components = pool[-count:]
+            del pool[-count:]
+        for component in components:
+            component.__init__()
+        components.extend(component_type() for _ in range(count - len(components)))
+        return components
+
+    def recycle_components(self, component_type, components):
+        # Returns components of a pooled type to its pool. While a fork
+        # is taken, they may come back on a rollback.
+        if self.forks:
+            return
+        pool = self.pools.get(component_type)
+        if pool is None:
+            pool = self.pools[component_type] = []
+        room = self.max_pool_size - len(pool)
+        if room > 0:
+            pool.extend(components[:room])
+
+    def fork(self):
+        # See wecs.fork
+        from wecs.fork import Fork
+        self.flush_component_updates()
+        fork = Fork(self)
+        self.forks.append(fork)
+        return fork
+
+    def preserve_component(self, entity, component_type):
+        # To be called before changing a component that has no hooks,
+        # outside of a system that declares writing to it.
+        component = entity.components[component_type]
+        for fork in self.forks:
+            fork.preserve_component(component)
+
+    def preserve_structure(self, entity):
+        for fork in self.forks:
+            fork.preserve_structure(entity)
+
+    def preserve_writes(self, system, entities_by_filter):
+        # Saves the components that the system may change.
+        written = system.get_component_writes()
+        for entities in entities_by_filter.values():
+            for entity in entities:
+                for component_type in written:
+                    component = entity.components.get(component_type)
+                    if component is not None:
+                        for fork in self.forks:
+                            fork.preserve_component(component)
+
+    def get_tagged(self, tag_type):
+        # The entities that have the tag as of the last flush. The set
+        # is gathered from the archetypes once, and kept up to date
+        # from then on.
+        tagged = self.tagged.get(tag_type)
+        if tagged is None:
+            tagged = self.tagged[tag_type] = set()
+            for archetype in self.archetypes.values():
+                if tag_type in archetype.component_types:
+                    tagged.update(archetype.entities)
+        return tagged
+
+    def update_tagged(self, component_types, entities, present):
+        for component_type in component_types:
+            tagged = self.tagged.get(component_type)
+            if tagged is not None:
+                if present:
+                    tagged.update(entities)
+                else:
+                    tagged.difference_update(entities)
+
+    def get_archetype(self, component_types, parent=None, component_type=None):
+        # If the archetype is reached from a parent archetype by adding
+        # or removing component_type, only the filters that depend on
+        # that type need to be tested.
+        if parent is None:
+            mask = get_component_mask(component_types)
+        else:
+            mask = parent._mask ^ get_component_bit(component_type)
+        try:
+            return self.archetypes[mask]
+        except KeyError:
+            pass
+        archetype = Archetype(component_types, mask)
+        self.archetypes[mask] = archetype
+        if parent is None:
+            candidates = self.filter_archetypes
+        else:
+            candidates = self.filters_by_component_type.get(component_type, {})
+            for filter_func in parent.filters:
+                if filter_func not in candidates:
+                    archetype.filters[filter_func] = None
+                    self.filter_archetypes[filter_func].append(archetype)
+        for filter_func in candidates:
+            if filter_func(archetype):
+                archetype.filters[filter_func] = None
+                self.filter_archetypes[filter_func].append(archetype)
+        return archetype
+
+    def get_archetype_with(self, archetype, component_type):
+        try:
+            return archetype.add_edges[component_type]
+        except KeyError:
+            pass
+        target = self.get_archetype(
+            archetype.component_types | {component_type},
+            parent=archetype,
+            component_type=component_type,
+        )
+        archetype.add_edges[component_type] = target
+        target.remove_edges[component_type] = archetype
+        return target
 
-    def update_entity_filters(self, entities):
-        # Each filter now takes a look at each modified entity.
-        for filter_func, entities_in_filter in self.entity_filters.items():
+    def get_archetype_without(self, archetype, component_type):
+        try:
+            return archetype.remove_edges[component_type]
+        except KeyError:
+            pass
+        target = self.get_archetype(
+            archetype.component_types - {component_type},
+            parent=archetype,
+            component_type=component_type,
+        )
+        archetype.remove_edges[component_type] = target
+        target.add_edges[component_type] = archetype
+        return target
+
+    def update_entity_components(self, added, removed):
+        # Entities undergoing the same change are processed together;
+        # They move from the same old to the same new archetype, and
+        # thus in and out of the same filters. Only filters that depend
+        # on the changed component types can have changed their verdict.
+        if self.profiler is not None:
+            start = time.perf_counter_ns()
+        no_changes = {}
+        transitions = {}
+        for entity in set(added).union(removed):
+            key = (
+                entity._archetype,
+                tuple(removed.get(entity, no_changes)),
+                tuple(added.get(entity, no_changes)),
+            )
+            transitions.setdefault(key, []).append(entity)
+
+        filters_by_component_type = self.filters_by_component_type
+        recycled = {}  # {type: [components]}
+        for (old_archetype, removed_types, added_types), entities in transitions.items():
+            if old_archetype is None:
+                # Entities have been removed from the world.
+                continue
+            for entity in entities:
+                components = entity.components
+                for component_type in removed_types:
+                    component = components.pop(component_type)
+                    entity._mask &= ~get_component_bit(component_type)
+                    if getattr(component_type, '_entity_hooks', False):
+                        self.detach_component(entity, component)
+                    if getattr(component_type, '_pooled', False):
+                        recycled.setdefault(component_type, []).append(component)
+            if self.columns:
+                self.invalidate_columns(removed_types + added_types)
+            if self.temporal_clauses:
+                self.log_changes(('removed',), removed_types, entities)
+                self.log_changes(('added', 'changed'), added_types, entities)
+            if self.delta_log is not None:
+                self.delta_log.log_components(removed_types + added_types, entities, self.tick)
+            if self.tagged:
+                self.update_tagged(removed_types, entities, False)
+                self.update_tagged(added_types, entities, True)
+
+            archetype = old_archetype
+            for component_type in removed_types:
+                archetype = self.get_archetype_without(archetype, component_type)
+            for component_type in added_types:
+                archetype = self.get_archetype_with(archetype, component_type)
+            old_archetype.entities.difference_update(entities)
+            archetype.entities.update(entities)
             for entity in entities:
-                is_in_filter = entity in entities_in_filter
-                should_be_in_filter = filter_func(entity)
-                # If one newly fits the filter, add it and init it.
+                entity._archetype = archetype
+
+            affected_filters = {}
+            for component_type in removed_types + added_types:
+                if component_type in filters_by_component_type:
+                    affected_filters.update(
+                        filters_by_component_type[component_type],
+                    )
+            for filter_func in affected_filters:
+                is_in_filter = filter_func in old_archetype.filters
+                should_be_in_filter = filter_func in archetype.filters
+                # If they newly fit the filter, add them and init them.
                 if should_be_in_filter and not is_in_filter:
-                    entities_in_filter.add(entity)
+                    self.entity_filters[filter_func].update(entities)
                     system = self.system_of_filter[filter_func]
                     filter_name = system.filter_names[filter_func]
-                    system.init_entity(filter_name, entity)
-                # But if it has dropped out, remove it and destroy.
+                    self.call_init_entity(system, filter_name, entities)
+                # But if they have dropped out, remove them and destroy.
                 elif is_in_filter and not should_be_in_filter:
-                    entities_in_filter.remove(entity)
+                    self.entity_filters[filter_func].difference_update(entities)
                     system = self.system_of_filter[filter_func]
                     filter_name = system.filter_names[filter_func]
-                    components = entity.get_dropped_components_by_type()
-                    system.destroy_entity(filter_name, entity, components)
+                    self.call_destroy_entity(system, filter_name, entities, removed)
+        # Only once systems have seen the removed components
+        for component_type, components in recycled.items():
+            self.recycle_components(component_type, components)
+        if self.profiler is not None:
+            self.profiler.record('filters', 'change', time.perf_counter_ns() - start)
+
+    def get_columns(self, filter_func, component_type):
+        # Columns of a component type with columnar storage for the
+        # entities in a filter. They stay valid until the filter's
+        # entities or their components of that type change.
+        key = (filter_func, component_type)
+        try:
+            return self.columns[key]
+        except KeyError:
+            pass
+        from wecs.columnar import Columns
+        columns = Columns(component_type, self.entity_filters[filter_func])
+        self.columns[key] = columns
+        return columns
+
+    def invalidate_columns(self, component_types):
+        for component_type in component_types:
+            filters = self.filters_by_component_type.get(component_type, {})
+            for key in list(self.columns):
+                if key[1] is component_type or key[0] in filters:
+                    del self.columns[key]
+
+    def get_stages(self):
+        # Systems are put into the earliest stage after the last one
+        # that holds a system they conflict with, so a stage's systems
+        # can run concurrently. Within a stage, they stay in sort order.
+        if self.stages is None:
+            stages = []
+            for sort in sorted(self.systems):
+                system = self.systems[sort]
+                stage_idx = 0
+                for idx, stage in enumerate(stages):
+                    if any(systems_conflict(system, other) for other in stage):
+                        stage_idx = idx + 1
+                if stage_idx == len(stages):
+                    stages.append([])
+                stages[stage_idx].append(system)
+            self.stages = stages
+        return [list(stage) for stage in self.stages]
+
+    def get_channel(self, event_type):
+        channel = self.channels.get(event_type)
+        if channel is None:
+            channel = self.channels[event_type] = EventChannel(event_type)
+        return channel
+
+    def send_event(self, event):
+        self.get_channel(type(event)).send(event)
+
+    def send_action(self, entity, action):
+        # See System.consume_actions()
+        self.get_channel(type(action)).send((entity._uid, action))
+
+    def swap_channels(self):
+        # Ends an update for the event channels; Events older than the
+        # previous update are dropped.
+        for channel in self.channels.values():
+            channel.swap()
 
     def update(self):
-        for sort in sorted(self.systems):
-            system = self.systems[sort]
-            self.update_system(system)
+        if self.profiler is not None:
+            start = time.perf_counter_ns()
+        if self.allocation_profiler is not None:
+            self.allocation_profiler.begin_frame()
+        self.swap_channels()
+        if self.max_workers is None:
+            for sort in sorted(self.systems):
+                system = self.systems[sort]
+                self.update_system(system)
+        else:
+            for stage in self.get_stages():
+                self.update_stage(stage)
+        if self.profiler is not None:
+            self.profiler.record_frame(self, time.perf_counter_ns() - start)
 
     def update_system(self, system):
-            self.flush_component_updates()
-            entities_by_filter = {
-                filter_name: self.entity_filters[filter_func]
-                for filter_name, filter_func in system.entity_filters.items()
-            }
+        self.flush_component_updates()
+        self.tick += 1
+        entities_by_filter = self.get_entities_by_filter(system)
+        if self.forks:
+            self.preserve_writes(system, entities_by_filter)
+        system._last_run = self.tick
+        self.call_update(system, entities_by_filter)
+        self.tick += 1
+        if self.temporal_clauses:
+            self.trim_change_logs()
+
+    def update_stage(self, stage):
+        # The flush before a stage is the only barrier; The systems in
+        # it do not see each other's changes anyway. Each records its
+        # structural changes into its own buffer, which are applied in
+        # order of creation.
+        self.flush_component_updates()
+        self.tick += 1
+        try:
+            self.run_stage(stage)
+        finally:
+            self.tick += 1
+        if self.temporal_clauses:
+            self.trim_change_logs()
+
+    def run_stage(self, stage):
+        if len(stage) == 1:
+            system, = stage
+            entities_by_filter = self.get_entities_by_filter(system)
+            if self.forks:
+                self.preserve_writes(system, entities_by_filter)
+            system._last_run = self.tick
+            self.call_update(system, entities_by_filter)
+            return
+        if self.executor is None:
+            self.executor = concurrent.futures.ThreadPoolExecutor(
+                self.max_workers,
+            )
+        futures = []
+        for system in stage:
+            buffer = self.system_buffers.get(system)
+            if buffer is None:
+                buffer = self.system_buffers[system] = self.create_command_buffer(
+                    deferred=True,
+                )
+            entities_by_filter = self.get_entities_by_filter(system)
+            if self.forks:
+                self.preserve_writes(system, entities_by_filter)
+            system._last_run = self.tick
+            if self.allocation_profiler is not None:
+                self.run_system(system, entities_by_filter, buffer)
+                continue
+            futures.append(
+                self.executor.submit(
+                    self.run_system,
+                    system,
+                    entities_by_filter,
+                    buffer,
+                )
+            )
+        concurrent.futures.wait(futures)
+        for future in futures:
+            future.result()
+
+    def run_system(self, system, entities_by_filter, buffer):
+        self.local.commands = buffer
+        try:
+            self.call_update(system, entities_by_filter)
+        finally:
+            del self.local.commands
+
+    def call_update(self, system, entities_by_filter):
+        if self.profiler is not None:
+            start = time.perf_counter_ns()
+        if self.allocation_profiler is None:
             system.update(entities_by_filter)
+        else:
+            self.allocation_profiler.run_update(system, entities_by_filter)
+        if self.profiler is not None:
+            self.profiler.record('update', system, time.perf_counter_ns() - start)
+
+    def enable_profiling(self, window=1024):
+        # Timings of systems, flushes and hooks, see wecs.profiler
+        if self.profiler is None:
+            from wecs.profiler import Profiler
+            self.profiler = Profiler(window)
+        return self.profiler
+
+    def disable_profiling(self):
+        if hasattr(self.profiler, 'close'):
+            self.profiler.close()
+        self.profiler = None
+
+    def enable_tracing(self, **kwargs):
+        # A profiler that also records a trace, see wecs.trace
+        from wecs.trace import Tracer
+        if not isinstance(self.profiler, Tracer):
+            tracer = Tracer(**kwargs)
+            if self.profiler is not None:
+                tracer.histograms = self.profiler.histograms
+            self.profiler = tracer
+        return self.profiler
+
+    def enable_allocation_profiling(self, frames=60, top=10, nframe=1):
+        # Allocations of systems, see wecs.profiler.AllocationProfiler
+        if self.allocation_profiler is None:
+            from wecs.profiler import AllocationProfiler
+            self.allocation_profiler = AllocationProfiler(frames, top, nframe)
+        return self.allocation_profiler
+
+    def disable_allocation_profiling(self):
+        if self.allocation_profiler is not None:
+            self.allocation_profiler.stop()
+            self.allocation_profiler = None
+
+    def get_entities_by_filter(self, system):
+        entities_by_filter = {}
+        for filter_name, filter_func in system.entity_filters.items():
+            entities = self.entity_filters[filter_func]
+            temporal_clauses = self.temporal_clauses.get(filter_func)
+            if temporal_clauses:
+                entities = self.get_changed_entities(
+                    entities,
+                    temporal_clauses,
+                    system._last_run,
+                )
+            entities_by_filter[filter_name] = entities
+        return entities_by_filter
+
+    def get_changed_entities(self, entities, temporal_clauses, since):
+        # Walks the logs back from their most recent entries. A system
+        # that has not run yet sees all entities with the component
+        # types as changed and added.
+        for clause in temporal_clauses:
+            logs = self.change_logs[clause.kind]
+            matched = set()
+            for component_type in clause.types_and_filters:
+                if since == 0 and clause.kind != 'removed':
+                    matched.update(
+                        entity for entity in entities
+                        if component_type in entity.components
+                    )
+                    continue
+                for entity, tick in reversed(logs[component_type].items()):
+                    if tick <= since:
+                        break
+                    matched.add(entity)
+            entities = matched & entities
+        return entities
+
+    def mark_changed(self, entity, component_type, field_name=None):
+        # Also to be called after changing a component in place; Without
+        # a field name, the whole component counts as changed.
+        ticks = self.change_logs['changed'].get(component_type)
+        if ticks is not None:
+            ticks.pop(entity, None)
+            ticks[entity] = self.tick
+        if self.delta_log is not None:
+            self.delta_log.log_change(entity._uid, component_type, field_name, self.tick)
+
+    def log_changes(self, kinds, component_types, entities):
+        tick = self.tick
+        for kind in kinds:
+            logs = self.change_logs[kind]
+            for component_type in component_types:
+                ticks = logs.get(component_type)
+                if ticks is not None:
+                    for entity in entities:
+                        ticks.pop(entity, None)
+                        ticks[entity] = tick
+
+    def trim_change_logs(self):
+        # Drops the entries that every system has seen already.
+        since = min(
+            self.system_of_filter[filter_func]._last_run
+            for filter_func in self.temporal_clauses
+        )
+        for logs in self.change_logs.values():
+            for ticks in logs.values():
+                while ticks:
+                    entity = next(iter(ticks))
+                    if ticks[entity] > since:
+                        break
+                    del ticks[entity]
+
+    def prune_change_logs(self):
+        # Drops the logs that no temporal clause refers to anymore.
+        watched = set()
+        for temporal_clauses in self.temporal_clauses.values():
+            for clause in temporal_clauses:
+                for component_type in clause.types_and_filters:
+                    watched.add((clause.kind, component_type))
+        for kind, logs in self.change_logs.items():
+            for component_type in list(logs):
+                if (kind, component_type) not in watched:
+                    del logs[component_type]
 
     def __getitem__(self, uid):
         return self.get_entity(uid)
 
     def __delitem__(self, uid):
-        return self.remove_entity(component_type)
+        self.destroy_entity(uid)
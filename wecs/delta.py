@@ -0,0 +1,269 @@
+# Deltas between states of a world, for replays, spectators, and standby
+# servers. Once world.record_deltas() is called, the world logs which
+# entities were created and destroyed, which components were added or
+# removed, and which fields of tracked components and reference fields
+# were assigned to, each with the tick that it happened at.
+# world.diff(since_tick) turns what happened after a tick into a Delta,
+# and another world that is in the state that the first one was in at
+# that tick catches up with world.apply_delta(delta):
+#
+#     start = primary.record_deltas()
+#     primary.save(path)
+#     standby = World.load(path)
+#     ...
+#     delta = primary.diff(start)
+#     standby.apply_delta(delta)
+#     start = delta.tick
+#
+# Added components are sent whole; Of components already on an entity,
+# only the assigned fields are sent, which is only known for components
+# with tracked=True or reference fields. Reference lists changed in
+# place are sent with world.update_references(). Other changes in place,
+# e.g. to a list, can be reported with world.mark_changed(entity,
+# component_type), which sends the whole component. Fields with
+# metadata={'delta': False}, e.g. ones that systems derive anew each
+# update, are left out, and get their defaults on new components. Values
+# are copied, and UIDs stay the same.
+#
+# The log keeps growing until world.trim_deltas(tick) drops the entries
+# that every consumer has seen.
+
+import copy
+import dataclasses
+
+from wecs.core import Entity, NoSuchUID, INDEX_BITS, INDEX_MASK
+from wecs.snapshot import get_defaults, make_components
+
+
+IMMUTABLE_TYPES = {int, float, bool, str, bytes, type(None)}
+
+
+class DeltaLog:
+    def __init__(self, tick):
+        self.start = tick  # Deltas since earlier ticks are incomplete.
+        # All ordered by tick
+        self.created = {}  # {UID: tick}
+        self.destroyed = {}  # {UID: tick}
+        self.components = {}  # {(UID, type): tick}, for added and removed ones
+        self.fields = {}  # {(UID, type, field name or None): tick}
+
+    def log_created(self, entities, tick):
+        created = self.created
+        for entity in entities:
+            created[entity._uid] = tick
+
+    def log_destroyed(self, uid, tick):
+        self.destroyed[uid] = tick
+
+    def log_components(self, component_types, entities, tick):
+        components = self.components
+        for component_type in component_types:
+            for entity in entities:
+                key = (entity._uid, component_type)
+                components.pop(key, None)
+                components[key] = tick
+
+    def log_change(self, uid, component_type, field_name, tick):
+        key = (uid, component_type, field_name)
+        self.fields.pop(key, None)
+        self.fields[key] = tick
+
+    def trim(self, tick):
+        for log in (self.created, self.destroyed, self.components, self.fields):
+            while log:
+                key = next(iter(log))
+                if log[key] > tick:
+                    break
+                del log[key]
+        self.start = max(self.start, tick)
+
+
+def get_since(log, since):
+    # The keys logged after the tick, most recent first
+    keys = []
+    for key, tick in reversed(log.items()):
+        if tick <= since:
+            break
+        keys.append(key)
+    return keys
+
+
+@dataclasses.dataclass
+class Delta:
+    since: int
+    tick: int
+    created: dict  # {UID: name}
+    destroyed: list  # [UIDs]
+    # {UID: {type: {field name: value}}}, with None for removed ones
+    components: dict
+    fields: dict  # {UID: {type: {field name: value}}}
+
+    def __len__(self):
+        return (
+            len(self.created) + len(self.destroyed)
+            + sum(len(types) for types in self.components.values())
+            + sum(len(types) for types in self.fields.values())
+        )
+
+
+_delta_fields = {}  # {type: [field names]}
+
+
+def get_delta_fields(component_type):
+    field_names = _delta_fields.get(component_type)
+    if field_names is None:
+        field_names = _delta_fields[component_type] = [
+            field.name for field in dataclasses.fields(component_type)
+            if field.metadata.get('delta', True)
+        ]
+    return field_names
+
+
+def copy_value(value):
+    if type(value) in IMMUTABLE_TYPES:
+        return value
+    return copy.deepcopy(value)
+
+
+def diff(world, since):
+    log = world.delta_log
+    if log is None:
+        raise ValueError("World doesn't record deltas")
+    if since < log.start:
+        raise ValueError("Changes before tick {} are not recorded".format(log.start))
+    world.flush_component_updates()
+    tick = world.tick
+    # Changes from here on belong to the next delta.
+    world.tick += 1
+
+    # Entities that came and went in between are left out altogether.
+    created_uids = set(get_since(log.created, since))
+    destroyed = [
+        uid for uid in reversed(get_since(log.destroyed, since))
+        if uid not in created_uids
+    ]
+    alive = {}
+    for uid in created_uids:
+        try:
+            alive[uid] = world.get_entity(uid)
+        except NoSuchUID:
+            pass
+    created = {
+        uid: entity._name
+        for uid, entity in sorted(alive.items(), key=lambda item: log.created[item[0]])
+    }
+
+    def get_entity(uid):
+        if uid not in alive:
+            try:
+                alive[uid] = world.get_entity(uid)
+            except NoSuchUID:
+                alive[uid] = None
+        return alive[uid]
+
+    components = {}
+    for uid, component_type in get_since(log.components, since):
+        entity = get_entity(uid)
+        if entity is None:
+            continue
+        component = entity.components.get(component_type)
+        if component is None:
+            values = None
+        else:
+            values = {
+                name: copy_value(getattr(component, name))
+                for name in get_delta_fields(component_type)
+            }
+        components.setdefault(uid, {})[component_type] = values
+
+    fields = {}
+    for uid, component_type, field_name in get_since(log.fields, since):
+        if component_type in components.get(uid, ()):
+            continue  # Sent whole already
+        entity = get_entity(uid)
+        if entity is None or component_type not in entity.components:
+            continue
+        if field_name is None:
+            field_names = get_delta_fields(component_type)
+        elif field_name in get_delta_fields(component_type):
+            field_names = [field_name]
+        else:
+            continue
+        component = entity.components[component_type]
+        values = fields.setdefault(uid, {}).setdefault(component_type, {})
+        for name in field_names:
+            if name not in values:
+                values[name] = copy_value(getattr(component, name))
+    return Delta(since, tick, created, destroyed, components, fields)
+
+
+def place_entities(world, created):
+    # Creates entities with the given UIDs, in slots that must be free.
+    table = world.entities
+    generations = world.generations
+    taken = set()
+    entities = []
+    with world.lock:
+        for uid, name in created.items():
+            index = uid & INDEX_MASK
+            if index >= len(table):
+                start = len(table)
+                table.extend([None] * (index + 1 - start))
+                generations.extend([1] * (index + 1 - start))
+                world.free_indices.extend(range(start, index + 1))
+            elif table[index] is not None:
+                raise ValueError("Slot of entity {} is in use".format(uid))
+            generations[index] = uid >> INDEX_BITS
+            entity = Entity(world, uid, name)
+            table[index] = entity
+            taken.add(index)
+            entities.append(entity)
+        world.free_indices[:] = [
+            index for index in world.free_indices if index not in taken
+        ]
+    if world.delta_log is not None:
+        world.delta_log.log_created(entities, world.tick)
+    world.create_entity_batches([(world.root_archetype, entities)])
+
+
+def make_component(component_type, values):
+    columns = {name: [value] for name, value in values.items()}
+    for name, factory in get_defaults(component_type, columns).items():
+        columns[name] = [factory()]
+    component, = make_components(component_type, columns, 1)
+    return component
+
+
+def apply_delta(world, delta):
+    world.flush_component_updates()
+    # Slots of destroyed entities may be reused by created ones.
+    destroyed = []
+    for uid in delta.destroyed:
+        try:
+            destroyed.append(world.get_entity(uid))
+        except NoSuchUID:
+            pass
+    world.destroy_entities(destroyed)
+    world.flush_component_updates()
+    place_entities(world, delta.created)
+
+    for uid, components in delta.components.items():
+        entity = world.get_entity(uid)
+        for component_type, values in components.items():
+            if values is None:
+                if component_type in entity.components:
+                    entity.remove_component(component_type)
+            elif component_type in entity.components:
+                component = entity.components[component_type]
+                for name, value in values.items():
+                    setattr(component, name, copy_value(value))
+            else:
+                values = {name: copy_value(value) for name, value in values.items()}
+                entity.add_component(make_component(component_type, values))
+    for uid, components in delta.fields.items():
+        entity = world.get_entity(uid)
+        for component_type, values in components.items():
+            component = entity.components[component_type]
+            for name, value in values.items():
+                setattr(component, name, copy_value(value))
+    world.flush_component_updates()
@@ -1,10 +1,11 @@
 from typing import List
-from dataclasses import field
 
 from wecs.core import Component
 from wecs.core import System
 from wecs.core import UID
 from wecs.core import and_filter
+from wecs.core import reference
+from wecs.core import references
 from wecs.rooms import Room
 from wecs.rooms import RoomPresence
 from wecs.rooms import is_in_room
@@ -15,7 +16,7 @@ from wecs.inventory import is_in_inventory
 @Component()
 class Equipment:
     # Contains entities with Slot component
-    slots: List[UID] = field(default_factory=list)
+    slots: List[UID] = references()
 
 
 @Component()
@@ -23,7 +24,7 @@ class Slot:
     # An entity must have a component of this type to be equippable
     # in this slot
     type: type
-    content: UID # The actual item
+    content: UID = reference() # The actual item
 
 
 @Component()
@@ -32,13 +33,13 @@ class Equippable:
     type: type
 
 
-@Component()
+@Component(pooled=True)
 class EquipAction:
     item: UID
     slot: UID
 
 
-@Component()
+@Component(pooled=True)
 class UnequipAction:
     slot: UID
     target: UID
@@ -101,6 +102,7 @@ def equip(item, slot, entity):
     elif is_in_inventory(item, entity):
         inventory = entity.get_component(Inventory)
         del inventory.contents[inventory.contents.index(item._uid)]
+        entity.world.update_references(entity, Inventory)
         slot_cmpt.content = item._uid
 
 
@@ -116,7 +118,10 @@ def unequip(slot, target, entity, world):
     elif target.has_component(Inventory):
         inventory = target.get_component(Inventory)
         slot_cmpt.content = None
+        # The target may be another entity than the acting one.
+        world.preserve_component(target, Inventory)
         inventory.contents.append(item_uid)
+        world.update_references(target, Inventory)
     else:
         print("Unequipping failed.")
 
@@ -126,20 +131,19 @@ class EquipOrUnequip(System):
         'equip': and_filter([EquipAction]),
         'unequip': and_filter([UnequipAction]),
     }
+    component_reads = [Equippable, Room]
+    component_writes = [EquipAction, UnequipAction, Slot, Inventory, RoomPresence]
+    event_reads = [EquipAction, UnequipAction]
 
     def update(self, entities_by_filter):
-        for entity in entities_by_filter['unequip']:
-            action = entity.get_component(UnequipAction)
-            entity.remove_component(UnequipAction)
-
+        unequips = self.consume_actions(UnequipAction, entities_by_filter['unequip'])
+        for entity, action in unequips:
             slot = self.world.get_entity(action.slot)
             target = self.world.get_entity(action.target)
             unequip(slot, target, entity, self.world)
 
-        for entity in entities_by_filter['equip']:
-            action = entity.get_component(EquipAction)
-            entity.remove_component(EquipAction)
-
+        equips = self.consume_actions(EquipAction, entities_by_filter['equip'])
+        for entity, action in equips:
             item = self.world.get_entity(action.item)
             slot = self.world.get_entity(action.slot)
             equip(item, slot, entity)
@@ -0,0 +1,166 @@
+# Forks of a world, for lookahead and rollback. A fork is taken in place;
+# The world goes on to simulate the forked timeline, and rolling the
+# fork back returns the world to the state it was in when it was forked,
+# while discarding it keeps the changes:
+#
+#     with world.fork():
+#         world.update()
+#         outcome = evaluate(world)
+#     # The world is as it was before.
+#
+#     fork = world.fork()
+#     world.update()
+#     ...
+#     fork.rollback()  # or fork.discard()
+#
+# Nothing is copied up front. Until the fork is rolled back or discarded,
+# a component is saved right before it may change for the first time:
+# * when a field of a component with hooks (tracked=True, or with
+#   reference fields) is assigned to,
+# * when a system that writes to its type runs, for the entities in the
+#   system's filters and the actors of the actions that it consumes, see
+#   System.component_writes,
+# * when world.preserve_component() is called, which code outside of
+#   systems has to do before changing other components.
+# Entities that are created and destroyed, and components that are added
+# and removed, are logged as well. Thus the cost of a fork grows with
+# what is changed, not with the size of the world.
+#
+# Restored are the entities, including their UIDs and the order of reuse
+# of free UIDs, their components, and the values of their fields. The
+# tick, change logs, event channels and systems' own state are not.
+
+import dataclasses
+
+from wecs.core import INDEX_MASK, get_component_mask
+
+
+def copy_containers(value):
+    # Values of fields are saved with their lists, dicts and sets
+    # copied; Other objects are considered handles.
+    value_type = type(value)
+    if value_type is list:
+        return [copy_containers(item) for item in value]
+    if value_type is dict:
+        return {key: copy_containers(item) for key, item in value.items()}
+    if value_type is set:
+        return set(value)
+    return value
+
+
+class Fork:
+    def __init__(self, world):
+        self.world = world
+        self.num_slots = len(world.entities)
+        self.free_indices = list(world.free_indices)
+        self.generations = {}  # {index: generation}, before it changed
+        self.created = []  # [Entities]
+        self.destroyed = {}  # {Entity: None}
+        self.structures = {}  # {Entity: {type: component}}, before it changed
+        self.values = {}  # {id(component): (component, {field name: value})}
+
+    def preserve_component(self, component):
+        if id(component) not in self.values:
+            self.values[id(component)] = (
+                component,
+                {
+                    field.name: copy_containers(getattr(component, field.name))
+                    for field in dataclasses.fields(component)
+                },
+            )
+
+    def preserve_structure(self, entity):
+        if entity not in self.structures:
+            self.structures[entity] = dict(entity.components)
+
+    def log_created(self, entities, generations):
+        # Slots that were free before may be reused.
+        for entity in entities:
+            index = entity._uid & INDEX_MASK
+            if index < self.num_slots:
+                self.generations.setdefault(index, generations[index])
+        self.created.extend(entities)
+
+    def log_destroyed(self, entity, index, generation):
+        self.generations.setdefault(index, generation)
+        self.destroyed[entity] = None
+        self.preserve_structure(entity)
+
+    def rollback(self):
+        world = self.world
+        world.flush_component_updates()
+        self.close()
+
+        # Entities created in the fork go first, so that their slots are
+        # free again.
+        created = set(self.created)
+        world.destroy_entity_batches([
+            entity for entity in self.created
+            if entity._archetype is not None
+        ])
+
+        # Entities that lost or gained components get their original
+        # ones back, in two steps, as a type can't be added to an entity
+        # while it is still being removed.
+        buffer = world.commands
+        structures = [
+            (entity, components)
+            for entity, components in self.structures.items()
+            if entity not in created and entity not in self.destroyed
+        ]
+        for entity, components in structures:
+            for component_type, component in list(entity.components.items()):
+                if components.get(component_type) is not component:
+                    buffer.remove_component(entity, component_type)
+        world.flush_component_updates()
+        for entity, components in structures:
+            for component_type, component in components.items():
+                if component_type not in entity.components:
+                    buffer.add_component(entity, component)
+        world.flush_component_updates()
+
+        # Destroyed entities return into their slots.
+        batches = {}
+        for entity in self.destroyed:
+            if entity in created:
+                continue
+            index = entity._uid & INDEX_MASK
+            world.entities[index] = entity
+            world.generations[index] = self.generations[index]
+            entity.components = self.structures[entity]
+            entity._mask = get_component_mask(entity.components)
+            for component in entity.components.values():
+                if getattr(type(component), '_entity_hooks', False):
+                    world.attach_component(entity, component)
+            archetype = world.get_archetype(frozenset(entity.components))
+            batches.setdefault(archetype, []).append(entity)
+        world.create_entity_batches(list(batches.items()))
+
+        # Values are restored last, as that may index references to
+        # entities restored above.
+        for component, state in self.values.values():
+            for name, value in state.items():
+                setattr(component, name, value)
+
+        for index, generation in self.generations.items():
+            world.generations[index] = generation
+        del world.entities[self.num_slots:]
+        del world.generations[self.num_slots:]
+        world.free_indices[:] = self.free_indices
+        world.columns = {}
+
+    def discard(self):
+        self.close()
+
+    def close(self):
+        # Forks taken after this one end along with it.
+        forks = self.world.forks
+        if self in forks:
+            del forks[forks.index(self):]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self in self.world.forks:
+            self.rollback()
@@ -0,0 +1,434 @@
+# World images, a read-mostly variant of snapshots (see wecs.snapshot)
+# for large static content like rooms, items, and level descriptions.
+# An image is memory-mapped instead of being read, and only the entities
+# and their archetype memberships are restored up front; Entities are
+# stored grouped by archetype, so that each archetype, and thus the
+# filters matching it, receives its entities in one piece. Components
+# stay in the file until their entity is first accessed, e.g. by
+# entity[Room] or entity.components, at which point all components of
+# that entity are read.
+#
+#     world.save_image('level.weci')
+#     ...
+#     world = World.open_image('level.weci')
+#     world.add_system(PerceiveRoom(), 0)
+#
+# Every column of an image can be read row by row: Numeric and reference
+# fields are stored as packed arrays, lists of references and other
+# fields as an array of offsets followed by the data, with each value
+# pickled on its own. The references between entities are indexed from
+# the reference columns, without reading the components. Schema changes
+# are handled as in snapshots.
+#
+# The file stays open until world.image.close() is called, which reads
+# all remaining entities.
+
+import array
+import mmap
+import pickle
+import struct
+import dataclasses
+
+from wecs.core import Entity, INDEX_BITS, get_component_mask
+from wecs.snapshot import SnapshotError, TYPECODES, NUMERIC_TYPES, PYTHON_TYPES
+from wecs.snapshot import gc_paused, get_type_name, resolve_type_name
+from wecs.snapshot import get_field_map, get_defaults, unpack_array
+
+
+MAGIC = b'WECI'
+FORMAT_VERSION = 1
+PREAMBLE = struct.Struct('<4sIQ')  # Magic, version, header size
+ALIGNMENT = 8
+
+
+class ImageEntity(Entity):
+    # An entity whose components are still in the image. Testing for
+    # components doesn't need to read them, as any change to them would
+    # have read them already.
+    @property
+    def components(self):
+        return self._source.image.materialize(self)
+
+    def has_component(self, component_type, subclasses=False):
+        if subclasses:
+            return Entity.has_component(self, component_type, subclasses)
+        return component_type in self._archetype.component_types
+
+    def has_tag(self, tag_type):
+        return tag_type in self._archetype.component_types
+
+    def __contains__(self, component_type):
+        return component_type in self._archetype.component_types
+
+
+# The components of the entities of one archetype, as
+# [(component type, row of the archetype's first entity, make function)]
+class ArchetypeSource:
+    def __init__(self, image, readers):
+        self.image = image
+        self.readers = readers
+
+
+def encode_column(field, values):
+    # Returns the encoding and the sections of a column.
+    reference = field.metadata.get('reference')
+    if reference is not None:
+        _, many = reference
+        if not many:
+            return 'uid', [array.array('Q', [v or 0 for v in values]).tobytes()]
+        return 'uids', encode_items([
+            array.array('Q', v).tobytes() for v in values
+        ])
+    kind = NUMERIC_TYPES.get(field.type)
+    if kind is not None:
+        python_type = PYTHON_TYPES[kind]
+        if all(type(v) is python_type for v in values):
+            try:
+                return kind, [array.array(TYPECODES[kind], values).tobytes()]
+            except OverflowError:
+                pass
+    # Values equal to the field's default are left empty; Pickles never
+    # are.
+    default = get_default_factory(field)
+    default_value = default() if default is not None else object()
+    return 'object', encode_items([
+        b'' if v == default_value
+        else pickle.dumps(v, protocol=pickle.HIGHEST_PROTOCOL)
+        for v in values
+    ])
+
+
+def get_default_factory(field):
+    if field.default is not dataclasses.MISSING:
+        return lambda default=field.default: default
+    if field.default_factory is not dataclasses.MISSING:
+        return field.default_factory
+    return None
+
+
+def encode_items(items):
+    # An array of len(items) + 1 offsets, and the concatenated items
+    offsets = array.array('Q', [0])
+    end = 0
+    for item in items:
+        end += len(item)
+        offsets.append(end)
+    return [offsets.tobytes(), b''.join(items)]
+
+
+def get_column_reader(kind, sections, default=None):
+    # Returns a function returning the value in a row.
+    if kind == 'uid':
+        uids = sections[0].cast('Q')
+        return lambda row: uids[row] or None
+    if kind == 'bool':
+        flags = sections[0].cast('b')
+        return lambda row: bool(flags[row])
+    if kind in TYPECODES:
+        return sections[0].cast(TYPECODES[kind]).__getitem__
+    offsets = sections[0].cast('Q')
+    data = sections[1]
+    if kind == 'uids':
+        flat = data.cast('Q')
+
+        def read(row):
+            start = offsets[row]
+            stop = offsets[row + 1]
+            if start == stop:
+                return []
+            return flat[start // 8:stop // 8].tolist()
+        return read
+    loads = pickle.loads
+
+    def read(row):
+        start = offsets[row]
+        stop = offsets[row + 1]
+        if start == stop:
+            return default()
+        return loads(data[start:stop])
+    return read
+
+
+def get_column_values(kind, sections, count):
+    reader = get_column_reader(kind, sections)
+    if kind == 'uid':
+        return [uid or None for uid in sections[0].cast('Q')]
+    return [reader(row) for row in range(count)]
+
+
+def get_component_maker(component_type, readers, defaults):
+    # Returns a function making the component in a row, without calling
+    # __init__ or the hooks of tracked components.
+    names = [name for name, _ in readers]
+    readers = [reader for _, reader in readers]
+    defaults = list(defaults.items())
+    new = component_type.__new__
+
+    def get_values(row):
+        values = {name: read(row) for name, read in zip(names, readers)}
+        for name, factory in defaults:
+            values[name] = factory()
+        return values
+
+    if hasattr(component_type, '_store'):  # Columnar storage
+        def make(row):
+            component = new(component_type)
+            component.__setstate__(get_values(row))
+            return component
+    elif not hasattr(component_type, '__slots__'):
+        def make(row):
+            component = new(component_type)
+            component.__dict__ = get_values(row)
+            return component
+    else:
+        set_field = object.__setattr__
+
+        fields = list(zip(names, readers))
+
+        def make(row):
+            component = new(component_type)
+            for name, read in fields:
+                set_field(component, name, read(row))
+            for name, factory in defaults:
+                set_field(component, name, factory())
+            return component
+    return make
+
+
+def save_image(world, path):
+    with gc_paused():
+        write_image(world, path)
+
+
+def write_image(world, path):
+    world.flush_component_updates()
+    blobs = []
+    offset = 0
+
+    def add_blob(data):
+        # Sections are aligned, so that they can be read as arrays.
+        nonlocal offset
+        padding = -len(data) % ALIGNMENT
+        blobs.append(data)
+        blobs.append(bytes(padding))
+        section = (offset, len(data))
+        offset += len(data) + padding
+        return section
+
+    archetypes = [
+        archetype for archetype in world.archetypes.values()
+        if archetype.entities
+    ]
+    component_types = {}  # {type: index}
+    for archetype in archetypes:
+        for component_type in archetype.component_types:
+            component_types.setdefault(component_type, len(component_types))
+    names = {
+        entity._uid: entity._name
+        for entity in world.entities
+        if entity is not None and entity._name is not None
+    }
+    header = {
+        'generations': add_blob(array.array('I', world.generations).tobytes()),
+        'free_indices': add_blob(array.array('I', world.free_indices).tobytes()),
+        'names': add_blob(pickle.dumps(names, protocol=pickle.HIGHEST_PROTOCOL)),
+        'archetypes': [],
+        'component_types': [],
+    }
+
+    entities_by_type = {component_type: [] for component_type in component_types}
+    for archetype in archetypes:
+        entities = sorted(archetype.entities, key=lambda entity: entity._uid)
+        header['archetypes'].append({
+            'types': sorted(component_types[t] for t in archetype.component_types),
+            'count': len(entities),
+            'indices': add_blob(array.array(
+                'I',
+                [entity._uid & ((1 << INDEX_BITS) - 1) for entity in entities],
+            ).tobytes()),
+        })
+        for component_type in archetype.component_types:
+            entities_by_type[component_type].extend(entities)
+
+    # Rows of a type's columns are ordered by archetype, and then by UID.
+    for component_type, entities in entities_by_type.items():
+        components = [entity.components[component_type] for entity in entities]
+        type_header = {
+            'type': get_type_name(component_type),
+            'count': len(components),
+            'fields': [],
+        }
+        for field in dataclasses.fields(component_type):
+            values = [getattr(c, field.name) for c in components]
+            kind, sections = encode_column(field, values)
+            type_header['fields'].append(
+                (field.name, kind, [add_blob(data) for data in sections]),
+            )
+        header['component_types'].append(type_header)
+
+    header_data = pickle.dumps(header, protocol=pickle.HIGHEST_PROTOCOL)
+    header_data += bytes(-(PREAMBLE.size + len(header_data)) % ALIGNMENT)
+    with open(path, 'wb') as f:
+        f.write(PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header_data)))
+        f.write(header_data)
+        for blob in blobs:
+            f.write(blob)
+
+
+class WorldImage:
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # Empty file
+            self.file.close()
+            raise SnapshotError("Not a world image")
+        self.data = memoryview(self.map)
+        self.entities = []  # Entities that may not be read yet
+        self.world = None
+        try:
+            magic, version, header_size = PREAMBLE.unpack_from(self.data)
+            if magic != MAGIC:
+                raise SnapshotError("Not a world image")
+            if version != FORMAT_VERSION:
+                raise SnapshotError("Unsupported image version {}".format(version))
+        except (struct.error, SnapshotError):
+            self.close()
+            raise
+        start = PREAMBLE.size
+        self.header = pickle.loads(self.data[start:start + header_size])
+        self.start = start + header_size
+
+    def get_section(self, section):
+        offset, size = section
+        return self.data[self.start + offset:self.start + offset + size]
+
+    def materialize(self, entity):
+        # Turns an ImageEntity into an ordinary Entity.
+        with self.world.lock:
+            if type(entity) is not ImageEntity:  # Another thread was faster.
+                return entity.components
+            source = entity._source
+            row = entity._row
+            components = {}
+            for component_type, base, make in source.readers:
+                component = make(base + row)
+                if getattr(component_type, '_entity_hooks', False):
+                    object.__setattr__(component, '_entity', entity)
+                components[component_type] = component
+            state = entity.__dict__
+            del state['_source']
+            del state['_row']
+            state['components'] = components
+            entity.__class__ = Entity
+            return components
+
+    def materialize_all(self):
+        for entity in self.entities:
+            if type(entity) is ImageEntity:
+                self.materialize(entity)
+        self.entities = []
+
+    def close(self):
+        if self.world is not None:
+            self.materialize_all()
+            if self.world.image is self:
+                self.world.image = None
+        # Every view into the map must be released before closing it.
+        self.data.release()
+        self.map.close()
+        self.file.close()
+
+    def load(self, world, type_aliases):
+        header = self.header
+        generations = unpack_array('I', self.get_section(header['generations'])).tolist()
+        free_indices = unpack_array('I', self.get_section(header['free_indices'])).tolist()
+        names = pickle.loads(self.get_section(header['names']))
+
+        component_types = []
+        readers = []  # [make function]
+        references = []  # [(type, field name, kind, sections)]
+        for type_header in header['component_types']:
+            component_type = resolve_type_name(type_header['type'], type_aliases)
+            field_map = get_field_map(
+                component_type,
+                [name for name, _, _ in type_header['fields']],
+            )
+            fields = {
+                field.name: get_default_factory(field)
+                for field in dataclasses.fields(component_type)
+            }
+            field_readers = []
+            for name, kind, sections in type_header['fields']:
+                if name not in field_map:
+                    continue
+                sections = [self.get_section(section) for section in sections]
+                field_readers.append((
+                    field_map[name],
+                    get_column_reader(kind, sections, fields[field_map[name]]),
+                ))
+                if field_map[name] in getattr(component_type, '_reference_fields', {}):
+                    references.append((component_type, field_map[name], kind, sections))
+            defaults = get_defaults(component_type, dict(field_readers))
+            component_types.append(component_type)
+            readers.append(get_component_maker(component_type, field_readers, defaults))
+
+        table = [None] * len(generations)
+        rows = [0] * len(component_types)  # Next row in each type's columns
+        entities_by_type = {component_type: [] for component_type in component_types}
+        batches = []
+        for archetype_header in header['archetypes']:
+            types = [component_types[index] for index in archetype_header['types']]
+            source = ArchetypeSource(self, [
+                (component_types[index], rows[index], readers[index])
+                for index in archetype_header['types']
+            ])
+            for index in archetype_header['types']:
+                rows[index] += archetype_header['count']
+            archetype = world.get_archetype(frozenset(types))
+            mask = get_component_mask(types)
+            indices = unpack_array('I', self.get_section(archetype_header['indices']))
+            entities = []
+            new = ImageEntity.__new__
+            for row, index in enumerate(indices):
+                entity = new(ImageEntity)
+                uid = (generations[index] << INDEX_BITS) | index
+                entity.__dict__ = {
+                    'world': world,
+                    '_mask': mask,
+                    '_archetype': None,
+                    '_uid': uid,
+                    '_name': names.get(uid),
+                    '_source': source,
+                    '_row': row,
+                }
+                table[index] = entity
+                entities.append(entity)
+            for component_type in types:
+                entities_by_type[component_type].extend(entities)
+            self.entities.extend(entities)
+            batches.append((archetype, entities))
+        world.entities = table
+        world.generations = generations
+        world.free_indices = free_indices
+        world.create_entity_batches(batches)
+
+        for component_type, name, kind, sections in references:
+            entities = entities_by_type[component_type]
+            values = get_column_values(kind, sections, len(entities))
+            world.index_references(component_type, name, entities, values)
+        self.world = world
+        world.image = self
+        return world
+
+
+def open_image(path, world, type_aliases=None):
+    if world.entities:
+        raise SnapshotError("Images can only be opened into an empty world")
+    image = WorldImage(path)
+    try:
+        with gc_paused():
+            return image.load(world, type_aliases or {})
+    except Exception:
+        image.close()
+        raise
@@ -1,25 +1,24 @@
-from dataclasses import field
-
-from wecs.core import Component, System, UID, NoSuchUID, and_filter
+from wecs.core import Component, Tag, System, UID, NoSuchUID, and_filter
+from wecs.core import references
 from wecs.rooms import RoomPresence
 
 
 @Component()
 class Inventory:
-    contents: list = field(default_factory=list)
+    contents: list = references()
 
 
-@Component()
+@Tag()
 class Takeable:
     pass
 
 
-@Component()
+@Component(pooled=True)
 class TakeAction:
     item: UID
 
 
-@Component()
+@Component(pooled=True)
 class DropAction:
     item: UID
 
@@ -113,6 +112,7 @@ def can_drop(item, entity, throw_exc=False):
 def take(item, entity):
     item.remove_component(RoomPresence)
     entity.get_component(Inventory).contents.append(item._uid)
+    entity.world.update_references(entity, Inventory)
 
 
 def drop(item, entity):
@@ -120,6 +120,7 @@ def drop(item, entity):
     inventory = entity.get_component(Inventory).contents
     idx = inventory.index(item._uid)
     del inventory[idx]
+    entity.world.update_references(entity, Inventory)
     item.add_component(RoomPresence(room=room_uid))
 
 
@@ -128,20 +129,28 @@ class TakeOrDrop(System):
         'take': and_filter([TakeAction]),
         'drop': and_filter([DropAction]),
     }
+    component_reads = [Takeable]
+    component_writes = [TakeAction, DropAction, Inventory, RoomPresence]
+    event_reads = [TakeAction, DropAction]
 
     def update(self, entities_by_filter):
-        for entity in entities_by_filter['take']:
-            action = entity.get_component(TakeAction)
+        takes = self.consume_actions(TakeAction, entities_by_filter['take'])
+        # Taken items leave their room only when the removal is flushed.
+        taken = set()
+        for entity, action in takes:
             try:
                 item = self.world.get_entity(action.item)
-                if can_take(item, entity, self.throw_exc):
+                if item._uid in taken:
+                    if self.throw_exc:
+                        raise ItemNotInRoom
+                elif can_take(item, entity, self.throw_exc):
                     take(item, entity)
+                    taken.add(item._uid)
             except NoSuchUID:
                 if self.throw_exc:
                     raise
-            entity.remove_component(TakeAction)
-        for entity in entities_by_filter['drop']:
-            item = self.world.get_entity(entity.get_component(DropAction).item)
-            entity.remove_component(DropAction)
+        drops = self.consume_actions(DropAction, entities_by_filter['drop'])
+        for entity, action in drops:
+            item = self.world.get_entity(action.item)
             if can_drop(item, entity, self.throw_exc):
                 drop(item, entity)
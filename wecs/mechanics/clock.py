@@ -5,6 +5,7 @@ from wecs.core import Component
 from wecs.core import System
 from wecs.core import and_filter
 from wecs.core import UID
+from wecs.core import reference
 
 
 class SettableClock:
@@ -24,7 +25,7 @@ class Clock:
     timestep: float = 0.0  # Deprecated
     max_timestep: float = 1.0/30
     scaling_factor: float = 1.0
-    parent: UID = None
+    parent: UID = reference(default=None)
     wall_time: float = 0.0
     frame_time: float = 0.0
     game_time: float = 0.0
@@ -1,3 +1,5 @@
+import time
+
 from panda3d.core import PStatClient
 from panda3d.core import PStatCollector
 
@@ -12,6 +14,14 @@ class ECSShowBase(ShowBase):
         super().__init__(self, *args, **kwargs)
         self.ecs_world = World()
         self.ecs_system_pstats = {}
+        self.ecs_frame_start = None
+        # Event channels keep the events of two frames, see EventChannel.
+        # This is also where frames begin for World.profiler.
+        self.task_mgr.add(
+            self.swap_event_channels,
+            'wecs:swap_event_channels',
+            sort=-1000,
+        )
 
     def add_system(self, system, sort):
         self.ecs_world.add_system(system, sort)
@@ -24,6 +34,15 @@ class ECSShowBase(ShowBase):
         self.ecs_system_pstats[system] = PStatCollector('App:WECS:Systems:{}'.format(system))
         return task
 
+    def swap_event_channels(self, task):
+        profiler = self.ecs_world.profiler
+        now = time.perf_counter_ns()
+        if profiler is not None and self.ecs_frame_start is not None:
+            profiler.record_frame(self.ecs_world, now - self.ecs_frame_start)
+        self.ecs_frame_start = now
+        self.ecs_world.swap_channels()
+        return Task.cont
+
     def run_system(self, system):
         self.ecs_system_pstats[system].start()
         base.ecs_world.update_system(system)
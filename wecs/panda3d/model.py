@@ -8,10 +8,12 @@ from panda3d.bullet import BulletWorld
 from panda3d.bullet import BulletRigidBodyNode
 
 from wecs.core import Component
+from wecs.core import Tag
 from wecs.core import System
 from wecs.core import and_filter
 from wecs.core import or_filter
 from wecs.core import UID
+from wecs.core import reference
 
 from wecs.mechanics.clock import Clock
 
@@ -22,7 +24,7 @@ class Model:
     node: NodePath = None
 
 
-@Component()
+@Tag()
 class Actor:
     pass
 
@@ -32,7 +34,7 @@ class CollidableGeometry:
     collide_mask: int = 1<<0 # bit 0 set
 
 
-@Component()
+@Tag()
 class FlattenStrong:
     pass
 
@@ -63,9 +65,9 @@ class PhysicsBody:
     node: NodePath = None
     body: NodePath = field(default_factory=BulletRigidBodyNode)
     timestep: float = 0.0
-    world: UID = None
+    world: UID = reference(default=None)
     _world: UID = None
-    scene: UID = None
+    scene: UID = reference(default=None)
     _scene: UID = None
 
 
@@ -0,0 +1,180 @@
+# Process-pool execution for CPU-bound systems written in pure Python,
+# which threads can not speed up because of the GIL. A ParallelSystem
+# declares which numeric component fields it reads and writes. On each
+# update, the read fields of the entities in its parallel filter are
+# copied into one block of shared memory, and the entities are split
+# into chunks that are processed by a pool of worker processes. Each
+# worker writes its results into its own slice of the written fields,
+# which are then copied back onto the components in UID order, so that
+# results do not depend on how the chunks were scheduled.
+#
+#     class Think(ParallelSystem):
+#         entity_filters = {'thinking': and_filter([Position, Mind])}
+#         parallel_filter = 'thinking'
+#         parallel_reads = {Position: ['x', 'y']}
+#         parallel_writes = {Mind: ['goal']}
+#
+#         @classmethod
+#         def process_chunk(cls, chunk):
+#             xs, ys = chunk[Position, 'x'], chunk[Position, 'y']
+#             return {(Mind, 'goal'): [...]}
+#
+# process_chunk() runs in the worker processes, so it can not access the
+# world; Component types and the system's class need to be importable.
+
+import concurrent.futures
+import dataclasses
+from multiprocessing import shared_memory
+
+import numpy
+
+from wecs.core import System
+from wecs.columnar import DTYPES
+
+
+def get_field_dtype(component_type, field_name):
+    for field in dataclasses.fields(component_type):
+        if field.name == field_name:
+            return numpy.dtype(DTYPES.get(field.type, numpy.float64))
+    raise KeyError(field_name)
+
+
+def get_layout(fields, count):
+    # [((component type, field name), dtype, offset)], size in bytes
+    layout = []
+    offset = 0
+    for key in fields:
+        dtype = get_field_dtype(*key)
+        layout.append((key, dtype.str, offset))
+        offset += dtype.itemsize * count
+        offset += -offset % 8  # Keep the columns aligned
+    return layout, offset
+
+
+def get_views(buf, layout, count):
+    return {
+        key: numpy.ndarray(count, dtype=dtype, buffer=buf, offset=offset)
+        for key, dtype, offset in layout
+    }
+
+
+def process_chunk_in_place(system_type, columns, reads, writes, start, stop):
+    chunk = {key: columns[key][start:stop] for key in reads}
+    results = system_type.process_chunk(chunk)
+    for key in writes:
+        columns[key][start:stop] = results[key]
+
+
+def run_chunk(system_type, shm_name, layout, count, reads, writes, start, stop):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        columns = get_views(shm.buf, layout, count)
+        process_chunk_in_place(system_type, columns, reads, writes, start, stop)
+        # The views must be gone before the block can be closed.
+        del columns
+    finally:
+        shm.close()
+
+
+class ParallelSystem(System):
+    parallel_filter = None  # Name of the filter to process in chunks
+    parallel_reads = {}  # {component type: [field names]}
+    parallel_writes = {}  # {component type: [field names]}
+    chunk_size = 1024
+    processes = None  # Size of the pool; 0 processes in this process.
+
+    def __init__(self, throw_exc=False):
+        System.__init__(self, throw_exc=throw_exc)
+        self.executor = None
+
+    @classmethod
+    def process_chunk(cls, chunk):
+        # chunk is {(component type, field name): array}, holding the
+        # read fields of a run of entities. Returns the written fields
+        # in the same form.
+        raise NotImplementedError
+
+    def get_component_reads(self):
+        reads = System.get_component_reads(self)
+        reads.update(self.parallel_reads)
+        return reads - set(self.parallel_writes)
+
+    def get_component_writes(self):
+        writes = System.get_component_writes(self)
+        writes.update(self.parallel_writes)
+        return writes
+
+    def get_executor(self):
+        if self.executor is None:
+            self.executor = concurrent.futures.ProcessPoolExecutor(
+                self.processes,
+            )
+        return self.executor
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def teardown(self):
+        self.shutdown()
+
+    def update(self, entities_by_filter):
+        entities = sorted(
+            entities_by_filter[self.parallel_filter],
+            key=lambda entity: entity._uid,
+        )
+        if not entities:
+            return
+        reads = [
+            (component_type, field_name)
+            for component_type, field_names in self.parallel_reads.items()
+            for field_name in field_names
+        ]
+        writes = [
+            (component_type, field_name)
+            for component_type, field_names in self.parallel_writes.items()
+            for field_name in field_names
+        ]
+        count = len(entities)
+        layout, size = get_layout(reads + writes, count)
+        shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        try:
+            columns = get_views(shm.buf, layout, count)
+            for component_type, field_name in reads:
+                columns[component_type, field_name][:] = [
+                    getattr(entity.components[component_type], field_name)
+                    for entity in entities
+                ]
+            self.process_chunks(shm.name, layout, columns, reads, writes, count)
+            for component_type, field_name in writes:
+                values = columns[component_type, field_name].tolist()
+                for entity, value in zip(entities, values):
+                    setattr(entity.components[component_type], field_name, value)
+            del columns
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def process_chunks(self, shm_name, layout, columns, reads, writes, count):
+        chunks = [
+            (start, min(start + self.chunk_size, count))
+            for start in range(0, count, self.chunk_size)
+        ]
+        if self.processes == 0 or len(chunks) == 1:
+            for start, stop in chunks:
+                process_chunk_in_place(
+                    type(self), columns, reads, writes, start, stop,
+                )
+            return
+        executor = self.get_executor()
+        futures = [
+            executor.submit(
+                run_chunk,
+                type(self), shm_name, layout, count, reads, writes, start, stop,
+            )
+            for start, stop in chunks
+        ]
+        concurrent.futures.wait(futures)
+        for future in futures:
+            future.result()
@@ -0,0 +1,224 @@
+# Timings of what a world spends its time on, without the need for
+# Panda3D's PStats. Once world.enable_profiling() is called, the world
+# records how long
+# * each update() takes ('frame'),
+# * each system's update() takes ('update', system),
+# * flushing command buffers takes ('flush'), and within that, creating
+#   and destroying entities and changing their components, which moves
+#   entities between archetypes and filters ('filters', 'create' /
+#   'change' / 'destroy'),
+# * each system's init_entity() and destroy_entity() take, per batch of
+#   entities ('init_entity' / 'destroy_entity', system).
+# The most recent samples of each are kept in a Histogram, which can be
+# queried while the world runs:
+#
+#     profiler = world.enable_profiling()
+#     ...
+#     stats = profiler.get_stats('update', world.get_system(PerceiveRoom))
+#     stats['p95']  # In nanoseconds
+#     print(profiler.format_report())
+#
+# world.enable_allocation_profiling() attributes allocations to systems
+# instead, see AllocationProfiler, and world.enable_tracing() records the
+# timings as a trace, see wecs.trace.
+
+import array
+import collections
+import time
+import tracemalloc
+
+
+PERCENTILES = (50, 95, 99)
+
+
+class Histogram:
+    # The durations of the most recent samples, in a ring buffer.
+    def __init__(self, window):
+        self.samples = array.array('q', [0] * window)
+        self.window = window
+        self.position = 0
+        self.count = 0  # Over all time
+        self.total = 0
+
+    def record(self, duration):
+        self.samples[self.position] = duration
+        self.position = (self.position + 1) % self.window
+        self.count += 1
+        self.total += duration
+
+    def get_stats(self):
+        recent = sorted(self.samples[:min(self.count, self.window)])
+        stats = {'count': self.count, 'total': self.total}
+        if not recent:
+            return stats
+        stats['mean'] = sum(recent) / len(recent)
+        stats['max'] = recent[-1]
+        for percentile in PERCENTILES:
+            # Nearest rank
+            rank = max(0, -(-percentile * len(recent) // 100) - 1)
+            stats['p{}'.format(percentile)] = recent[rank]
+        return stats
+
+
+class Profiler:
+    clock = staticmethod(time.perf_counter_ns)
+
+    def __init__(self, window=1024):
+        self.window = window
+        self.histograms = {}  # {(kind, subject): Histogram}
+
+    def record(self, kind, subject, duration):
+        key = (kind, subject)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms.setdefault(key, Histogram(self.window))
+        histogram.record(duration)
+
+    def record_frame(self, world, duration):
+        self.record('frame', None, duration)
+
+    def get_stats(self, kind, subject=None):
+        histogram = self.histograms.get((kind, subject))
+        if histogram is None:
+            return {'count': 0, 'total': 0}
+        return histogram.get_stats()
+
+    def report(self):
+        # [(kind, subject, stats)], by total time spent
+        rows = [
+            (kind, subject, histogram.get_stats())
+            for (kind, subject), histogram in list(self.histograms.items())
+        ]
+        rows.sort(key=lambda row: row[2]['total'], reverse=True)
+        return rows
+
+    def format_report(self):
+        lines = ['{:<40} {:>8} {:>10} {:>10} {:>10} {:>10}'.format(
+            'what', 'count', 'p50 ms', 'p95 ms', 'p99 ms', 'total ms',
+        )]
+        for kind, subject, stats in self.report():
+            name = kind if subject is None else '{} {}'.format(kind, subject)
+            lines.append('{:<40} {:>8} {:>10.3f} {:>10.3f} {:>10.3f} {:>10.1f}'.format(
+                name,
+                stats['count'],
+                stats['p50'] / 1e6,
+                stats['p95'] / 1e6,
+                stats['p99'] / 1e6,
+                stats['total'] / 1e6,
+            ))
+        return '\n'.join(lines)
+
+    def reset(self):
+        self.histograms = {}
+
+
+# What systems allocate, per frame, with tracemalloc. Before a system's
+# update() runs, the traces are cleared, so afterwards
+# * 'size' and 'count' are the bytes and number of blocks that it
+#   allocated and that are still alive, like rebuilt lists,
+# * 'peak' is the most memory that was allocated at any point during
+#   the update, which includes temporaries that were freed again,
+# * 'top' are the call sites that allocated the most of what is alive,
+#   as [(site, size, count)].
+# Clearing the traces means that tracemalloc can't be used for anything
+# else at the same time. Systems of parallel stages run one after
+# another, as allocations can't be told apart by thread. Tracing slows
+# everything down considerably, so this is for finding hot spots, not
+# for production.
+#
+#     allocations = world.enable_allocation_profiling()
+#     world.update()
+#     allocations.get_frame()[world.get_system(PerceiveRoom)]['top']
+#     print(allocations.format_report())
+
+
+class AllocationProfiler:
+    def __init__(self, frames=60, top=10, nframe=1):
+        self.frames = collections.deque(maxlen=frames)  # [{System: stats}]
+        self.top = top
+        self.filters = [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ]
+        self.started = not tracemalloc.is_tracing()
+        if self.started:
+            tracemalloc.start(nframe)
+
+    def begin_frame(self):
+        self.frames.append({})
+
+    def run_update(self, system, entities_by_filter):
+        tracemalloc.clear_traces()
+        try:
+            system.update(entities_by_filter)
+        finally:
+            _, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot().filter_traces(self.filters)
+        statistics = snapshot.statistics('lineno')
+        # Systems run once per frame, so when frames aren't begun, like
+        # with ECSShowBase, a system that ran before begins the next one.
+        if not self.frames or system in self.frames[-1]:
+            self.begin_frame()
+        self.frames[-1][system] = {
+            'size': sum(stat.size for stat in statistics),
+            'count': sum(stat.count for stat in statistics),
+            'peak': peak,
+            'top': [
+                (str(stat.traceback), stat.size, stat.count)
+                for stat in statistics[:self.top]
+            ],
+        }
+
+    def get_frame(self, index=-1):
+        # {System: stats}
+        return self.frames[index]
+
+    def get_stats(self, system):
+        # Means per frame over the frames that the system ran in
+        frames = [frame[system] for frame in self.frames if system in frame]
+        if not frames:
+            return None
+        sites = {}
+        for stats in frames:
+            for site, size, count in stats['top']:
+                totals = sites.setdefault(site, [0, 0])
+                totals[0] += size
+                totals[1] += count
+        top = sorted(sites.items(), key=lambda item: item[1][0], reverse=True)
+        return {
+            'frames': len(frames),
+            'size': sum(stats['size'] for stats in frames) / len(frames),
+            'count': sum(stats['count'] for stats in frames) / len(frames),
+            'peak': max(stats['peak'] for stats in frames),
+            'top': [
+                (site, size / len(frames), count / len(frames))
+                for site, (size, count) in top[:self.top]
+            ],
+        }
+
+    def format_report(self, sites=3):
+        systems = {}
+        for frame in self.frames:
+            systems.update(dict.fromkeys(frame))
+        rows = [(system, self.get_stats(system)) for system in systems]
+        rows.sort(key=lambda row: row[1]['size'], reverse=True)
+        lines = ['{:<40} {:>12} {:>10} {:>12}'.format(
+            'system', 'kB / frame', 'blocks', 'peak kB',
+        )]
+        for system, stats in rows:
+            lines.append('{:<40} {:>12.1f} {:>10.1f} {:>12.1f}'.format(
+                repr(system),
+                stats['size'] / 1024,
+                stats['count'],
+                stats['peak'] / 1024,
+            ))
+            for site, size, count in stats['top'][:sites]:
+                lines.append('    {:<36} {:>12.1f} {:>10.1f}'.format(
+                    site, size / 1024, count,
+                ))
+        return '\n'.join(lines)
+
+    def stop(self):
+        if self.started and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self.started = False
@@ -1,10 +1,11 @@
 from dataclasses import field
 
-from wecs.core import Component, System, UID, and_filter
+from wecs.core import Component, System, UID, and_filter, reference
 
 
-# Rooms, and being in a room
-@Component()
+# Rooms, and being in a room; PerceiveRoom assigns the lists of rooms
+# anew each update, which tracking reports to changed_filter() and deltas.
+@Component(tracked=True)
 class Room:
     # Neighboring room entities
     adjacent: list = field(default_factory=list)
@@ -20,12 +21,12 @@ class Room:
 
 @Component()
 class RoomPresence:
-    room: UID
+    room: UID = reference()
     # Entities perceived
     presences: list = field(default_factory=list)
 
 
-@Component()
+@Component(pooled=True)
 class ChangeRoomAction:
     room: UID # Room to change to
 
@@ -96,18 +97,21 @@ class ChangeRoom(System):
     entity_filters = {
         'act': and_filter([ChangeRoomAction, RoomPresence])
     }
+    component_reads = [Room]
+    event_reads = [ChangeRoomAction]
 
     def update(self, filtered_entities):
-        for entity in filtered_entities['act']:
+        actions = self.consume_actions(ChangeRoomAction, filtered_entities['act'])
+        for entity, action in actions:
+            if RoomPresence not in entity:
+                continue  # Sent as an event by an entity in the void
             room = self.world.get_entity(
                 entity.get_component(RoomPresence).room,
             )
-            target = entity.get_component(ChangeRoomAction).room
+            target = action.room
 
             if target not in room.get_component(Room).adjacent:
                 if self.throw_exc:
                     raise RoomsNotAdjacent
             else:
                 entity.get_component(RoomPresence).room = target
-
-            entity.remove_component(ChangeRoomAction)
@@ -0,0 +1,211 @@
+# Seeded, headless workloads for the rooms, inventory and equipment
+# modules, for benchmarks and tests. A RoomsScenario builds rooms that
+# are connected into a graph, actors with inventories and equipment
+# slots, and items, some of them equippable, spread over the rooms. Each
+# frame, every actor picks an action at random, which is sent as an
+# event, and the world is updated:
+#
+#     scenario = RoomsScenario(num_rooms=100, num_actors=500, seed=3)
+#     scenario.run(50)
+#     scenario.actions  # {kind: number sent}
+#
+# Given the same seed and parameters, the same actions are taken, so
+# two runs end with the same world.
+
+import random
+
+from wecs.core import World
+from wecs.rooms import Room, RoomPresence, ChangeRoomAction
+from wecs.rooms import ChangeRoom, PerceiveRoom
+from wecs.inventory import Inventory, Takeable, TakeAction, DropAction
+from wecs.inventory import TakeOrDrop
+from wecs.equipment import Equipment, Slot, Equippable
+from wecs.equipment import EquipAction, UnequipAction, EquipOrUnequip
+
+
+# Slot types for equippable items
+class Head:
+    name = "head"
+class Hand:
+    name = "hand"
+
+
+SLOT_TYPES = (Head, Hand)
+
+# Chance of each action per actor and frame; Otherwise it idles.
+DEFAULT_MIX = {
+    'move': 0.3,
+    'take': 0.2,
+    'drop': 0.1,
+    'equip': 0.1,
+    'unequip': 0.05,
+}
+
+
+class RoomsScenario:
+    def __init__(self, num_rooms=100, num_actors=500, num_items=1000,
+                 degree=3, equippable=0.5, mix=None, seed=0, world=None,
+                 sort=0):
+        self.num_rooms = num_rooms
+        self.num_actors = num_actors
+        self.num_items = num_items
+        self.degree = degree  # Mean number of adjacent rooms
+        self.equippable = equippable  # Share of equippable items
+        self.mix = dict(DEFAULT_MIX if mix is None else mix)
+        self.rng = random.Random(seed)
+        self.world = World() if world is None else world
+        self.sort = sort  # Of the first of the scenario's systems
+        self.rooms = []
+        self.actors = []
+        self.items = []
+        self.actions = {kind: 0 for kind in self.mix}
+        self.frames = 0
+        self.build()
+
+    def build(self):
+        world = self.world
+        rng = self.rng
+        for offset, system_type in enumerate(
+                [ChangeRoom, TakeOrDrop, EquipOrUnequip, PerceiveRoom]):
+            world.add_system(system_type(), self.sort + offset)
+
+        # A ring, so every room can be reached, with random shortcuts.
+        self.rooms = [world.create_entity() for _ in range(self.num_rooms)]
+        adjacent = {room._uid: set() for room in self.rooms}
+        edges = [
+            (self.rooms[index - 1], room)
+            for index, room in enumerate(self.rooms)
+        ]
+        num_shortcuts = max(0, self.num_rooms * self.degree // 2 - len(edges))
+        edges.extend(
+            (rng.choice(self.rooms), rng.choice(self.rooms))
+            for _ in range(num_shortcuts)
+        )
+        for room, other in edges:
+            if room is not other:
+                adjacent[room._uid].add(other._uid)
+                adjacent[other._uid].add(room._uid)
+        for room in self.rooms:
+            room.add_component(Room(adjacent=sorted(adjacent[room._uid])))
+
+        for _ in range(self.num_actors):
+            slots = [
+                world.create_entity(Slot(type=slot_type, content=None))._uid
+                for slot_type in SLOT_TYPES
+            ]
+            self.actors.append(world.create_entity(
+                RoomPresence(room=rng.choice(self.rooms)._uid),
+                Inventory(),
+                Equipment(slots=slots),
+            ))
+        for _ in range(self.num_items):
+            components = [
+                RoomPresence(room=rng.choice(self.rooms)._uid),
+                Takeable(),
+            ]
+            if rng.random() < self.equippable:
+                components.append(Equippable(type=rng.choice(SLOT_TYPES)))
+            self.items.append(world.create_entity(*components))
+        # Presences perceive their rooms.
+        world.update()
+
+    def act(self):
+        # Lists are sorted, as their order may depend on the order of
+        # sets of entities, which differs between runs.
+        world = self.world
+        rng = self.rng
+        for actor in self.actors:
+            roll = rng.random()
+            for kind, chance in self.mix.items():
+                if roll < chance:
+                    break
+                roll -= chance
+            else:
+                continue  # Idle
+            action = getattr(self, 'make_' + kind)(actor)
+            if action is not None:
+                world.send_action(actor, action)
+                self.actions[kind] += 1
+
+    def make_move(self, actor):
+        room = self.world.get_entity(actor[RoomPresence].room)
+        adjacent = room[Room].adjacent
+        if adjacent:
+            target = self.rng.choice(adjacent)
+            return self.world.new_component(ChangeRoomAction, room=target)
+
+    def make_take(self, actor):
+        items = []
+        for uid in sorted(actor[RoomPresence].presences):
+            entity = self.world.get_entity(uid)
+            if Takeable in entity and RoomPresence in entity:
+                items.append(uid)
+        if items:
+            item = self.rng.choice(items)
+            return self.world.new_component(TakeAction, item=item)
+
+    def make_drop(self, actor):
+        contents = actor[Inventory].contents
+        if contents:
+            item = self.rng.choice(sorted(contents))
+            return self.world.new_component(DropAction, item=item)
+
+    def make_equip(self, actor):
+        # Items are equipped from the inventory, as what an actor
+        # perceives in a room may already have been taken.
+        world = self.world
+        free_slots = {}
+        for uid in actor[Equipment].slots:
+            slot = world.get_entity(uid)[Slot]
+            if slot.content is None:
+                free_slots.setdefault(slot.type, uid)
+        candidates = []
+        for uid in sorted(actor[Inventory].contents):
+            item = world.get_entity(uid)
+            if Equippable in item and item[Equippable].type in free_slots:
+                candidates.append((uid, free_slots[item[Equippable].type]))
+        if candidates:
+            item, slot = self.rng.choice(candidates)
+            return world.new_component(EquipAction, item=item, slot=slot)
+
+    def make_unequip(self, actor):
+        world = self.world
+        slots = [
+            uid for uid in actor[Equipment].slots
+            if world.get_entity(uid)[Slot].content is not None
+        ]
+        if slots:
+            slot = self.rng.choice(slots)
+            # Into the inventory, or onto the floor
+            if self.rng.random() < 0.5:
+                target = actor._uid
+            else:
+                target = actor[RoomPresence].room
+            return world.new_component(UnequipAction, slot=slot, target=target)
+
+    def step(self):
+        self.act()
+        self.world.update()
+        self.frames += 1
+
+    def run(self, num_frames):
+        for _ in range(num_frames):
+            self.step()
+        return self
+
+    def get_item_locations(self):
+        # {item UID: [(kind, UID of room, actor or slot)]}; Each item
+        # should be in exactly one place.
+        world = self.world
+        locations = {item._uid: [] for item in self.items}
+        for item in self.items:
+            if RoomPresence in item:
+                locations[item._uid].append(('room', item[RoomPresence].room))
+        for actor in self.actors:
+            for uid in actor[Inventory].contents:
+                locations[uid].append(('inventory', actor._uid))
+            for uid in actor[Equipment].slots:
+                content = world.get_entity(uid)[Slot].content
+                if content is not None:
+                    locations[content].append(('slot', uid))
+        return locations
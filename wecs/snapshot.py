@@ -0,0 +1,356 @@
+# Saving and loading worlds in a compact binary format. The file starts
+# with a magic number and format version, followed by a pickled header,
+# followed by the data sections that the header describes:
+#
+# * the generation of each slot of the entity table, the indices of the
+#   slots that hold entities, and the free list, so that UIDs, and thus
+#   all references between entities, stay the same,
+# * for each component type, the entities that have it, and then the
+#   values of each of its fields, column by column.
+#
+# Numeric fields and reference fields are stored as packed arrays, all
+# other fields as a pickled list per column. The header holds the schema
+# of each component type, i.e. its importable name and the names and
+# encodings of its fields. When loading, fields are matched to the
+# current definition of the component type by name; A field that was
+# renamed can list its old names in its metadata, e.g.
+#     room: UID = reference(metadata={'renamed_from': ('location',)})
+# Fields missing in the file get their default values, and fields that
+# no longer exist are dropped. Component types that were renamed or moved
+# can be mapped with the type_aliases argument of load_world().
+#
+# Systems, command buffers, event channels and change logs are not part
+# of a snapshot; Pending changes are flushed before saving, and systems
+# added after loading see the loaded entities.
+
+import gc
+import array
+import pickle
+import struct
+import contextlib
+import dataclasses
+import importlib
+
+from wecs.core import Entity, World, INDEX_BITS, get_component_mask
+
+
+MAGIC = b'WECS'
+FORMAT_VERSION = 1
+PREAMBLE = struct.Struct('<4sIQ')  # Magic, version, header size
+
+# Packed encodings; The value stored for a None reference is UID() == 0.
+TYPECODES = {
+    'int': 'q',
+    'float': 'd',
+    'bool': 'b',
+}
+NUMERIC_TYPES = {
+    int: 'int',
+    float: 'float',
+    bool: 'bool',
+    'int': 'int',
+    'float': 'float',
+    'bool': 'bool',
+}
+PYTHON_TYPES = {
+    'int': int,
+    'float': float,
+    'bool': bool,
+}
+
+
+class SnapshotError(Exception): pass
+
+
+@contextlib.contextmanager
+def gc_paused():
+    # The collector would traverse the growing heap over and over while
+    # hundreds of thousands of objects are created, none of them garbage.
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def get_type_name(component_type):
+    return '{}:{}'.format(component_type.__module__, component_type.__qualname__)
+
+
+def resolve_type_name(type_name, type_aliases):
+    if type_name in type_aliases:
+        return type_aliases[type_name]
+    module_name, qualname = type_name.split(':')
+    try:
+        obj = importlib.import_module(module_name)
+        for name in qualname.split('.'):
+            obj = getattr(obj, name)
+    except (ImportError, AttributeError):
+        raise SnapshotError("Can't find component type {}".format(type_name))
+    return obj
+
+
+def encode_column(field, values):
+    # Returns the encoding and the bytes of a column.
+    reference = field.metadata.get('reference')
+    if reference is not None:
+        _, many = reference
+        if not many:
+            return 'uid', array.array('Q', [v or 0 for v in values]).tobytes()
+        lengths = array.array('I', [len(v) for v in values])
+        flat = array.array('Q', [uid for v in values for uid in v])
+        return 'uids', lengths.tobytes() + flat.tobytes()
+    kind = NUMERIC_TYPES.get(field.type)
+    if kind is not None:
+        # Values of other types, e.g. None, fall back to pickling.
+        python_type = PYTHON_TYPES[kind]
+        if all(type(v) is python_type for v in values):
+            try:
+                return kind, array.array(TYPECODES[kind], values).tobytes()
+            except OverflowError:
+                pass
+    return 'object', pickle.dumps(values, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def unpack_array(typecode, data):
+    values = array.array(typecode)
+    values.frombytes(data)
+    return values
+
+
+def decode_column(kind, data, count):
+    if kind == 'uid':
+        return [uid or None for uid in unpack_array('Q', data)]
+    if kind == 'uids':
+        lengths = unpack_array('I', data[:4 * count])
+        flat = unpack_array('Q', data[4 * count:]).tolist()
+        values = []
+        start = 0
+        for length in lengths:
+            values.append(flat[start:start + length])
+            start += length
+        return values
+    if kind == 'bool':
+        return [bool(v) for v in unpack_array('b', data)]
+    if kind in TYPECODES:
+        return unpack_array(TYPECODES[kind], data).tolist()
+    return pickle.loads(data)
+
+
+def save_world(world, path):
+    with gc_paused():
+        write_snapshot(world, path)
+
+
+def write_snapshot(world, path):
+    world.flush_component_updates()
+    entities = [entity for entity in world.entities if entity is not None]
+    positions = {entity: position for position, entity in enumerate(entities)}
+    blobs = []
+
+    def add_blob(data):
+        blobs.append(data)
+        return len(data)
+
+    header = {
+        'num_entities': len(entities),
+        'generations': add_blob(array.array('I', world.generations).tobytes()),
+        'indices': add_blob(array.array(
+            'I',
+            [entity._uid & ((1 << INDEX_BITS) - 1) for entity in entities],
+        ).tobytes()),
+        'free_indices': add_blob(array.array('I', world.free_indices).tobytes()),
+        'names': add_blob(pickle.dumps(
+            {positions[e]: e._name for e in entities if e._name is not None},
+            protocol=pickle.HIGHEST_PROTOCOL,
+        )),
+        'component_types': [],
+    }
+
+    entities_by_type = {}
+    for archetype in world.archetypes.values():
+        if not archetype.entities:
+            continue
+        for component_type in archetype.component_types:
+            entities_by_type.setdefault(component_type, []).extend(
+                archetype.entities,
+            )
+    for component_type, typed_entities in entities_by_type.items():
+        typed_entities.sort(key=positions.__getitem__)
+        rows = array.array('I', [positions[e] for e in typed_entities])
+        type_header = {
+            'type': get_type_name(component_type),
+            'count': len(typed_entities),
+            'rows': add_blob(rows.tobytes()),
+            'fields': [],
+        }
+        components = [e.components[component_type] for e in typed_entities]
+        for field in dataclasses.fields(component_type):
+            values = [getattr(c, field.name) for c in components]
+            kind, data = encode_column(field, values)
+            type_header['fields'].append((field.name, kind, add_blob(data)))
+        header['component_types'].append(type_header)
+
+    header_data = pickle.dumps(header, protocol=pickle.HIGHEST_PROTOCOL)
+    with open(path, 'wb') as f:
+        f.write(PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header_data)))
+        f.write(header_data)
+        for blob in blobs:
+            f.write(blob)
+
+
+def read_snapshot(data):
+    # Returns the header, and a function returning the data sections
+    # one after the other.
+    magic, version, header_size = PREAMBLE.unpack_from(data)
+    if magic != MAGIC:
+        raise SnapshotError("Not a world snapshot")
+    if version != FORMAT_VERSION:
+        raise SnapshotError("Unsupported snapshot version {}".format(version))
+    start = PREAMBLE.size
+    header = pickle.loads(data[start:start + header_size])
+    offset = start + header_size
+
+    def take(size):
+        nonlocal offset
+        section = data[offset:offset + size]
+        offset += size
+        return section
+    return header, take
+
+
+def get_field_map(component_type, saved_names):
+    # {saved field name: current field name}
+    fields = {field.name: field for field in dataclasses.fields(component_type)}
+    field_map = {}
+    for saved_name in saved_names:
+        if saved_name in fields:
+            field_map[saved_name] = saved_name
+            continue
+        for field in fields.values():
+            renamed_from = field.metadata.get('renamed_from', ())
+            if isinstance(renamed_from, str):
+                renamed_from = (renamed_from,)
+            if saved_name in renamed_from:
+                field_map[saved_name] = field.name
+    return field_map
+
+
+def get_defaults(component_type, present):
+    # Factories for the fields that the file doesn't have values for.
+    defaults = {}
+    for field in dataclasses.fields(component_type):
+        if field.name in present:
+            continue
+        if field.default is not dataclasses.MISSING:
+            defaults[field.name] = lambda default=field.default: default
+        elif field.default_factory is not dataclasses.MISSING:
+            defaults[field.name] = field.default_factory
+        else:
+            raise SnapshotError("No value for field {} of {}".format(
+                field.name,
+                component_type.__name__,
+            ))
+    return defaults
+
+
+def make_components(component_type, columns, count):
+    # Instances are made without calling __init__ or the hooks of
+    # tracked components, as the values are known already.
+    names = list(columns)
+    rows = zip(*(columns[name] for name in names)) if names else [()] * count
+    new = component_type.__new__
+    components = []
+    if hasattr(component_type, '_store'):  # Columnar storage
+        for values in rows:
+            component = new(component_type)
+            component.__setstate__(dict(zip(names, values)))
+            components.append(component)
+    elif not hasattr(component_type, '__slots__'):
+        for values in rows:
+            component = new(component_type)
+            component.__dict__ = dict(zip(names, values))
+            components.append(component)
+    else:
+        set_field = object.__setattr__
+        for values in rows:
+            component = new(component_type)
+            for name, value in zip(names, values):
+                set_field(component, name, value)
+            components.append(component)
+    return components
+
+
+def load_world(path, world=None, type_aliases=None):
+    with gc_paused():
+        return read_world(path, world, type_aliases)
+
+
+def read_world(path, world, type_aliases):
+    if world is None:
+        world = World()
+    if world.entities:
+        raise SnapshotError("Snapshots can only be loaded into an empty world")
+    if type_aliases is None:
+        type_aliases = {}
+    with open(path, 'rb') as f:
+        data = memoryview(f.read())
+    header, take = read_snapshot(data)
+
+    count = header['num_entities']
+    generations = unpack_array('I', take(header['generations'])).tolist()
+    indices = unpack_array('I', take(header['indices'])).tolist()
+    free_indices = unpack_array('I', take(header['free_indices'])).tolist()
+    names = pickle.loads(take(header['names']))
+
+    table = [None] * len(generations)
+    entities = []
+    for index in indices:
+        entity = Entity(world, (generations[index] << INDEX_BITS) | index)
+        table[index] = entity
+        entities.append(entity)
+    for position, name in names.items():
+        entities[position]._name = name
+    world.entities = table
+    world.generations = generations
+    world.free_indices = free_indices
+
+    attached = []
+    for type_header in header['component_types']:
+        component_type = resolve_type_name(type_header['type'], type_aliases)
+        type_count = type_header['count']
+        rows = unpack_array('I', take(type_header['rows']))
+        field_map = get_field_map(
+            component_type,
+            [name for name, _, _ in type_header['fields']],
+        )
+        columns = {}
+        for name, kind, size in type_header['fields']:
+            section = take(size)
+            if name in field_map:
+                columns[field_map[name]] = decode_column(kind, section, type_count)
+        for name, factory in get_defaults(component_type, columns).items():
+            columns[name] = [factory() for _ in range(type_count)]
+        components = make_components(component_type, columns, type_count)
+        typed_entities = [entities[row] for row in rows]
+        for entity, component in zip(typed_entities, components):
+            entity.components[component_type] = component
+        if getattr(component_type, '_entity_hooks', False):
+            attached.append((component_type, typed_entities, components))
+
+    # Entities with the same components go into their archetype together.
+    entities_by_types = {}
+    for entity in entities:
+        entities_by_types.setdefault(tuple(entity.components), []).append(entity)
+    batches = []
+    for component_types, typed_entities in entities_by_types.items():
+        mask = get_component_mask(component_types)
+        for entity in typed_entities:
+            entity._mask = mask
+        batches.append((world.get_archetype(component_types), typed_entities))
+    world.create_entity_batches(batches)
+    for component_type, typed_entities, components in attached:
+        world.attach_components(component_type, typed_entities, components)
+    return world
@@ -0,0 +1,144 @@
+# Traces of what a world does, in the Trace Event Format that
+# chrome://tracing and Perfetto (ui.perfetto.dev) load. A Tracer is a
+# Profiler, see wecs.profiler, that also keeps each timing as a span:
+# Frames, systems' update(), flushes and their phases, and the
+# init_entity() / destroy_entity() hooks, on the thread that they ran on.
+# At the end of each frame, the number of entities and archetypes, and
+# the size of each system's filters, are recorded as counters.
+#
+#     tracer = world.enable_tracing(seconds=10, spike=0.050)
+#     ...
+#     tracer.dump('wecs.json')
+#
+# Events are kept in a ring buffer that holds the last `seconds` of
+# them, so tracing can stay enabled. When a frame takes longer than
+# `spike` seconds, the buffer is dumped into a new file, named after
+# `spike_path`, so the frames leading up to it can be inspected; Once
+# per `seconds`, so that the dumps don't overlap. Also, events can be
+# streamed into an open file as each frame ends:
+#
+#     tracer = world.enable_tracing(stream=open('wecs.json', 'w'))
+#     ...
+#     world.disable_profiling()  # Closes the JSON array.
+#
+# Clients that run systems one by one, like ECSShowBase, mark the ends
+# of frames with profiler.record_frame().
+
+import os
+import json
+import threading
+import collections
+
+from wecs.profiler import Profiler
+
+
+class Tracer(Profiler):
+    def __init__(self, window=1024, seconds=10.0, max_events=1000000,
+                 spike=None, spike_path='wecs-spike-{}.json', stream=None):
+        Profiler.__init__(self, window)
+        self.seconds = seconds
+        # (phase, name, category, start ns, duration ns, thread, args)
+        self.events = collections.deque(maxlen=max_events)
+        self.spike = spike
+        self.spike_path = spike_path
+        self.spikes = []  # Paths of the dumps
+        self.last_spike = None
+        self.stream = stream
+        self.pending = []  # Events yet to be written to the stream
+        self.stream_started = False
+        self.pid = os.getpid()
+
+    def record(self, kind, subject, duration):
+        end = self.clock()
+        Profiler.record(self, kind, subject, duration)
+        if subject is None:
+            name = kind
+        else:
+            name = '{} {}'.format(kind, subject)
+        event = ('X', name, kind, end - duration, duration, threading.get_ident(), None)
+        self.events.append(event)
+        if self.stream is not None:
+            self.pending.append(event)
+
+    def record_counter(self, name, values, now, tid):
+        event = ('C', name, 'counters', now, 0, tid, values)
+        self.events.append(event)
+        if self.stream is not None:
+            self.pending.append(event)
+
+    def record_frame(self, world, duration):
+        Profiler.record_frame(self, world, duration)
+        now = self.clock()
+        tid = threading.get_ident()
+        self.record_counter('entities', {
+            'entities': len(world.entities) - len(world.free_indices),
+            'archetypes': len(world.archetypes),
+        }, now, tid)
+        for system in world.systems.values():
+            self.record_counter('filters {}'.format(system), {
+                filter_name: len(world.entity_filters[filter_func])
+                for filter_name, filter_func in system.entity_filters.items()
+            }, now, tid)
+
+        # Only the last seconds are kept.
+        horizon = now - int(self.seconds * 1e9)
+        events = self.events
+        while events and events[0][3] < horizon:
+            events.popleft()
+        if self.stream is not None:
+            self.stream_started = self.write_events(
+                self.stream, self.pending, self.stream_started,
+            )
+            self.pending = []
+        if self.spike is not None and duration > self.spike * 1e9:
+            if self.last_spike is None or now - self.last_spike > self.seconds * 1e9:
+                self.last_spike = now
+                path = self.spike_path.format(len(self.spikes))
+                self.dump(path)
+                self.spikes.append(path)
+
+    def to_json(self, event):
+        phase, name, category, start, duration, tid, args = event
+        data = {
+            'name': name,
+            'cat': category,
+            'ph': phase,
+            'ts': start / 1000,  # Microseconds
+            'pid': self.pid,
+            'tid': tid,
+        }
+        if phase == 'X':
+            data['dur'] = duration / 1000
+        if args is not None:
+            data['args'] = args
+        return json.dumps(data)
+
+    def write_events(self, out, events, started=False):
+        # Events are written one by one, opening the JSON array before
+        # the first one, so that a stream can be loaded even while it
+        # has not been closed.
+        for event in events:
+            out.write(',\n' if started else '[\n')
+            started = True
+            out.write(self.to_json(event))
+        out.flush()
+        return started
+
+    def dump(self, path):
+        with open(path, 'w') as out:
+            if not self.write_events(out, list(self.events)):
+                out.write('[')
+            out.write('\n]\n')
+
+    def reset(self):
+        Profiler.reset(self)
+        self.events.clear()
+
+    def close(self):
+        if self.stream is not None:
+            started = self.write_events(self.stream, self.pending, self.stream_started)
+            if not started:
+                self.stream.write('[')
+            self.stream.write('\n]\n')
+            self.stream.close()
+            self.stream = None